@@ -0,0 +1,112 @@
+'''
+Business: История изменений заявок и справочников из журнала audit_log для администраторов и менеджеров
+Args: event с httpMethod GET; ?entity= (orders/materials/colors/sections/sandwich, id строки сетки — row_number), необязательные ?id=, ?limit=, ?cursor=
+Returns: HTTP response со списком изменений от новых к старым и курсором следующей страницы в X-Next-Cursor
+'''
+
+import base64
+import json
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+from shared import audit
+from shared.db import get_connection
+from shared.metrics import instrument
+from shared.serialize import compress, json_body, records, text_cursor
+from shared.sessions import authenticate, get_role
+
+ENTITIES = ('orders', 'materials', 'colors', 'sections', 'sandwich')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    key = [str(row['changed_at']), row['id']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    changed_at, entry_id = json.loads(base64.urlsafe_b64decode(padded))
+    return datetime.fromisoformat(changed_at), int(entry_id)
+
+
+def _parse_query(params: Dict[str, str]) -> Tuple[str, Optional[int], Optional[Tuple[datetime, int]], int]:
+    entity = params.get('entity')
+    if entity not in ENTITIES:
+        raise ValueError(f"entity must be one of {', '.join(ENTITIES)}")
+    entity_id = int(params['id']) if params.get('id') else None
+    before = _decode_cursor(params['cursor']) if params.get('cursor') else None
+    limit = int(params.get('limit', DEFAULT_PAGE_SIZE))
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return entity, entity_id, before, limit
+
+
+@instrument('audit')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Authorization',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'})
+        }
+
+    try:
+        entity, entity_id, before, limit = _parse_query(event.get('queryStringParameters') or {})
+    except (KeyError, TypeError, ValueError) as e:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'Invalid query: {e}'})
+        }
+
+    user_id = authenticate(event)
+    if not user_id:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Требуется авторизация'})
+        }
+
+    # Изменения этого процесса, ещё не записанные фоновым потоком, должны попасть в ответ.
+    # Поэтому чтение с primary: отстающая реплика могла ещё не получить только что записанную пачку
+    audit.flush()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            if get_role(cur, user_id) not in ['admin', 'manager']:
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Недостаточно прав'})
+                }
+        with text_cursor(conn) as rows_cur:
+            changes = records(rows_cur, audit.history(rows_cur, entity, entity_id, before, limit + 1))
+
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor'
+    }
+    if len(changes) > limit:
+        changes = changes[:limit]
+        headers['X-Next-Cursor'] = _encode_cursor(changes[-1])
+    return compress(event, {
+        'statusCode': 200,
+        'headers': headers,
+        'body': json_body('audit', changes)
+    })
@@ -1,9 +1,16 @@
 import json
-import os
 from typing import Dict, Any
-import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from shared import ratelimit
+from shared.db import get_connection
+from shared.http import client_ip
+from shared.metrics import instrument
+from shared.passwords import dummy_verify, hash_password, needs_rehash, verify_password
+from shared.serialize import json_body
+from shared.sessions import authenticate, get_role, invalidate_role, issue_token, remember_role
+
+@instrument('auth')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Авторизация пользователей и управление сессиями
@@ -17,17 +24,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Authorization',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    try:
+    with get_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cursor:
         if method == 'POST':
             body = json.loads(event.get('body', '{}'))
             action = body.get('action', 'login')
@@ -35,20 +39,50 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             if action == 'login':
                 username = body.get('username', '')
                 password = body.get('password', '')
+                limit_keys = ratelimit.login_keys(username, client_ip(event))
+                
+                retry_after = ratelimit.retry_after(limit_keys)
+                if retry_after:
+                    return {
+                        'statusCode': 429,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*',
+                            'Retry-After': str(retry_after)
+                        },
+                        'body': json.dumps({'success': False, 'error': 'Слишком много попыток входа, повторите позже'})
+                    }
                 
                 cursor.execute(
-                    "SELECT id, username, full_name, role FROM users WHERE username = %s AND password = %s",
-                    (username, password)
+                    "SELECT id, username, full_name, role, password FROM users WHERE username = %s",
+                    (username,)
                 )
                 user = cursor.fetchone()
                 
+                if user is None:
+                    dummy_verify(password)
+                elif verify_password(user['password'], password):
+                    # Открытый текст и хеши со старыми параметрами заменяются при успешном входе
+                    if needs_rehash(user['password']):
+                        cursor.execute(
+                            "UPDATE users SET password = %s WHERE id = %s",
+                            (hash_password(password), user['id'])
+                        )
+                        conn.commit()
+                    ratelimit.reset(limit_keys)
+                else:
+                    user = None
+                
                 if user:
+                    del user['password']
+                    remember_role(user['id'], user['role'])
                     return {
                         'statusCode': 200,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'success': True, 'user': dict(user)})
+                        'body': json.dumps({'success': True, 'user': dict(user), 'token': issue_token(user['id'])})
                     }
                 else:
+                    ratelimit.record_failure(limit_keys)
                     return {
                         'statusCode': 401,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -56,7 +90,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     }
             
             elif action == 'create_user':
-                user_id = event.get('headers', {}).get('X-User-Id')
+                user_id = authenticate(event)
                 if not user_id:
                     return {
                         'statusCode': 401,
@@ -64,10 +98,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Требуется авторизация'})
                     }
                 
-                cursor.execute("SELECT role FROM users WHERE id = %s", (user_id,))
-                current_user = cursor.fetchone()
-                
-                if not current_user or current_user['role'] not in ['admin', 'manager']:
+                if get_role(cursor, user_id) not in ['admin', 'manager']:
                     return {
                         'statusCode': 403,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -81,7 +112,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 
                 cursor.execute(
                     "INSERT INTO users (username, password, full_name, role) VALUES (%s, %s, %s, %s) RETURNING id, username, full_name, role",
-                    (username, password, full_name, role)
+                    (username, hash_password(password), full_name, role)
                 )
                 new_user = cursor.fetchone()
                 conn.commit()
@@ -93,7 +124,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
         
         elif method == 'GET':
-            user_id = event.get('headers', {}).get('X-User-Id')
+            user_id = authenticate(event)
             if not user_id:
                 return {
                     'statusCode': 401,
@@ -101,10 +132,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Требуется авторизация'})
                 }
             
-            cursor.execute("SELECT role FROM users WHERE id = %s", (user_id,))
-            current_user = cursor.fetchone()
-            
-            if not current_user or current_user['role'] not in ['admin', 'manager']:
+            if get_role(cursor, user_id) not in ['admin', 'manager']:
                 cursor.execute(
                     "SELECT id, username, full_name, role FROM users WHERE id = %s AND role = 'employee'",
                     (user_id,)
@@ -120,11 +148,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'users': [dict(u) for u in users]})
+                'body': json_body('auth', {'users': [dict(u) for u in users]})
             }
         
         elif method == 'PUT':
-            user_id = event.get('headers', {}).get('X-User-Id')
+            user_id = authenticate(event)
             body = json.loads(event.get('body', '{}'))
             target_user_id = body.get('id')
             
@@ -135,10 +163,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Требуется авторизация'})
                 }
             
-            cursor.execute("SELECT role FROM users WHERE id = %s", (user_id,))
-            current_user = cursor.fetchone()
-            
-            if not current_user or current_user['role'] not in ['admin', 'manager']:
+            if get_role(cursor, user_id) not in ['admin', 'manager']:
                 return {
                     'statusCode': 403,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -153,7 +178,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 params.append(body['username'])
             if 'password' in body:
                 updates.append('password = %s')
-                params.append(body['password'])
+                params.append(hash_password(body['password']))
             if 'full_name' in body:
                 updates.append('full_name = %s')
                 params.append(body['full_name'])
@@ -169,6 +194,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             )
             updated_user = cursor.fetchone()
             conn.commit()
+            if 'role' in body and updated_user:
+                invalidate_role(updated_user['id'])
             
             return {
                 'statusCode': 200,
@@ -181,7 +208,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': 'Метод не поддерживается'})
         }
-    
-    finally:
-        cursor.close()
-        conn.close()
+
@@ -0,0 +1,99 @@
+'''
+Business: Сравнение GET цветов/разделов: COUNT(...) GROUP BY по materials против счётчиков из триггеров
+Args: DATABASE_URL в окружении; --materials N (по умолчанию 100000), --repeat R
+Returns: печатает среднее время запросов обоих вариантов; все данные откатываются в конце
+'''
+
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import psycopg2  # noqa: E402
+
+from shared.db import SCHEMA  # noqa: E402
+
+GROUP_BY_QUERIES = {
+    'colors': f'''
+        SELECT c.id, c.name, c.hex_code, c.created_at, COUNT(m.id) as usage_count
+        FROM {SCHEMA}.colors c
+        LEFT JOIN {SCHEMA}.materials m ON c.id = m.color_id
+        GROUP BY c.id, c.name, c.hex_code, c.created_at
+        ORDER BY COUNT(m.id) DESC, c.name
+    ''',
+    'sections': f'''
+        SELECT s.id, s.name, s.created_at, COUNT(m.id) as material_count
+        FROM {SCHEMA}.categories s
+        LEFT JOIN {SCHEMA}.materials m ON s.id = m.category_id
+        GROUP BY s.id, s.name, s.created_at
+        ORDER BY s.name
+    ''',
+}
+
+COUNTER_QUERIES = {
+    'colors': f'''
+        SELECT c.id, c.name, c.hex_code, c.created_at, c.usage_count
+        FROM {SCHEMA}.colors c
+        ORDER BY c.usage_count DESC, c.name
+    ''',
+    'sections': f'''
+        SELECT s.id, s.name, s.created_at, s.material_count
+        FROM {SCHEMA}.categories s
+        ORDER BY s.name
+    ''',
+}
+
+
+def _time_query(cur, sql: str, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        cur.execute(sql)
+        cur.fetchall()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--materials', type=int, default=100000)
+    parser.add_argument('--colors', type=int, default=50)
+    parser.add_argument('--sections', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"INSERT INTO {SCHEMA}.colors (name) SELECT 'bench color ' || g FROM generate_series(1, %s) g",
+                (args.colors,)
+            )
+            cur.execute(
+                f"INSERT INTO {SCHEMA}.categories (name) SELECT 'bench section ' || g FROM generate_series(1, %s) g",
+                (args.sections,)
+            )
+            started = time.perf_counter()
+            cur.execute(f'''
+                INSERT INTO {SCHEMA}.materials (name, category_id, color_id)
+                SELECT 'bench material ' || g,
+                       (SELECT array_agg(id) FROM {SCHEMA}.categories)[1 + g %% %s],
+                       (SELECT array_agg(id) FROM {SCHEMA}.colors)[1 + g %% %s]
+                FROM generate_series(1, %s) g
+            ''', (args.sections, args.colors, args.materials))
+            insert_ms = (time.perf_counter() - started) * 1000
+            cur.execute('ANALYZE')
+
+            print(f'Вставка {args.materials} материалов (со счётчиками): {insert_ms:.0f} мс')
+            for resource in ('colors', 'sections'):
+                group_by_ms = _time_query(cur, GROUP_BY_QUERIES[resource], args.repeat)
+                counter_ms = _time_query(cur, COUNTER_QUERIES[resource], args.repeat)
+                print(f'{resource}: GROUP BY {group_by_ms:.2f} мс, счётчики {counter_ms:.2f} мс')
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+'''
+Business: Холодный старт функций и накладные расходы разбора/планирования SQL: обычный execute против подготовленных запросов shared.queries
+Args: DATABASE_URL в окружении; --runs запусков на функцию, --iterations повторов запроса, --output JSON, --compare JSON прошлого прогона
+Returns: печатает время импорта, OPTIONS и первых GET в новом процессе и среднее время запроса/планирования без PREPARE и с ним
+'''
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+FUNCTIONS = ('orders', 'materials', 'colors', 'sections')
+
+# Выполняется в новом интерпретаторе: время до импорта обработчика не входит в замер
+CHILD = '''
+import importlib.util, json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+spec = importlib.util.spec_from_file_location(sys.argv[2] + '_function', sys.argv[3])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+module.handler({'httpMethod': 'OPTIONS', 'headers': {}}, None)
+options = time.perf_counter()
+event = {'httpMethod': 'GET', 'headers': {}, 'queryStringParameters': {}}
+status = module.handler(event, None)['statusCode']
+first = time.perf_counter()
+module.handler(event, None)
+second = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'options_ms': (options - imported) * 1000,
+    'first_get_ms': (first - options) * 1000,
+    'second_get_ms': (second - first) * 1000,
+    'modules': len(sys.modules),
+    'status': status
+}))
+'''
+
+# Запросы, которые функции выполняют на каждом GET; тексты совпадают с обработчиками
+S = 't_p61217265_workplace_management'
+STATEMENTS: Dict[str, Tuple[str, Any]] = {
+    'catalog_version': (f'SELECT version FROM {S}.catalog_version', ()),
+    'materials_version': (f'''
+        SELECT COALESCE(GREATEST(
+            (SELECT max(row_version) FROM {S}.materials),
+            (SELECT max(row_version) FROM {S}.catalog_deletions WHERE entity = 'materials'),
+            (SELECT max(row_version) FROM {S}.categories),
+            (SELECT max(row_version) FROM {S}.catalog_deletions WHERE entity = 'categories'),
+            (SELECT max(row_version) FROM {S}.colors),
+            (SELECT max(row_version) FROM {S}.catalog_deletions WHERE entity = 'colors')
+        ), 0) AS version
+    ''', ()),
+    'colors_list': (f'''
+        SELECT c.id, c.name, c.hex_code, c.created_at, c.usage_count
+        FROM {S}.colors c
+        ORDER BY c.usage_count DESC, c.name
+    ''', ()),
+    'orders_page': (f'''
+        SELECT o.id, o.client_name, o.description, o.quantity_ordered, o.quantity_completed,
+               o.deadline, o.status, o.created_by, o.created_at, u.full_name as created_by_name
+        FROM {S}.orders o
+        LEFT JOIN {S}.users u ON o.created_by = u.id
+        WHERE o.status = ANY(%s)
+        ORDER BY o.status_rank, o.created_at DESC, o.id DESC
+        LIMIT %s
+    ''', (['new', 'in_progress'], 101)),
+    'materials_changed': (f'''
+        SELECT m.id, m.name, m.category_id, m.color_id, m.created_at,
+               s.name as section_name, c.name as color_name
+        FROM {S}.materials m
+        LEFT JOIN {S}.categories s ON m.category_id = s.id
+        LEFT JOIN {S}.colors c ON m.color_id = c.id
+        WHERE m.row_version > %s OR s.row_version > %s OR c.row_version > %s
+        ORDER BY m.created_at DESC
+    ''', (2 ** 40, 2 ** 40, 2 ** 40)),
+}
+
+PLANNING_TIME = re.compile(r'Planning Time: ([\d.]+) ms')
+
+
+def cold_start(function: str, runs: int) -> Dict[str, Any]:
+    samples: List[Dict[str, Any]] = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD, BACKEND_DIR, function, os.path.join(BACKEND_DIR, function, 'index.py')],
+            check=True, capture_output=True, text=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    result = {key: round(statistics.median(s[key] for s in samples), 1)
+              for key in ('import_ms', 'options_ms', 'first_get_ms', 'second_get_ms')}
+    result['modules'] = samples[-1]['modules']
+    result['status'] = samples[-1]['status']
+    return result
+
+
+def _planning_ms(cur: Any, sql: str, args: Any) -> float:
+    cur.execute('EXPLAIN (ANALYZE, SUMMARY, TIMING OFF) ' + sql, args)
+    return float(PLANNING_TIME.search('\n'.join(row[0] for row in cur.fetchall())).group(1))
+
+
+def per_query(iterations: int) -> Dict[str, Any]:
+    import psycopg2
+    try:
+        from shared import queries
+    except ImportError:
+        queries = None
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    results: Dict[str, Any] = {}
+    try:
+        with conn.cursor() as cur:
+            for name, (sql, args) in STATEMENTS.items():
+                cur.execute(sql, args)
+                cur.fetchall()
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    cur.execute(sql, args)
+                    cur.fetchall()
+                plain_us = (time.perf_counter() - started) / iterations * 1e6
+                row = {'plain_us': round(plain_us, 1), 'planning_ms': _planning_ms(cur, sql, args)}
+                if queries is not None:
+                    statement = queries.statement(f'bench_{name}', sql)
+                    queries.execute(cur, statement, args)
+                    cur.fetchall()
+                    started = time.perf_counter()
+                    for _ in range(iterations):
+                        queries.execute(cur, statement, args)
+                        cur.fetchall()
+                    row['prepared_us'] = round((time.perf_counter() - started) / iterations * 1e6, 1)
+                    cur.execute('EXPLAIN (ANALYZE, SUMMARY, TIMING OFF) ' + statement.execute_sql, statement.arguments(args))
+                    row['prepared_planning_ms'] = float(
+                        PLANNING_TIME.search('\n'.join(r[0] for r in cur.fetchall())).group(1))
+                results[name] = row
+    finally:
+        conn.close()
+    return results
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    base = baseline or {}
+    print(f"{'функция':10} {'импорт':>8} {'OPTIONS':>8} {'1-й GET':>8} {'2-й GET':>8} {'модулей':>8}")
+    for name, c in report['cold_start'].items():
+        was = base.get('cold_start', {}).get(name)
+        delta = f"  (было {was['import_ms']} / {was['first_get_ms']} мс)" if was else ''
+        print(f"{name:10} {c['import_ms']:8.1f} {c['options_ms']:8.1f} {c['first_get_ms']:8.1f} "
+              f"{c['second_get_ms']:8.1f} {c['modules']:8}{delta}")
+    print(f"\n{'запрос':18} {'обычный, мкс':>13} {'план, мс':>9} {'PREPARE, мкс':>13} {'план, мс':>9}")
+    for name, q in report['queries'].items():
+        print(f"{name:18} {q['plain_us']:13.1f} {q['planning_ms']:9.3f} "
+              f"{q.get('prepared_us', float('nan')):13.1f} {q.get('prepared_planning_ms', float('nan')):9.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=7, help='новых процессов на функцию (медиана)')
+    parser.add_argument('--iterations', type=int, default=500, help='повторов каждого запроса')
+    parser.add_argument('--function', action='append', choices=FUNCTIONS)
+    parser.add_argument('--output', default='bench-results-cold-start.json')
+    parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+    args = parser.parse_args()
+    if not os.environ.get('DATABASE_URL'):
+        sys.exit('DATABASE_URL is not set')
+    os.environ.setdefault('SESSION_SECRET', 'bench-session-secret')
+
+    report = {
+        'meta': {'runs': args.runs, 'iterations': args.iterations, 'python': sys.version.split()[0]},
+        'cold_start': {name: cold_start(name, args.runs) for name in args.function or FUNCTIONS},
+        'queries': per_query(args.iterations)
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'Результаты: {args.output}')
+
+
+if __name__ == '__main__':
+    main()
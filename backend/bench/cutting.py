@@ -0,0 +1,162 @@
+'''
+Business: Корпус задач раскроя: одна жадная раскладка (как в браузере) против перебора стратегий packing.optimize
+Args: --budget мс на задачу (можно несколько), --workers, --output JSON, --compare JSON прошлого прогона
+Returns: печатает по каждой задаче число листов, нижнюю границу, КПД и число проверенных стратегий
+'''
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from shared import packing  # noqa: E402
+from shared.packing import Detail, Sheet, Strategy  # noqa: E402
+
+Case = Tuple[List[Detail], List[Sheet], float]
+
+CHIPBOARD = Sheet('ЛДСП 2800x2070', 2800, 2070)
+SANDWICH = Sheet('Сэндвич 3000x1500', 3000, 1500)
+# Жадная раскладка фронтенда: крупные детали первыми, самая нижняя-левая позиция
+GREEDY = Strategy('area', 'bl', 'free')
+
+
+def _kitchen(rng: random.Random) -> Case:
+    details = []
+    for i in range(12):
+        depth = rng.choice((300, 560, 580))
+        width = rng.choice((300, 400, 450, 500, 600, 800))
+        height = rng.choice((720, 912))
+        details += [
+            Detail(f'Боковина {i + 1}', height, depth, 2),
+            Detail(f'Дно {i + 1}', width - 32, depth, 1),
+            Detail(f'Полка {i + 1}', width - 34, depth - 20, rng.randint(0, 2) or 1),
+            Detail(f'Задняя планка {i + 1}', width - 32, 100, 2),
+        ]
+    return details, [CHIPBOARD], 4
+
+
+def _sandwich(rng: random.Random) -> Case:
+    details = [
+        Detail(f'Панель {i + 1}', rng.randrange(600, 2900, 50), rng.randrange(300, 1450, 50), rng.randint(1, 4))
+        for i in range(25)
+    ]
+    return details, [SANDWICH], 5
+
+
+def _small_parts(rng: random.Random) -> Case:
+    details = [
+        Detail(f'Деталь {i + 1}', rng.randrange(60, 400, 10), rng.randrange(40, 300, 10), rng.randint(5, 30))
+        for i in range(80)
+    ]
+    return details, [CHIPBOARD], 3
+
+
+def _strips(rng: random.Random) -> Case:
+    details = [
+        Detail(f'Полоса {i + 1}', rng.randrange(800, 2750, 50), rng.choice((50, 70, 100, 150)), rng.randint(4, 20), False)
+        for i in range(20)
+    ]
+    return details, [CHIPBOARD], 4
+
+
+def _mixed_sheets(rng: random.Random) -> Case:
+    details = [
+        Detail(f'Деталь {i + 1}', rng.randrange(200, 1400, 10), rng.randrange(150, 900, 10), rng.randint(1, 6))
+        for i in range(40)
+    ]
+    return details, [CHIPBOARD, Sheet('ЛДСП 1830x1220', 1830, 1220)], 4
+
+
+CASES = {
+    'kitchen': _kitchen,
+    'sandwich': _sandwich,
+    'small_parts': _small_parts,
+    'strips': _strips,
+    'mixed_sheets': _mixed_sheets,
+}
+
+
+def _efficiency(details: List[Detail], sheets: List[Sheet], layout: packing.Layout) -> float:
+    result = packing.to_result(details, sheets, 0, layout)
+    return result['totalEfficiency']
+
+
+def run_case(details: List[Detail], sheets: List[Sheet], kerf: float, budget_ms: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    greedy = packing.pack(details, sheets, kerf, GREEDY)
+    greedy_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    result = packing.optimize(details, sheets, kerf, budget_ms)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return {
+        'pieces': sum(d.quantity for d in details),
+        'lower_bound': packing.lower_bound(details, sheets),
+        'greedy_sheets': len(greedy[0]),
+        'greedy_efficiency': _efficiency(details, sheets, greedy),
+        'greedy_ms': round(greedy_ms, 1),
+        'sheets': result['totalSheets'],
+        'efficiency': result['totalEfficiency'],
+        'unplaced': len(result['unplacedDetails']),
+        'evaluated': result['search']['evaluated'],
+        'elapsed_ms': round(elapsed_ms, 1),
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    base_cases = (baseline or {}).get('cases', {})
+    print(f"{'задача':24} {'дет.':>5} {'гр.':>4} {'жадно':>12} {'перебор':>12} {'стратегий':>9} {'мс':>7}")
+    for name, c in report['cases'].items():
+        base = base_cases.get(name)
+        delta = ''
+        if base:
+            delta = f" (было {base['sheets']} л., {base['efficiency']}%)"
+        print(
+            f"{name[:24]:24} {c['pieces']:5} {c['lower_bound']:4} "
+            f"{c['greedy_sheets']:3} / {c['greedy_efficiency']:5.1f}% {c['sheets']:3} / {c['efficiency']:5.1f}% "
+            f"{c['evaluated']:9} {c['elapsed_ms']:7.0f}{delta}"
+        )
+    saved = sum(c['greedy_sheets'] - c['sheets'] for c in report['cases'].values())
+    print(f'\nлистов сэкономлено относительно жадной раскладки: {saved}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=int, action='append', help='бюджет в мс; по умолчанию 500 и 2000')
+    parser.add_argument('--workers', type=int, help='процессов перебора (CUTTING_WORKERS)')
+    parser.add_argument('--case', action='append', choices=sorted(CASES))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench-results-cutting.json')
+    parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+    args = parser.parse_args()
+
+    if args.workers:
+        packing.WORKERS = args.workers
+    budgets = args.budget or [500, 2000]
+    report: Dict[str, Any] = {
+        'meta': {'workers': packing.WORKERS, 'budgets_ms': budgets, 'seed': args.seed},
+        'cases': {}
+    }
+    for name in args.case or CASES:
+        details, sheets, kerf = CASES[name](random.Random(args.seed))
+        for budget_ms in budgets:
+            report['cases'][f'{name}@{budget_ms}ms'] = run_case(details, sheets, kerf, budget_ms)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'Результаты: {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,412 @@
+'''
+Business: Нагрузочный бенчмарк всех функций: синтетические данные в локальной БД и смесь запросов, включая кейсы из tests.json
+Args: DATABASE_URL в окружении; --materials N, --orders N, --concurrency C, --duration S или --requests N,
+      --url для прогона через server.py (иначе обработчики вызываются в процессе), --output, --compare
+Returns: p50/p95/p99, RPS и число SQL-запросов на запрос по сценариям; JSON-файл для сравнения между коммитами
+'''
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Счётчик запросов включается до первого импорта shared.db
+os.environ.setdefault('DB_COUNT_QUERIES', '1')
+
+import psycopg2  # noqa: E402
+
+from shared.db import SCHEMA  # noqa: E402
+
+WORDS = ['профиль', 'лист', 'сетка', 'уголок', 'панель', 'планка', 'отлив', 'саморез', 'уплотнитель', 'заглушка']
+SEARCH_PREFIXES = ['п', 'пр', 'про', 'лис', 'сетк', 'уго', 'панель 1', 'отл', 'само', 'заглушка 12']
+CLIENTS = ['ООО Рога', 'ИП Копыта', 'Стройтех', 'Фасад-М', 'Окна Плюс', 'Металлоторг']
+BENCH_USER = 'bench_manager'
+BENCH_PASSWORD = 'bench-password'
+PERCENTILES = (50, 95, 99)
+
+
+class Scenario(NamedTuple):
+    name: str
+    function: str
+    method: str
+    path: str
+    weight: int
+    body: Optional[bytes] = None
+    headers: Optional[Dict[str, str]] = None
+    expected_status: Optional[int] = None
+
+
+class Result(NamedTuple):
+    scenario: str
+    status: int
+    elapsed_ms: float
+    queries: Optional[int]
+
+
+# --- данные ---------------------------------------------------------------
+
+def seed(conn, materials: int, orders: int) -> Dict[str, int]:
+    '''Вставляет синтетический каталог и заявки; возвращает границы id для последующей очистки.'''
+    from shared.passwords import hash_password
+
+    with conn.cursor() as cur:
+        marks: Dict[str, int] = {}
+        for table in ('materials', 'orders', 'colors', 'categories'):
+            cur.execute(f'SELECT COALESCE(max(id), 0) FROM {SCHEMA}.{table}')
+            marks[table] = cur.fetchone()[0]
+        cur.execute(f'SELECT COALESCE(max(row_version), 0) FROM {SCHEMA}.catalog_deletions')
+        marks['deletions'] = cur.fetchone()[0]
+
+        cur.execute(f"INSERT INTO {SCHEMA}.colors (name) SELECT 'bench color ' || g FROM generate_series(1, 50) g")
+        cur.execute(f"INSERT INTO {SCHEMA}.categories (name) SELECT 'bench section ' || g FROM generate_series(1, 20) g")
+        cur.execute(f'''
+            INSERT INTO {SCHEMA}.materials (name, category_id, color_id)
+            SELECT (%s::text[])[1 + g %% {len(WORDS)}] || ' ' || (g %% 997),
+                   (SELECT array_agg(id) FROM {SCHEMA}.categories WHERE id > %s)[1 + g %% 20],
+                   (SELECT array_agg(id) FROM {SCHEMA}.colors WHERE id > %s)[1 + g %% 50]
+            FROM generate_series(1, %s) g
+        ''', ('{' + ','.join(WORDS) + '}', marks['categories'], marks['colors'], materials))
+
+        cur.execute(f'DELETE FROM {SCHEMA}.users WHERE username = %s', (BENCH_USER,))
+        cur.execute(
+            f"INSERT INTO {SCHEMA}.users (username, password, full_name, role) "
+            f"VALUES (%s, %s, 'Bench', 'manager') RETURNING id",
+            (BENCH_USER, hash_password(BENCH_PASSWORD))
+        )
+        user_id = cur.fetchone()[0]
+        cur.execute(f'''
+            INSERT INTO {SCHEMA}.orders (client_name, description, quantity_ordered, quantity_completed,
+                                         deadline, status, created_by, created_at)
+            SELECT (%s::text[])[1 + g %% {len(CLIENTS)}] || ' ' || (g %% 101), 'bench',
+                   q, c, CURRENT_DATE + (g %% 60 - 20),
+                   CASE WHEN c = 0 THEN 'new' WHEN c >= q THEN 'completed' ELSE 'in_progress' END,
+                   %s, now() - g * interval '1 minute'
+            FROM generate_series(1, %s) g,
+                 LATERAL (SELECT 10 + g %% 990 AS q) qo,
+                 LATERAL (SELECT (g * 7) %% (q + 1) AS c) co
+        ''', ('{' + ','.join(CLIENTS) + '}', user_id, orders))
+        cur.execute('ANALYZE')
+    conn.commit()
+    return marks
+
+
+def cleanup(conn, marks: Dict[str, int]) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f'DELETE FROM {SCHEMA}.orders WHERE id > %s', (marks['orders'],))
+        cur.execute(f'DELETE FROM {SCHEMA}.materials WHERE id > %s', (marks['materials'],))
+        cur.execute(f'DELETE FROM {SCHEMA}.colors WHERE id > %s', (marks['colors'],))
+        cur.execute(f'DELETE FROM {SCHEMA}.categories WHERE id > %s', (marks['categories'],))
+        cur.execute(f'DELETE FROM {SCHEMA}.catalog_deletions WHERE row_version > %s', (marks['deletions'],))
+        cur.execute(f'DELETE FROM {SCHEMA}.users WHERE username = %s', (BENCH_USER,))
+    conn.commit()
+
+
+# --- сценарии -------------------------------------------------------------
+
+def load_tests_json() -> List[Scenario]:
+    '''Кейсы из <функция>/tests.json с ожидаемым статусом; каждый с весом 1.'''
+    scenarios = []
+    for function in sorted(os.listdir(BACKEND_DIR)):
+        path = os.path.join(BACKEND_DIR, function, 'tests.json')
+        if not os.path.isfile(path):
+            continue
+        with open(path, encoding='utf-8') as f:
+            cases = json.load(f).get('tests', [])
+        for case in cases:
+            body = case.get('body')
+            if body is not None and not isinstance(body, str):
+                body = json.dumps(body)
+            scenarios.append(Scenario(
+                name=f"{function}: {case['name']}", function=function, method=case.get('method', 'GET'),
+                path=case.get('path', '/'), weight=1,
+                body=body.encode() if body is not None else None,
+                headers={'Content-Type': 'application/json'} if body is not None else None,
+                expected_status=case.get('expectedStatus')
+            ))
+    return scenarios
+
+
+def synthetic_mix(conn, marks: Dict[str, int], token: str) -> List[Scenario]:
+    '''Смесь запросов рабочей смены: подсказки поиска, синхронизация каталога, список заявок, отметки выполнения.'''
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT version FROM {SCHEMA}.catalog_version')
+        version = cur.fetchone()[0]
+        cur.execute(f'SELECT id FROM {SCHEMA}.orders WHERE id > %s ORDER BY random() LIMIT 200', (marks['orders'],))
+        order_ids = [row[0] for row in cur.fetchall()]
+
+    auth = {'X-Auth-Token': token}
+    scenarios = [
+        Scenario(f'materials: search {prefix!r}', 'materials', 'GET', f'/?q={quote(prefix)}&limit=10', 2)
+        for prefix in SEARCH_PREFIXES
+    ]
+    scenarios += [
+        Scenario('materials: delta since start', 'materials', 'GET', f'/?since={version}', 10),
+        Scenario('colors: list', 'colors', 'GET', '/', 5),
+        Scenario('colors: revalidate', 'colors', 'GET', '/', 10, headers={'If-None-Match': '*'}, expected_status=304),
+        Scenario('sections: list', 'sections', 'GET', '/', 5),
+        Scenario('orders: first page new', 'orders', 'GET', '/?status=new&limit=20', 10),
+        Scenario('orders: first page all', 'orders', 'GET', '/?limit=50', 5),
+        Scenario('orders: client prefix', 'orders', 'GET', f'/?client={quote(CLIENTS[2])}&limit=20', 5),
+        Scenario('auth: list users', 'auth', 'GET', '/', 3, headers=auth, expected_status=200),
+        Scenario(
+            'auth: login', 'auth', 'POST', '/', 1,
+            body=json.dumps({'action': 'login', 'username': BENCH_USER, 'password': BENCH_PASSWORD}).encode(),
+            headers={'Content-Type': 'application/json'}, expected_status=200
+        ),
+    ]
+    rng = random.Random(0)
+    for i in range(5):
+        batch = {'updates': [{'id': order_id, 'quantity_completed': 1} for order_id in rng.sample(order_ids, 10)]}
+        scenarios.append(Scenario(
+            f'orders: batch progress #{i + 1}', 'orders', 'PUT', '/?action=batch', 1,
+            body=json.dumps(batch).encode(), headers={'Content-Type': 'application/json'}, expected_status=200
+        ))
+    return scenarios
+
+
+# --- исполнители ----------------------------------------------------------
+
+class InProcessClient:
+    '''Вызывает обработчики напрямую, собирая событие так же, как server.py.'''
+
+    def __init__(self):
+        import server
+        self.server = server
+        self.functions = server.discover_functions()
+
+    def request(self, scenario: Scenario) -> Tuple[int, Optional[int], Dict[str, Any]]:
+        request = self.server.Request(
+            method=scenario.method, target=f'/api/{scenario.function}{scenario.path}', version='HTTP/1.1',
+            headers=dict(scenario.headers or {}), body=scenario.body or b''
+        )
+        event, context = self.server.build_event(request, scenario.function, '/', '127.0.0.1')
+        result = self.server.invoke(self.functions[scenario.function], event, context)
+        headers = result.get('headers') or {}
+        queries = headers.get('X-Db-Queries')
+        return int(result.get('statusCode', 200)), int(queries) if queries else None, result
+
+
+class HttpClient:
+    '''Отдельное keep-alive соединение на поток; число запросов к БД — из X-Db-Queries.'''
+
+    def __init__(self, url: str):
+        import http.client
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def request(self, scenario: Scenario) -> Tuple[int, Optional[int], Dict[str, Any]]:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = self.connection_class(self.netloc, timeout=60)
+        path = f'{self.prefix}/api/{scenario.function}{scenario.path}'
+        try:
+            conn.request(scenario.method, path, body=scenario.body, headers=scenario.headers or {})
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, ConnectionError):
+            conn.close()
+            self.local.conn = None
+            raise
+        queries = response.getheader('X-Db-Queries')
+        return response.status, int(queries) if queries else None, {'body': body.decode('utf-8', 'replace')}
+
+
+def login(client, scenario: Scenario) -> str:
+    status, _, result = client.request(scenario)
+    if status != 200:
+        raise SystemExit(f'Не удалось войти пользователем {BENCH_USER}: HTTP {status}')
+    return json.loads(result['body'])['token']
+
+
+def run(client, scenarios: List[Scenario], concurrency: int, duration: float,
+        total: Optional[int], seed_value: int) -> Tuple[List[Result], float]:
+    weights = [s.weight for s in scenarios]
+    results: List[Result] = []
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int) -> None:
+        rng = random.Random(seed_value + index)
+        local: List[Result] = []
+        while True:
+            if total is not None:
+                with lock:
+                    if issued[0] >= total:
+                        break
+                    issued[0] += 1
+            elif time.perf_counter() >= deadline:
+                break
+            scenario = rng.choices(scenarios, weights)[0]
+            started = time.perf_counter()
+            try:
+                status, queries, _ = client.request(scenario)
+            except Exception:
+                status, queries = 0, None
+            local.append(Result(scenario.name, status, (time.perf_counter() - started) * 1000, queries))
+        with lock:
+            results.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    return results, time.perf_counter() - started
+
+
+# --- отчёт ----------------------------------------------------------------
+
+def _percentile(sorted_values: List[float], p: int) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(results: List[Result], wall: float, expected: Dict[str, Optional[int]]) -> Dict[str, Any]:
+    def stats(rows: List[Result]) -> Dict[str, Any]:
+        latencies = sorted(r.elapsed_ms for r in rows)
+        counted = [r.queries for r in rows if r.queries is not None]
+        summary = {
+            'requests': len(rows),
+            'errors': sum(1 for r in rows if r.status == 0 or r.status >= 500),
+            'unexpected_status': sum(
+                1 for r in rows if expected.get(r.scenario) is not None and r.status != expected[r.scenario]
+            ),
+            'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            'queries_per_request': round(sum(counted) / len(counted), 2) if counted else None,
+        }
+        for p in PERCENTILES:
+            summary[f'p{p}_ms'] = round(_percentile(latencies, p), 3)
+        return summary
+
+    by_scenario: Dict[str, List[Result]] = {}
+    for r in results:
+        by_scenario.setdefault(r.scenario, []).append(r)
+    overall = stats(results)
+    overall['rps'] = round(len(results) / wall, 1) if wall else 0.0
+    overall['wall_s'] = round(wall, 2)
+    return {'overall': overall, 'scenarios': {name: stats(rows) for name, rows in sorted(by_scenario.items())}}
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    def delta(current: float, previous: Optional[float]) -> str:
+        if not previous:
+            return ''
+        return f' ({(current - previous) / previous * 100:+.0f}%)'
+
+    base_scenarios = (baseline or {}).get('scenarios', {})
+    print(f"{'сценарий':44} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'SQL':>5} {'ош.':>4}")
+    for name, s in report['scenarios'].items():
+        base = base_scenarios.get(name, {})
+        queries = '' if s['queries_per_request'] is None else f"{s['queries_per_request']:.1f}"
+        print(
+            f"{name[:44]:44} {s['requests']:6} {s['p50_ms']:8.2f} {s['p95_ms']:8.2f} {s['p99_ms']:8.2f} "
+            f"{queries:>5} {s['errors'] + s['unexpected_status']:4}{delta(s['p95_ms'], base.get('p95_ms'))}"
+        )
+    overall = report['overall']
+    base_overall = (baseline or {}).get('overall', {})
+    print(
+        f"\nвсего {overall['requests']} запросов за {overall['wall_s']} с: {overall['rps']} RPS"
+        f"{delta(overall['rps'], base_overall.get('rps'))}, "
+        f"p50 {overall['p50_ms']} мс, p95 {overall['p95_ms']} мс{delta(overall['p95_ms'], base_overall.get('p95_ms'))}, "
+        f"p99 {overall['p99_ms']} мс, SQL на запрос {overall['queries_per_request']}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--materials', type=int, default=10000)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('DB_POOL_MAX', '5')))
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--requests', type=int, help='фиксированное число запросов вместо --duration')
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--url', help='адрес запущенного server.py, например http://127.0.0.1:8000')
+    parser.add_argument('--exclude', help='регулярное выражение: пропустить сценарии с подходящим именем')
+    parser.add_argument('--no-tests-json', action='store_true', help='не добавлять кейсы из tests.json')
+    parser.add_argument('--keep-data', action='store_true', help='не удалять синтетические данные после прогона')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+    args = parser.parse_args()
+
+    if not args.url:
+        os.environ.setdefault('SESSION_SECRET', 'bench-session-secret')
+        # Кейсы неудачного входа из tests.json иначе быстро упрутся в ограничение попыток
+        os.environ.setdefault('LOGIN_RATE_USER_LIMIT', '1000000')
+        os.environ.setdefault('LOGIN_RATE_IP_LIMIT', '1000000')
+    client = HttpClient(args.url) if args.url else InProcessClient()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    started = time.perf_counter()
+    marks = seed(conn, args.materials, args.orders)
+    seed_s = time.perf_counter() - started
+    print(f'Данные: {args.materials} материалов, {args.orders} заявок за {seed_s:.1f} с')
+    try:
+        login_scenario = Scenario(
+            'login', 'auth', 'POST', '/', 1,
+            body=json.dumps({'action': 'login', 'username': BENCH_USER, 'password': BENCH_PASSWORD}).encode(),
+            headers={'Content-Type': 'application/json'}
+        )
+        scenarios = synthetic_mix(conn, marks, login(client, login_scenario))
+        if not args.no_tests_json:
+            scenarios += load_tests_json()
+        if args.exclude:
+            scenarios = [s for s in scenarios if not re.search(args.exclude, s.name)]
+
+        run(client, scenarios, args.concurrency, 0, args.warmup, args.seed + 1000)
+        results, wall = run(client, scenarios, args.concurrency, args.duration, args.requests, args.seed)
+    finally:
+        if not args.keep_data:
+            cleanup(conn, marks)
+        conn.close()
+
+    report = summarize(results, wall, {s.name: s.expected_status for s in scenarios})
+    report['meta'] = {
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'mode': 'http' if args.url else 'in-process',
+        'materials': args.materials,
+        'orders': args.orders,
+        'concurrency': args.concurrency,
+        'duration_s': args.duration if args.requests is None else None,
+        'requests': args.requests,
+        'seed_s': round(seed_s, 1),
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'Результаты: {args.output}')
+
+
+if __name__ == '__main__':
+    main()
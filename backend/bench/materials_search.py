@@ -0,0 +1,76 @@
+'''
+Business: Задержка поиска-подсказки по материалам (GET /materials?q=) на синтетическом каталоге
+Args: DATABASE_URL в окружении (нужно расширение pg_trgm); --materials N (по умолчанию 1000000), --repeat R
+Returns: печатает p50/p95 задержки для PREFIXES (префикс search_text, при нехватке — ранжированный поиск); данные откатываются в конце
+'''
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import psycopg2  # noqa: E402
+
+from shared.db import SCHEMA  # noqa: E402
+
+WORDS = ['профиль', 'лист', 'сетка', 'уголок', 'панель', 'планка', 'отлив', 'саморез', 'уплотнитель', 'заглушка']
+PREFIXES = ['п', 'пр', 'про', 'лис', 'сетк', 'уго', 'панель бел', 'отл', 'само', 'заглушка 12']
+
+
+def _load_search(module_path: str):
+    import importlib.util
+    spec = importlib.util.spec_from_file_location('materials_index', module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--materials', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    materials = _load_search(os.path.join(BACKEND_DIR, 'materials', 'index.py'))
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with conn.cursor() as cur:
+            # Без настоящего pg_trgm (например, с заглушкой similarity()) цифры ничего не говорят о проде
+            cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            if cur.fetchone() is None:
+                sys.exit('pg_trgm is not installed in this database')
+            words = '{' + ','.join(WORDS) + '}'
+            cur.execute(f'''
+                INSERT INTO {SCHEMA}.materials (name, category_id, color_id)
+                SELECT (%s::text[])[1 + g %% {len(WORDS)}] || ' ' || (g %% 997),
+                       (SELECT min(id) FROM {SCHEMA}.categories),
+                       (SELECT min(id) FROM {SCHEMA}.colors)
+                FROM generate_series(1, %s) g
+            ''', (words, args.materials))
+            cur.execute(f'ANALYZE {SCHEMA}.materials')
+
+            print(f'{args.materials} материалов')
+            for prefix in PREFIXES:
+                search = materials._search_params({'q': prefix})
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    cur.execute(materials.SEARCH_PREFIX_QUERY, search)
+                    if len(cur.fetchall()) < search['limit']:
+                        cur.execute(materials.SEARCH_QUERY, search)
+                        cur.fetchall()
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                print(f'{prefix!r:16} p50 {statistics.median(timings):6.2f} мс  p95 {p95:6.2f} мс')
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+'''
+Business: Стоимость проверки пароля при входе для разных параметров scrypt — для выбора PASSWORD_SCRYPT_N и числа одновременных логинов
+Args: --costs список log2(N) (по умолчанию 12..16), --repeat R, --budget бюджет задержки входа в мс
+Returns: печатает время и память на одну проверку, входов в секунду на ядро и укладывается ли вариант в бюджет
+'''
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from shared import passwords  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--costs', type=int, nargs='+', default=[12, 13, 14, 15, 16])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=250.0)
+    args = parser.parse_args()
+
+    print(f'r={passwords.SCRYPT_R} p={passwords.SCRYPT_P}, бюджет входа {args.budget:.0f} мс')
+    for cost in args.costs:
+        n = 2 ** cost
+        stored = passwords.hash_password('bench-password', n=n)
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            passwords.verify_password(stored, 'bench-password')
+            timings.append((time.perf_counter() - started) * 1000)
+        median = statistics.median(timings)
+        memory_mb = 128 * n * passwords.SCRYPT_R * passwords.SCRYPT_P / 2 ** 20
+        verdict = 'ok' if median <= args.budget else 'выше бюджета'
+        print(
+            f'N=2^{cost:<2} {median:7.1f} мс  {memory_mb:5.0f} МБ  '
+            f'{1000 / median:6.1f} входов/с на ядро  {verdict}'
+        )
+
+
+if __name__ == '__main__':
+    main()
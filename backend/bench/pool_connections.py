@@ -0,0 +1,80 @@
+'''
+Business: Сравнение числа подключений к БД на 1000 запросов: пул shared.db против connect() на каждый вызов
+Args: DATABASE_URL в окружении; --requests N (по умолчанию 1000), --function имя функции backend
+Returns: печатает число открытых соединений и среднюю задержку для каждого режима
+'''
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import psycopg2  # noqa: E402
+
+from shared import db  # noqa: E402
+
+_connects = 0
+_real_connect = psycopg2.connect
+
+
+def _counting_connect(*args, **kwargs):
+    global _connects
+    _connects += 1
+    return _real_connect(*args, **kwargs)
+
+
+@contextmanager
+def _connect_per_call():
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _load_handler(function: str):
+    path = os.path.join(BACKEND_DIR, function, 'index.py')
+    spec = importlib.util.spec_from_file_location(f'{function}_index', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _run(module, requests: int) -> float:
+    event = {'httpMethod': 'GET', 'headers': {}, 'queryStringParameters': {}}
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = module.handler(event, None)
+        assert response['statusCode'] == 200, response
+    return (time.perf_counter() - started) / requests * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--function', default='colors')
+    args = parser.parse_args()
+
+    global _connects
+    psycopg2.connect = _counting_connect
+    module = _load_handler(args.function)
+
+    module.get_connection = _connect_per_call
+    _connects = 0
+    direct_ms = _run(module, args.requests)
+    print(f'connect() на вызов: {_connects} соединений, {direct_ms:.2f} мс/запрос')
+
+    module.get_connection = db.get_connection
+    _connects = 0
+    pooled_ms = _run(module, args.requests)
+    print(f'пул shared.db:      {_connects} соединений, {pooled_ms:.2f} мс/запрос')
+    db.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+'''
+Business: Проверка маршрутизации чтений на реплики: GET на реплику, запись на primary, закрепление после записи, уход с отстающей и недоступной реплики
+Args: DATABASE_URL (primary) и DATABASE_REPLICA_URLS (потоковая реплика) в окружении; --dead-replica добавляет недоступный DSN
+Returns: печатает результат каждой проверки, код выхода 1 при провале; тестовые цвета удаляются в конце
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Короткие окна, чтобы проверка шла секунды; задаются до импорта shared.db
+os.environ.setdefault('DB_REPLICA_MAX_LAG', '2')
+os.environ.setdefault('DB_REPLICA_CHECK_INTERVAL', '0.2')
+os.environ.setdefault('DB_REPLICA_RETRY', '2')
+os.environ.setdefault('DB_PRIMARY_PIN', '2')
+os.environ.setdefault('SESSION_SECRET', 'bench-session-secret')
+
+DEAD_REPLICA = 'host=127.0.0.1 port=1 dbname=postgres connect_timeout=1'
+TEST_COLOR = 'replica-check'
+
+
+def _event(method: str, ip: str, body: dict = None, params: dict = None) -> dict:
+    event = {
+        'httpMethod': method,
+        'headers': {},
+        'queryStringParameters': params or {},
+        'requestContext': {'identity': {'sourceIp': ip}}
+    }
+    if body is not None:
+        event['body'] = json.dumps(body)
+    return event
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dead-replica', action='store_true', help='проверить уход с недоступной реплики')
+    args = parser.parse_args()
+    if args.dead_replica:
+        os.environ['DATABASE_REPLICA_URLS'] = DEAD_REPLICA
+    if not os.environ.get('DATABASE_REPLICA_URLS'):
+        sys.exit('DATABASE_REPLICA_URLS is not set')
+
+    import importlib.util
+    import psycopg2
+    from shared import db
+
+    spec = importlib.util.spec_from_file_location('colors_function', os.path.join(BACKEND_DIR, 'colors', 'index.py'))
+    colors = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(colors)
+
+    def reads_replica(pin_key: str = None) -> bool:
+        with db.get_connection(read_only=True, pin_key=pin_key) as conn:
+            with conn.cursor() as cur:
+                cur.execute('SELECT pg_is_in_recovery()')
+                return cur.fetchone()[0]
+
+    def color_names(ip: str) -> List[str]:
+        return [c['name'] for c in json.loads(colors.handler(_event('GET', ip), None)['body'])]
+
+    results: List[Tuple[str, bool]] = []
+
+    def check(name: str, passed: Callable[[], bool]) -> None:
+        ok = bool(passed())
+        results.append((name, ok))
+        print(f"{'OK  ' if ok else 'FAIL'} {name}")
+
+    if args.dead_replica:
+        check('чтение при недоступной реплике идёт на primary', lambda: not reads_replica())
+        check('недоступная реплика не пробуется повторно до DB_REPLICA_RETRY',
+              lambda: db._replica_down_until.get('replica0', 0) > time.monotonic())
+    else:
+        replica_dsn = os.environ['DATABASE_REPLICA_URLS'].split(';')[0]
+        replica = psycopg2.connect(replica_dsn)
+        replica.autocommit = True
+        try:
+            check('GET читает с реплики', lambda: reads_replica())
+            with db.get_connection() as conn, conn.cursor() as cur:
+                cur.execute('SELECT pg_is_in_recovery()')
+                on_primary = not cur.fetchone()[0]
+            check('соединение для записи — primary', lambda: on_primary)
+
+            created = colors.handler(_event('POST', '10.0.0.1', {'name': TEST_COLOR}), None)
+            check('запись через функцию прошла', lambda: created['statusCode'] == 201)
+            check('автор записи читает с primary', lambda: not reads_replica('ip:10.0.0.1'))
+            check('другой клиент читает с реплики', lambda: reads_replica('ip:10.0.0.2'))
+            time.sleep(float(os.environ['DB_PRIMARY_PIN']) + 0.1)
+            check('после окна закрепления автор читает с реплики', lambda: reads_replica('ip:10.0.0.1'))
+
+            # Свежая транзакция, применённая репликой, затем пауза применения WAL:
+            # новая запись есть только на primary, а отставание начинает расти с нуля
+            with db.get_connection() as conn, conn.cursor() as cur:
+                cur.execute(f'UPDATE {db.SCHEMA}.colors SET hex_code = hex_code WHERE name = %s', (TEST_COLOR,))
+                conn.commit()
+                cur.execute('SELECT pg_current_wal_lsn()')
+                lsn = cur.fetchone()[0]
+            with replica.cursor() as cur:
+                for _ in range(100):
+                    cur.execute('SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn', (lsn,))
+                    if cur.fetchone()[0]:
+                        break
+                    time.sleep(0.05)
+                cur.execute('SELECT pg_wal_replay_pause()')
+            colors.handler(_event('POST', '10.0.0.4', {'name': TEST_COLOR + '-2'}), None)
+            check('автор видит свою запись сразу (закрепление за primary)',
+                  lambda: TEST_COLOR + '-2' in color_names('10.0.0.4'))
+            check('другой клиент пока читает с реплики без неё',
+                  lambda: TEST_COLOR + '-2' not in color_names('10.0.0.5'))
+
+            time.sleep(float(os.environ['DB_REPLICA_MAX_LAG']) + float(os.environ['DB_REPLICA_CHECK_INTERVAL']) + 0.2)
+            reads_replica()  # первое чтение после интервала перепроверяет отставание
+            check('при отставании больше DB_REPLICA_MAX_LAG чтение идёт на primary', lambda: not reads_replica())
+            check('с отстающей реплики данные не читаются', lambda: TEST_COLOR + '-2' in color_names('10.0.0.6'))
+        finally:
+            with replica.cursor() as cur:
+                cur.execute('SELECT pg_wal_replay_resume()')
+            replica.close()
+        time.sleep(float(os.environ['DB_REPLICA_CHECK_INTERVAL']) + 0.5)
+        reads_replica()
+        check('после догона реплики чтение возвращается на неё', lambda: reads_replica())
+
+    with db.get_connection() as conn, conn.cursor() as cur:
+        cur.execute(f'DELETE FROM {db.SCHEMA}.colors WHERE name IN (%s, %s)', (TEST_COLOR, TEST_COLOR + '-2'))
+        conn.commit()
+    db.close_pool()
+
+    failed = [name for name, ok in results if not ok]
+    print(f'\n{len(results) - len(failed)} из {len(results)} проверок пройдено')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
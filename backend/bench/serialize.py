@@ -0,0 +1,95 @@
+'''
+Business: Стоимость сборки тела большого списка заказов: RealDictCursor + json.dumps(default=str) против текстового курсора и сжатия
+Args: DATABASE_URL в окружении; --rows N (по умолчанию 20000), --repeat R
+Returns: печатает время выборки и сериализации, размер тела и время gzip/br; данные откатываются в конце
+'''
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import psycopg2  # noqa: E402
+from psycopg2.extras import RealDictCursor  # noqa: E402
+
+from shared import serialize  # noqa: E402
+from shared.db import SCHEMA  # noqa: E402
+
+QUERY = f'''
+    SELECT o.id, o.client_name, o.description, o.quantity_ordered, o.quantity_completed,
+           o.deadline, o.status, o.created_by, o.created_at, u.full_name as created_by_name
+    FROM {SCHEMA}.orders o
+    LEFT JOIN {SCHEMA}.users u ON o.created_by = u.id
+    ORDER BY o.status_rank, o.created_at DESC, o.id DESC
+    LIMIT %s
+'''
+
+
+def _median_ms(run, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'''
+                INSERT INTO {SCHEMA}.orders (client_name, description, quantity_ordered, quantity_completed,
+                                             deadline, status, created_at)
+                SELECT 'Клиент ' || (g %% 101), 'Изделие по чертежу №' || g, 100, g %% 100,
+                       CURRENT_DATE + (g %% 60), 'in_progress', now() - g * interval '1 minute'
+                FROM generate_series(1, %s) g
+            ''', (args.rows,))
+
+        def baseline():
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(QUERY, (args.rows,))
+                return json.dumps([dict(r) for r in cur.fetchall()], default=str)
+
+        def text_rows():
+            with serialize.text_cursor(conn) as cur:
+                cur.execute(QUERY, (args.rows,))
+                return serialize.json_body('bench', serialize.records(cur, cur.fetchall()))
+
+        baseline_ms, baseline_body = _median_ms(baseline, args.repeat)
+        text_ms, text_body = _median_ms(text_rows, args.repeat)
+        same = json.loads(baseline_body) == json.loads(text_body)
+        print(f'{args.rows} строк')
+        print(f'RealDictCursor + default=str  {baseline_ms:8.1f} мс  {len(baseline_body) / 1024:8.0f} КБ')
+        print(f'text_cursor + records         {text_ms:8.1f} мс  {len(text_body) / 1024:8.0f} КБ  совпадает: {same}')
+
+        encodings = ['gzip, br', 'gzip'] if serialize.brotli is not None else ['gzip']
+        for accept in encodings:
+            event = {'headers': {'Accept-Encoding': accept}}
+            compress_ms, response = _median_ms(
+                lambda: serialize.compress(event, {'statusCode': 200, 'headers': {}, 'body': text_body}),
+                args.repeat
+            )
+            size = len(response['body']) * 3 / 4
+            print(
+                f"{response['headers']['Content-Encoding']:<5} {compress_ms:8.1f} мс  "
+                f'{size / 1024:8.0f} КБ  ({size / len(text_body):.0%} от исходного)'
+            )
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
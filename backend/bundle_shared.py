@@ -0,0 +1,58 @@
+'''
+Business: Копирует backend/shared в папку каждой функции перед загрузкой в облачные функции: функция загружается одна, без соседних папок
+Args: --clean удаляет копии, --check проверяет, что копии совпадают с backend/shared (код выхода 1, если нет)
+Returns: печатает функции, в которые скопирован shared; server.py копии не нужны, он берёт backend/shared
+'''
+
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+from typing import List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARED_DIR = os.path.join(BACKEND_DIR, 'shared')
+SKIP_DIRS = {'shared', 'bench'}
+IGNORE = shutil.ignore_patterns('__pycache__', '*.pyc')
+
+
+def functions() -> List[str]:
+    '''Те же папки, что server.py делает маршрутами: с index.py внутри.'''
+    return [
+        name for name in sorted(os.listdir(BACKEND_DIR))
+        if name not in SKIP_DIRS and os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    ]
+
+
+def _same(left: str, right: str) -> bool:
+    compare = filecmp.dircmp(left, right, ignore=['__pycache__'])
+    if compare.left_only or compare.right_only or compare.diff_files or compare.funny_files:
+        return False
+    return all(_same(os.path.join(left, sub), os.path.join(right, sub)) for sub in compare.common_dirs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clean', action='store_true', help='удалить копии shared из папок функций')
+    parser.add_argument('--check', action='store_true', help='проверить, что копии не устарели')
+    args = parser.parse_args()
+
+    stale = []
+    for name in functions():
+        target = os.path.join(BACKEND_DIR, name, 'shared')
+        if args.check:
+            if not os.path.isdir(target) or not _same(SHARED_DIR, target):
+                stale.append(name)
+            continue
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        if not args.clean:
+            shutil.copytree(SHARED_DIR, target, ignore=IGNORE)
+            print(f'{name}/shared')
+    if stale:
+        sys.exit(f"shared is missing or outdated in: {', '.join(stale)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,11 +5,28 @@ Returns: HTTP response с данными цветов или статусом о
 '''
 
 import json
-import os
 from typing import Dict, Any
-import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from shared import audit, events, queries
+from shared.catalog import VERSION_HEADER, catalog_version, deleted_since, parse_since, resource_version
+from shared.db import get_connection
+from shared.http import cache_control, etag_matches, make_etag, not_modified
+from shared.metrics import instrument
+from shared.serialize import compress, json_body, records, text_cursor
+from shared.sessions import authenticate, pin_key
+
+LIST_QUERY = '''
+    SELECT c.id, c.name, c.hex_code, c.created_at, c.usage_count
+    FROM t_p61217265_workplace_management.colors c
+    {where}
+    ORDER BY c.usage_count DESC, c.name
+'''
+LIST = queries.statement('colors_list', LIST_QUERY.format(where=''))
+LIST_CHANGED = queries.statement('colors_changed', LIST_QUERY.format(where='WHERE c.row_version > %s'))
+
+
+@instrument('colors')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -19,32 +36,59 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Authorization, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    
-    try:
+    with get_connection(read_only=method == 'GET', pin_key=pin_key(event)) as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             if method == 'GET':
-                cur.execute('''
-                    SELECT c.id, c.name, c.hex_code, c.created_at, 
-                           COUNT(m.id) as usage_count
-                    FROM t_p61217265_workplace_management.colors c
-                    LEFT JOIN t_p61217265_workplace_management.materials m ON c.id = m.color_id
-                    GROUP BY c.id, c.name, c.hex_code, c.created_at
-                    ORDER BY COUNT(m.id) DESC, c.name
-                ''')
-                colors = cur.fetchall()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(c) for c in colors], default=str)
+                try:
+                    since = parse_since(event.get('queryStringParameters') or {})
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid since parameter'})
+                    }
+                
+                etag = make_etag('colors', resource_version(cur, ('colors',)))
+                caching = cache_control('colors')
+                if since is None and etag_matches(event, etag):
+                    return not_modified(etag, caching)
+                
+                version = catalog_version(cur)
+                with text_cursor(conn) as rows_cur:
+                    if since is None:
+                        queries.execute(rows_cur, LIST)
+                    else:
+                        queries.execute(rows_cur, LIST_CHANGED, (since,))
+                    colors = records(rows_cur, rows_cur.fetchall())
+                headers = {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': f'{VERSION_HEADER}, ETag',
+                    VERSION_HEADER: str(version),
+                    'ETag': etag,
+                    'Cache-Control': caching
                 }
+                if since is not None:
+                    return compress(event, {
+                        'statusCode': 200,
+                        'headers': headers,
+                        'body': json_body('colors', {
+                            'version': version,
+                            'changed': colors,
+                            'deleted': deleted_since(cur, 'colors', since)
+                        })
+                    })
+                return compress(event, {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json_body('colors', colors)
+                })
             
             elif method == 'POST':
                 data = json.loads(event.get('body', '{}'))
@@ -54,6 +98,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     RETURNING id, name, hex_code
                 ''', (data['name'], data.get('hex_code', '#808080')))
                 color = cur.fetchone()
+                events.notify(cur, 'colors', 'create', [color])
+                audit.record(cur, 'colors', 'create', authenticate(event), [(None, color)])
                 conn.commit()
                 return {
                     'statusCode': 201,
@@ -64,7 +110,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             elif method == 'DELETE':
                 params = event.get('queryStringParameters', {})
                 color_id = params.get('id')
-                cur.execute('DELETE FROM t_p61217265_workplace_management.colors WHERE id = %s', (color_id,))
+                cur.execute(
+                    'DELETE FROM t_p61217265_workplace_management.colors WHERE id = %s RETURNING id, name, hex_code',
+                    (color_id,)
+                )
+                deleted = cur.fetchone()
+                if deleted:
+                    events.notify(cur, 'colors', 'delete', ids=[int(color_id)])
+                    audit.record(cur, 'colors', 'delete', authenticate(event), [(deleted, None)])
                 conn.commit()
                 return {
                     'statusCode': 200,
@@ -72,9 +125,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'success': True})
                 }
     
-    finally:
-        conn.close()
-    
     return {
         'statusCode': 405,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -0,0 +1,246 @@
+'''
+Business: Проекты раскроя листов: расчёт раскладки деталей на сервере, хранение и пересчёт в cutting_projects
+Args: event с httpMethod (GET/POST/PUT/DELETE); body с name, details, sheets, kerf, budget_ms; ?id=, ?action=optimize
+Returns: HTTP response с проектом и раскладкой в формате OptimizationResult или списком проектов
+'''
+
+import json
+from typing import Dict, Any, List, Tuple
+from psycopg2.extras import RealDictCursor
+
+from shared import packing
+from shared.db import get_connection
+from shared.metrics import instrument
+from shared.serialize import compress, json_body, records, text_cursor
+from shared.sessions import authenticate, pin_key
+
+MAX_PIECES = 5000
+MAX_DETAIL_TYPES = 500
+
+
+def _positive(value: Any, name: str) -> float:
+    number = float(value)
+    if not 0 < number < float('inf'):
+        raise ValueError(f'{name} must be positive')
+    return int(number) if number.is_integer() else number
+
+
+def _parse_input(data: Dict[str, Any]) -> Tuple[List[packing.Detail], List[packing.Sheet], float]:
+    details = [
+        packing.Detail(
+            str(item.get('name') or f'Деталь {i + 1}'),
+            _positive(item['width'], 'width'),
+            _positive(item['height'], 'height'),
+            int(item.get('quantity', 1)),
+            bool(item.get('rotatable', True))
+        )
+        for i, item in enumerate(data['details'])
+    ]
+    sheets = [
+        packing.Sheet(str(item.get('name') or f'Лист {i + 1}'), _positive(item['width'], 'width'), _positive(item['height'], 'height'))
+        for i, item in enumerate(data['sheets'])
+    ]
+    if not details or not sheets:
+        raise ValueError('details and sheets must be non-empty')
+    if len(details) > MAX_DETAIL_TYPES:
+        raise ValueError(f'at most {MAX_DETAIL_TYPES} detail types')
+    if any(d.quantity < 1 for d in details):
+        raise ValueError('quantity must be at least 1')
+    if sum(d.quantity for d in details) > MAX_PIECES:
+        raise ValueError(f'at most {MAX_PIECES} pieces per project')
+    kerf = float(data.get('kerf') or 0)
+    if kerf < 0:
+        raise ValueError('kerf must be non-negative')
+    return details, sheets, int(kerf) if kerf.is_integer() else kerf
+
+
+def _parse_budget(data: Dict[str, Any]) -> int:
+    budget_ms = int(data.get('budget_ms') or packing.DEFAULT_BUDGET_MS)
+    if not 0 < budget_ms <= packing.MAX_BUDGET_MS:
+        raise ValueError(f'budget_ms must be between 1 and {packing.MAX_BUDGET_MS}')
+    return budget_ms
+
+
+def _input_json(details: List[packing.Detail], sheets: List[packing.Sheet], kerf: float) -> str:
+    return json.dumps({
+        'details': [d._asdict() for d in details],
+        'sheets': [s._asdict() for s in sheets],
+        'kerf': kerf
+    }, ensure_ascii=False)
+
+
+def _summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'totalSheets': result.get('totalSheets'),
+        'totalEfficiency': result.get('totalEfficiency'),
+        'unplaced': len(result.get('unplacedDetails') or [])
+    }
+
+
+@instrument('cutting')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Authorization',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    params = event.get('queryStringParameters') or {}
+
+    if method == 'POST':
+        try:
+            data = json.loads(event.get('body') or '{}')
+            details, sheets, kerf = _parse_input(data)
+            budget_ms = _parse_budget(data)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f'Invalid project: {e}'})
+            }
+        # Расчёт до получения соединения: пул не держит соединение, пока идёт перебор
+        result = packing.optimize(details, sheets, kerf, budget_ms)
+        with get_connection(pin_key=pin_key(event)) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute('''
+                    INSERT INTO t_p61217265_workplace_management.cutting_projects
+                        (name, description, sheets_data, optimization_data, created_by)
+                    VALUES (%s, %s, %s, %s, %s)
+                    RETURNING id, name, description, created_at, updated_at
+                ''', (data.get('name') or 'Раскрой', data.get('description'), _input_json(details, sheets, kerf),
+                      json.dumps(result, ensure_ascii=False), authenticate(event)))
+                project = cur.fetchone()
+                conn.commit()
+        return compress(event, {
+            'statusCode': 201,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json_body('cutting', dict(project, optimization=result))
+        })
+
+    if method == 'PUT' and params.get('action') == 'optimize':
+        try:
+            project_id = int(params['id'])
+            budget_ms = _parse_budget(json.loads(event.get('body') or '{}'))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f'Invalid request: {e}'})
+            }
+        with get_connection(pin_key=pin_key(event)) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(
+                    'SELECT sheets_data FROM t_p61217265_workplace_management.cutting_projects WHERE id = %s',
+                    (project_id,)
+                )
+                row = cur.fetchone()
+        if row is None:
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Project not found'})
+            }
+        try:
+            details, sheets, kerf = _parse_input(row['sheets_data'])
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f'Project has no valid input: {e}'})
+            }
+        result = packing.optimize(details, sheets, kerf, budget_ms)
+
+        with get_connection(pin_key=pin_key(event)) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # Сравнение с раскладкой на момент записи: параллельный пересчёт мог её уже улучшить
+                cur.execute('''
+                    SELECT optimization_data FROM t_p61217265_workplace_management.cutting_projects
+                    WHERE id = %s FOR UPDATE
+                ''', (project_id,))
+                current = cur.fetchone()
+                previous = (current or {}).get('optimization_data') or {}
+                improved = current is not None and (
+                    not previous.get('sheets') or packing.result_cost(result) < packing.result_cost(previous)
+                )
+                if improved:
+                    cur.execute('''
+                        UPDATE t_p61217265_workplace_management.cutting_projects
+                        SET optimization_data = %s, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = %s
+                    ''', (json.dumps(result, ensure_ascii=False), project_id))
+                conn.commit()
+        return compress(event, {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json_body('cutting', {
+                'id': project_id,
+                'improved': improved,
+                'previous': _summary(previous),
+                'optimization': result if improved else previous,
+                'candidate': _summary(result)
+            })
+        })
+
+    with get_connection(read_only=method == 'GET', pin_key=pin_key(event)) as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if method == 'GET' and params.get('id'):
+                cur.execute('''
+                    SELECT id, name, description, sheets_data, optimization_data, created_by, created_at, updated_at
+                    FROM t_p61217265_workplace_management.cutting_projects
+                    WHERE id = %s
+                ''', (params['id'],))
+                project = cur.fetchone()
+                if project is None:
+                    return {
+                        'statusCode': 404,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Project not found'})
+                    }
+                return compress(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json_body('cutting', dict(project))
+                })
+
+            if method == 'GET':
+                with text_cursor(conn) as rows_cur:
+                    rows_cur.execute('''
+                        SELECT id, name, description, created_at, updated_at,
+                               (optimization_data->>'totalSheets')::int AS total_sheets,
+                               (optimization_data->>'totalEfficiency')::float AS total_efficiency
+                        FROM t_p61217265_workplace_management.cutting_projects
+                        ORDER BY created_at DESC
+                        LIMIT 200
+                    ''')
+                    projects = records(rows_cur, rows_cur.fetchall())
+                return compress(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json_body('cutting', projects)
+                })
+
+            if method == 'DELETE':
+                cur.execute(
+                    'DELETE FROM t_p61217265_workplace_management.cutting_projects WHERE id = %s',
+                    (params.get('id'),)
+                )
+                conn.commit()
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'success': True})
+                }
+
+    return {
+        'statusCode': 405,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Method not allowed'})
+    }
@@ -0,0 +1,111 @@
+'''
+Business: Сводка для главной страницы: заявки по статусам, просроченные по сроку, остатки склада и брак одним ответом
+Args: event с httpMethod GET; необязательные DASHBOARD_SUMMARY_TTL и DASHBOARD_CACHE_TTL (сек) из окружения
+Returns: HTTP response с готовой сводкой из dashboard_summary (пересчёт не чаще раза в DASHBOARD_SUMMARY_TTL)
+'''
+
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from shared.db import SCHEMA, get_connection
+from shared.http import cache_control, etag_matches, make_etag, not_modified
+from shared.metrics import instrument
+from shared.serialize import compress
+
+SUMMARY_TTL = float(os.environ.get('DASHBOARD_SUMMARY_TTL', '30'))
+CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', '5'))
+OVERDUE_LIMIT = 20
+
+# (тело, ETag, момент истечения) — повторные открытия страницы в пределах CACHE_TTL не ходят в БД
+_cached: Optional[Tuple[str, str, float]] = None
+_cache_lock = threading.Lock()
+
+SELECT_SUMMARY = f'''
+    SELECT data::text, (extract(epoch FROM refreshed_at) * 1000)::bigint,
+           refreshed_at > clock_timestamp() - make_interval(secs => %s)
+    FROM {SCHEMA}.dashboard_summary
+    WHERE id = 1
+'''
+
+
+def _load_summary(conn: Any) -> Tuple[str, int]:
+    '''
+    Сводка из dashboard_summary. Устаревшую пересчитывает тот экземпляр, который первым
+    взял advisory-блокировку; остальные в это время отдают предыдущую версию, а не ждут.
+    Ждут блокировку только при самом первом обращении, когда сводки ещё нет.
+    '''
+    with conn.cursor() as cur:
+        cur.execute(SELECT_SUMMARY, (SUMMARY_TTL,))
+        row = cur.fetchone()
+        if row is not None and row[2]:
+            return row[0], row[1]
+
+        if row is None:
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('dashboard_summary'))")
+        else:
+            cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('dashboard_summary'))")
+            if not cur.fetchone()[0]:
+                return row[0], row[1]
+
+        # Пока ждали блокировку, сводку мог пересчитать другой экземпляр
+        cur.execute(SELECT_SUMMARY, (SUMMARY_TTL,))
+        row = cur.fetchone()
+        if row is None or not row[2]:
+            cur.execute(f'SELECT {SCHEMA}.refresh_dashboard_summary(%s)', (OVERDUE_LIMIT,))
+            cur.execute(SELECT_SUMMARY, (SUMMARY_TTL,))
+            row = cur.fetchone()
+        conn.commit()
+        return row[0], row[1]
+
+
+@instrument('dashboard')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    global _cached
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Authorization',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'})
+        }
+
+    cached = _cached
+    if cached is not None and cached[2] > time.monotonic():
+        body, etag = cached[0], cached[1]
+    else:
+        with get_connection() as conn:
+            body, refreshed_ms = _load_summary(conn)
+        etag = make_etag('dashboard', refreshed_ms)
+        with _cache_lock:
+            _cached = (body, etag, time.monotonic() + CACHE_TTL)
+
+    caching = cache_control('dashboard')
+    if etag_matches(event, etag):
+        return not_modified(etag, caching)
+    return compress(event, {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            'ETag': etag,
+            'Cache-Control': caching
+        },
+        'body': body
+    })
@@ -4,12 +4,325 @@ Args: event с httpMethod (GET/POST/PUT/DELETE), body для создания/о
 Returns: HTTP response с данными материалов или статусом операции
 '''
 
+import base64
+import csv
+import io
 import json
-import os
-from typing import Dict, Any
-import psycopg2
+import re
+from typing import Dict, Any, List, Optional, Tuple
 from psycopg2.extras import RealDictCursor
 
+from shared import audit, events, queries
+from shared.catalog import VERSION_HEADER, catalog_version, deleted_since, parse_since, resource_version
+from shared.db import get_connection
+from shared.http import cache_control, etag_matches, get_header, make_etag, not_modified
+from shared.metrics import instrument
+from shared.serialize import compress, json_body, records, text_cursor
+from shared.sessions import authenticate, pin_key
+
+IMPORT_COLUMNS = ('line', 'id', 'name', 'section_id', 'section_name', 'color_id', 'color_name')
+EXPORT_QUERY = '''
+    SELECT m.id, m.name, m.category_id AS section_id, s.name AS section, m.color_id, c.name AS color
+    FROM t_p61217265_workplace_management.materials m
+    LEFT JOIN t_p61217265_workplace_management.categories s ON m.category_id = s.id
+    LEFT JOIN t_p61217265_workplace_management.colors c ON m.color_id = c.id
+    WHERE m.id > %s
+    ORDER BY m.id
+    LIMIT %s
+'''
+EXPORT_COLUMNS = ('id', 'name', 'section_id', 'section', 'color_id', 'color')
+# Выгрузка страницами по id (?after_id=): тело ответа функции ограничено по размеру
+EXPORT_PAGE_SIZE = 10000
+MAX_EXPORT_PAGE_SIZE = 50000
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 50
+# Сколько кандидатов из GIN-индексов ранжировать: для частых слов совпадений
+# могут быть сотни тысяч, а подсказке нужны первые десятки
+SEARCH_CANDIDATES = 500
+SEARCH_COLUMNS = '''
+    m.id, m.name, m.category_id, m.color_id,
+    s.name as section_name, c.name as color_name,
+    ts_rank(m.search_vector, q.query) + similarity(m.search_text, q.term) AS rank
+'''
+# Запросы поиска не готовятся через shared.queries: в общем плане LIKE $1 не превращается
+# в условие по индексу, а план под конкретный префикс дешевле его разбора
+# Быстрый путь подсказки: префикс search_text (название, затем раздел и цвет) по btree
+# (text_pattern_ops), строки уже упорядочены. Короткий запрос совпадает с началом названия,
+# длинный может захватить и раздел: «профиль ламинация»
+SEARCH_PREFIX_QUERY = f'''
+    WITH q AS (
+        SELECT to_tsquery('simple', %(tsquery)s) AS query, %(term)s::text AS term
+    )
+    SELECT {SEARCH_COLUMNS}
+    FROM (
+        SELECT m.id, m.search_text FROM t_p61217265_workplace_management.materials m
+        WHERE m.search_text LIKE %(prefix)s
+        ORDER BY m.search_text USING ~<~
+        LIMIT %(limit)s
+    ) found
+    JOIN t_p61217265_workplace_management.materials m ON m.id = found.id
+    CROSS JOIN q
+    LEFT JOIN t_p61217265_workplace_management.categories s ON m.category_id = s.id
+    LEFT JOIN t_p61217265_workplace_management.colors c ON m.color_id = c.id
+    ORDER BY found.search_text USING ~<~
+'''
+# Полный поиск: совпадения по словам (tsvector) и нечёткие (триграммы), с ранжированием
+SEARCH_QUERY = f'''
+    WITH q AS (
+        SELECT to_tsquery('simple', %(tsquery)s) AS query, %(term)s::text AS term
+    ), found AS (
+        (SELECT m.id FROM t_p61217265_workplace_management.materials m
+         WHERE m.search_text LIKE %(prefix)s
+         ORDER BY m.search_text USING ~<~
+         LIMIT %(limit)s)
+        UNION
+        (SELECT m.id FROM t_p61217265_workplace_management.materials m, q
+         WHERE m.search_vector @@ q.query OR m.search_text %% q.term
+         LIMIT %(candidates)s)
+    )
+    SELECT {SEARCH_COLUMNS}
+    FROM found
+    JOIN t_p61217265_workplace_management.materials m ON m.id = found.id
+    CROSS JOIN q
+    LEFT JOIN t_p61217265_workplace_management.categories s ON m.category_id = s.id
+    LEFT JOIN t_p61217265_workplace_management.colors c ON m.color_id = c.id
+    ORDER BY (m.search_text LIKE %(prefix)s) DESC, rank DESC, m.name
+    LIMIT %(limit)s
+'''
+LIST_QUERY = '''
+    SELECT m.id, m.name, m.category_id, m.color_id, m.created_at,
+           s.name as section_name, c.name as color_name
+    FROM t_p61217265_workplace_management.materials m
+    LEFT JOIN t_p61217265_workplace_management.categories s ON m.category_id = s.id
+    LEFT JOIN t_p61217265_workplace_management.colors c ON m.color_id = c.id
+    {where}
+    ORDER BY m.created_at DESC
+'''
+LIST = queries.statement('materials_list', LIST_QUERY.format(where=''))
+LIST_CHANGED = queries.statement(
+    'materials_changed',
+    LIST_QUERY.format(where='WHERE m.row_version > %s OR s.row_version > %s OR c.row_version > %s')
+)
+
+
+def _search_params(params: Dict[str, str]) -> Dict[str, Any]:
+    '''
+    Каждое слово запроса становится префиксом (слово:*), слова объединяются через &.
+    В tsquery попадают только буквы и цифры, поэтому пользовательский ввод её не ломает.
+    '''
+    term = params.get('q', '').strip().lower()
+    words = re.findall(r'\w+', term)
+    if not words:
+        raise ValueError('q must contain letters or digits')
+    limit = int(params.get('limit', SEARCH_DEFAULT_LIMIT))
+    if not 0 < limit <= SEARCH_MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {SEARCH_MAX_LIMIT}')
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return {
+        'tsquery': ' & '.join(f'{word}:*' for word in words),
+        'term': term,
+        'prefix': escaped + '%',
+        'candidates': SEARCH_CANDIDATES,
+        'limit': limit
+    }
+
+
+def _bulk_format(event: Dict[str, Any], params: Dict[str, str]) -> str:
+    fmt = params.get('format')
+    if not fmt:
+        content_type = (get_header(event, 'Content-Type') or '').lower()
+        fmt = 'csv' if 'csv' in content_type else 'ndjson'
+    if fmt not in EXPORT_CONTENT_TYPES:
+        raise ValueError('format must be csv or ndjson')
+    return fmt
+
+
+def _export_page(params: Dict[str, str]) -> Tuple[int, int]:
+    after_id = int(params.get('after_id', 0))
+    limit = int(params.get('limit', EXPORT_PAGE_SIZE))
+    if after_id < 0:
+        raise ValueError('after_id must be non-negative')
+    if not 0 < limit <= MAX_EXPORT_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_EXPORT_PAGE_SIZE}')
+    return after_id, limit
+
+
+def _optional_int(value: Any) -> Optional[int]:
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'not an integer: {value}')
+
+
+def _optional_text(value: Any, field: str) -> Optional[str]:
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    return value.strip() or None
+
+
+def _parse_import(body: str, fmt: str) -> Tuple[List[Tuple[Any, ...]], List[Dict[str, Any]]]:
+    '''
+    Разбирает CSV (с заголовком) или NDJSON. Поля строки: name, id (для обновления),
+    section или section_id, color или color_id. Возвращает строки для staging и ошибки разбора.
+    '''
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(body))
+        items = ((reader.line_num, item) for item in reader)
+    else:
+        items = ((number, line) for number, line in enumerate(body.splitlines(), start=1) if line.strip())
+
+    records: List[Tuple[Any, ...]] = []
+    errors: List[Dict[str, Any]] = []
+    seen_ids = set()
+    for line, item in items:
+        try:
+            if fmt == 'ndjson':
+                item = json.loads(item)
+                if not isinstance(item, dict):
+                    raise ValueError('expected a JSON object')
+            name = _optional_text(item.get('name'), 'name')
+            if not name:
+                raise ValueError('name is required')
+            material_id = _optional_int(item.get('id'))
+            if material_id is not None:
+                if material_id in seen_ids:
+                    raise ValueError(f'duplicate id {material_id}')
+                seen_ids.add(material_id)
+            records.append((
+                line, material_id, name,
+                _optional_int(item.get('section_id')), _optional_text(item.get('section'), 'section'),
+                _optional_int(item.get('color_id')), _optional_text(item.get('color'), 'color')
+            ))
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append({'line': line, 'error': str(e)})
+    return records, errors
+
+
+def _import_materials(conn: Any, records: List[Tuple[Any, ...]], user_id: Optional[int]) -> Dict[str, Any]:
+    '''
+    COPY во временную таблицу, одно сопоставление имён разделов/цветов с id,
+    затем UPDATE по id и INSERT остальных — всё в одной транзакции.
+    Прежние значения обновлённых строк для журнала берутся самосоединением в том же UPDATE.
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        writer.writerow(['' if value is None else value for value in record])
+    buffer.seek(0)
+
+    with conn.cursor() as cur:
+        cur.execute('''
+            CREATE TEMP TABLE material_import (
+                line INTEGER, id INTEGER, name TEXT,
+                section_id INTEGER, section_name TEXT,
+                color_id INTEGER, color_name TEXT
+            ) ON COMMIT DROP
+        ''')
+        cur.copy_expert(
+            f"COPY material_import ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+        cur.execute('''
+            UPDATE material_import i
+            SET section_id = COALESCE(i.section_id, s.id),
+                color_id = COALESCE(i.color_id, c.id)
+            FROM material_import src
+            LEFT JOIN (
+                SELECT lower(name) AS key, min(id) AS id
+                FROM t_p61217265_workplace_management.categories GROUP BY lower(name)
+            ) s ON src.section_id IS NULL AND lower(src.section_name) = s.key
+            LEFT JOIN (
+                SELECT lower(name) AS key, min(id) AS id
+                FROM t_p61217265_workplace_management.colors GROUP BY lower(name)
+            ) c ON src.color_id IS NULL AND lower(src.color_name) = c.key
+            WHERE i.line = src.line
+        ''')
+        cur.execute('''
+            WITH rejected AS (
+                SELECT i.line,
+                       CASE
+                           WHEN i.id IS NOT NULL AND NOT EXISTS (
+                               SELECT 1 FROM t_p61217265_workplace_management.materials m WHERE m.id = i.id
+                           ) THEN 'unknown material id ' || i.id
+                           WHEN i.section_id IS NULL AND i.section_name IS NOT NULL
+                               THEN 'unknown section ' || i.section_name
+                           WHEN i.section_id IS NOT NULL AND NOT EXISTS (
+                               SELECT 1 FROM t_p61217265_workplace_management.categories s WHERE s.id = i.section_id
+                           ) THEN 'unknown section_id ' || i.section_id
+                           WHEN i.color_id IS NULL AND i.color_name IS NOT NULL
+                               THEN 'unknown color ' || i.color_name
+                           WHEN i.color_id IS NOT NULL AND NOT EXISTS (
+                               SELECT 1 FROM t_p61217265_workplace_management.colors c WHERE c.id = i.color_id
+                           ) THEN 'unknown color_id ' || i.color_id
+                       END AS error
+                FROM material_import i
+            )
+            DELETE FROM material_import i
+            USING rejected r
+            WHERE i.line = r.line AND r.error IS NOT NULL
+            RETURNING r.line, r.error
+        ''')
+        errors = [{'line': line, 'error': error} for line, error in cur.fetchall()]
+
+        cur.execute('''
+            UPDATE t_p61217265_workplace_management.materials m
+            SET name = i.name, category_id = i.section_id, color_id = i.color_id
+            FROM material_import i, t_p61217265_workplace_management.materials old
+            WHERE i.id IS NOT NULL AND m.id = i.id AND old.id = m.id
+            RETURNING m.id, m.name, m.category_id, m.color_id, old.name, old.category_id, old.color_id
+        ''')
+        updated = [
+            ({'id': row[0], 'name': row[4], 'category_id': row[5], 'color_id': row[6]},
+             {'id': row[0], 'name': row[1], 'category_id': row[2], 'color_id': row[3]})
+            for row in cur.fetchall()
+        ]
+        cur.execute('''
+            INSERT INTO t_p61217265_workplace_management.materials (name, category_id, color_id)
+            SELECT name, section_id, color_id FROM material_import
+            WHERE id IS NULL
+            ORDER BY line
+            RETURNING id, name, category_id, color_id
+        ''')
+        columns = [column.name for column in cur.description]
+        inserted = [(None, dict(zip(columns, row))) for row in cur.fetchall()]
+        if inserted or updated:
+            events.notify(cur, 'materials', 'import')
+        audit.record(cur, 'materials', 'update', user_id, updated)
+        audit.record(cur, 'materials', 'create', user_id, inserted)
+    conn.commit()
+    return {'inserted': len(inserted), 'updated': len(updated), 'errors': errors}
+
+
+def _export_materials(conn: Any, fmt: str, after_id: int, limit: int) -> Tuple[str, Optional[int]]:
+    '''
+    Страница выгрузки после after_id: строки пишутся в буфер по мере получения с сервера,
+    без fetchall(). Второе значение — after_id следующей страницы, None на последней.
+    '''
+    buffer = io.StringIO()
+    count, last_id = 0, None
+    with conn.cursor(name='materials_export', cursor_factory=RealDictCursor) as cur:
+        cur.itersize = 2000
+        cur.execute(EXPORT_QUERY, (after_id, limit))
+        writer = csv.writer(buffer, lineterminator='\n')
+        if fmt == 'csv':
+            writer.writerow(EXPORT_COLUMNS)
+        for row in cur:
+            if fmt == 'csv':
+                writer.writerow([row[column] for column in EXPORT_COLUMNS])
+            else:
+                buffer.write(json.dumps(row, ensure_ascii=False))
+                buffer.write('\n')
+            count, last_id = count + 1, row['id']
+    conn.rollback()
+    return buffer.getvalue(), last_id if count == limit else None
+
+
+@instrument('materials')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -19,32 +332,149 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Authorization, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    
-    try:
+    with get_connection(read_only=method == 'GET', pin_key=pin_key(event)) as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            if method == 'GET':
-                cur.execute('''
-                    SELECT m.id, m.name, m.category_id, m.color_id, m.created_at, 
-                           s.name as section_name, c.name as color_name
-                    FROM t_p61217265_workplace_management.materials m
-                    LEFT JOIN t_p61217265_workplace_management.categories s ON m.category_id = s.id
-                    LEFT JOIN t_p61217265_workplace_management.colors c ON m.color_id = c.id
-                    ORDER BY m.created_at DESC
-                ''')
-                materials = cur.fetchall()
+            params = event.get('queryStringParameters') or {}
+            action = params.get('action')
+            
+            if action in ('import', 'export'):
+                try:
+                    fmt = _bulk_format(event, params)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)})
+                    }
+                
+                if action == 'export' and method == 'GET':
+                    try:
+                        after_id, limit = _export_page(params)
+                    except ValueError as e:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'body': json.dumps({'error': str(e)})
+                        }
+                    body, next_after_id = _export_materials(conn, fmt, after_id, limit)
+                    headers = {
+                        'Content-Type': EXPORT_CONTENT_TYPES[fmt],
+                        'Content-Disposition': f'attachment; filename="materials.{fmt}"',
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Expose-Headers': 'X-Next-After-Id'
+                    }
+                    if next_after_id is not None:
+                        headers['X-Next-After-Id'] = str(next_after_id)
+                    return compress(event, {
+                        'statusCode': 200,
+                        'headers': headers,
+                        'body': body
+                    })
+                
+                if action == 'import' and method == 'POST':
+                    body = event.get('body') or ''
+                    try:
+                        if event.get('isBase64Encoded'):
+                            body = base64.b64decode(body).decode('utf-8')
+                    except ValueError:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'body': json.dumps({'error': 'body must be UTF-8 text'})
+                        }
+                    rows, errors = _parse_import(body, fmt)
+                    result = _import_materials(conn, rows, authenticate(event))
+                    result['errors'] = sorted(errors + result['errors'], key=lambda e: e['line'])
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps(result, ensure_ascii=False)
+                    }
+                
+                # Выгрузка только GET, загрузка только POST: остальное не должно уходить в обычный CRUD
                 return {
+                    'statusCode': 405,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*',
+                        'Allow': 'GET' if action == 'export' else 'POST'
+                    },
+                    'body': json.dumps({'error': 'Method not allowed'})
+                }
+            
+            if method == 'GET' and 'q' in params:
+                try:
+                    search = _search_params(params)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': str(e)})
+                    }
+                with text_cursor(conn) as rows_cur:
+                    rows_cur.execute(SEARCH_PREFIX_QUERY, search)
+                    materials = rows_cur.fetchall()
+                    if len(materials) < search['limit']:
+                        rows_cur.execute(SEARCH_QUERY, search)
+                        materials = rows_cur.fetchall()
+                    materials = records(rows_cur, materials)
+                return compress(event, {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(m) for m in materials], default=str)
+                    'body': json_body('materials', materials)
+                })
+            
+            if method == 'GET':
+                try:
+                    since = parse_since(params)
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid since parameter'})
+                    }
+                
+                etag = make_etag('materials', resource_version(cur, ('materials', 'categories', 'colors')))
+                caching = cache_control('materials')
+                if since is None and etag_matches(event, etag):
+                    return not_modified(etag, caching)
+                
+                version = catalog_version(cur)
+                with text_cursor(conn) as rows_cur:
+                    if since is None:
+                        queries.execute(rows_cur, LIST)
+                    else:
+                        queries.execute(rows_cur, LIST_CHANGED, (since, since, since))
+                    materials = records(rows_cur, rows_cur.fetchall())
+                headers = {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': f'{VERSION_HEADER}, ETag',
+                    VERSION_HEADER: str(version),
+                    'ETag': etag,
+                    'Cache-Control': caching
                 }
+                if since is not None:
+                    return compress(event, {
+                        'statusCode': 200,
+                        'headers': headers,
+                        'body': json_body('materials', {
+                            'version': version,
+                            'changed': materials,
+                            'deleted': deleted_since(cur, 'materials', since)
+                        })
+                    })
+                return compress(event, {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json_body('materials', materials)
+                })
             
             elif method == 'POST':
                 data = json.loads(event.get('body', '{}'))
@@ -54,6 +484,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     RETURNING id, name, category_id, color_id
                 ''', (data['name'], data.get('section_id'), data.get('color_id')))
                 material = cur.fetchone()
+                events.notify(cur, 'materials', 'create', [material])
+                audit.record(cur, 'materials', 'create', authenticate(event), [(None, material)])
                 conn.commit()
                 return {
                     'statusCode': 201,
@@ -66,6 +498,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 params = event.get('queryStringParameters', {})
                 material_id = params.get('id')
                 
+                cur.execute('''
+                    SELECT id, name, category_id, color_id FROM t_p61217265_workplace_management.materials
+                    WHERE id = %s FOR UPDATE
+                ''', (material_id,))
+                before = cur.fetchone()
                 cur.execute('''
                     UPDATE t_p61217265_workplace_management.materials 
                     SET name = %s, category_id = %s, color_id = %s
@@ -73,6 +510,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     RETURNING id, name, category_id, color_id
                 ''', (data['name'], data.get('section_id'), data.get('color_id'), material_id))
                 material = cur.fetchone()
+                if material:
+                    events.notify(cur, 'materials', 'update', [material])
+                    audit.record(cur, 'materials', 'update', authenticate(event), [(before, material)])
                 conn.commit()
                 return {
                     'statusCode': 200,
@@ -83,7 +523,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             elif method == 'DELETE':
                 params = event.get('queryStringParameters', {})
                 material_id = params.get('id')
-                cur.execute('DELETE FROM t_p61217265_workplace_management.materials WHERE id = %s', (material_id,))
+                cur.execute('''
+                    DELETE FROM t_p61217265_workplace_management.materials WHERE id = %s
+                    RETURNING id, name, category_id, color_id
+                ''', (material_id,))
+                deleted = cur.fetchone()
+                if deleted:
+                    events.notify(cur, 'materials', 'delete', ids=[int(material_id)])
+                    audit.record(cur, 'materials', 'delete', authenticate(event), [(deleted, None)])
                 conn.commit()
                 return {
                     'statusCode': 200,
@@ -91,9 +538,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'success': True})
                 }
     
-    finally:
-        conn.close()
-    
     return {
         'statusCode': 405,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
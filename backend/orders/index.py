@@ -1,15 +1,302 @@
 '''
 Business: Управление заявками с автоматическим изменением статуса на основе выполнения
-Args: event с httpMethod (GET/POST/PUT), body для создания/обновления заявок
-Returns: HTTP response с данными заявок или статусом операции
+Args: event с httpMethod (GET/POST/PUT), body для создания/обновления заявок; ?action=forecast&window=&margin= для прогноза сроков
+Returns: HTTP response с данными заявок, прогнозом окончания открытых заявок или статусом операции
 '''
 
+import base64
 import json
 import os
-from typing import Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, Any, List, Tuple
+from psycopg2.extras import RealDictCursor, execute_values
 
+from shared import audit, events, queries
+from shared.db import get_connection
+from shared.metrics import instrument
+from shared.serialize import compress, json_body, records, text_cursor
+from shared.sessions import authenticate, pin_key
+
+STATUS_RANK = {'new': 1, 'in_progress': 2, 'completed': 3}
+# Поля заявки в ответах и в журнале изменений
+ORDER_COLUMNS = 'id, client_name, description, quantity_ordered, quantity_completed, deadline, status, created_at'
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 1000
+FORECAST_WINDOW_DAYS = 14
+MAX_FORECAST_WINDOW_DAYS = 90
+FORECAST_MARGIN_DAYS = 2
+# Без изменений заявок прогноз всё равно устаревает: даты сдвигаются вместе с текущим временем
+FORECAST_TTL = float(os.environ.get('ORDERS_FORECAST_TTL', '300'))
+# Разных (window, margin) в кеше не больше этого: параметры приходят из query-строки
+MAX_CACHED_FORECASTS = 32
+
+# (window, margin) -> (отметка заявок, тело, момент истечения); сбрасывается при смене отметки
+_forecasts: Dict[Tuple[int, int], Tuple[str, str, float]] = {}
+_forecast_lock = threading.Lock()
+
+LIST_COLUMNS = '''
+    o.id, o.client_name, o.description, o.quantity_ordered, o.quantity_completed,
+    o.deadline, o.status, o.created_by, o.created_at,
+    u.full_name as created_by_name
+'''
+# Отметка заявок для кеша прогноза: вставка и правка двигают max(updated_at) (триггер), удаление — count
+ORDERS_STAMP = queries.statement(
+    'orders_stamp',
+    'SELECT count(*), max(updated_at) FROM t_p61217265_workplace_management.orders'
+)
+
+
+# Прогноз одним запросом по всем открытым заявкам:
+# 1. Темп заявки — прирост quantity_completed за окно, делённый на длительность окна. Количество
+#    на начало окна интерполируется между соседними точками order_progress, поэтому редкие
+#    отметки (раз в несколько дней) не дают скачков темпа.
+# 2. Мощность цеха — суммарный прирост всех заявок за окно в день, включая уже завершённые.
+# 3. Очередь по дедлайнам (EDF): заявка ждёт, пока цех выполнит остаток всех заявок со сроком
+#    не позже её. Срок окончания — худший из двух оценок: по собственному темпу и по очереди.
+FORECAST_QUERY = '''
+    WITH params AS (
+        SELECT now() AS at, now() - make_interval(days => %(window)s) AS since
+    ),
+    tracked AS (
+        SELECT o.id, o.client_name, o.deadline, o.status,
+               o.quantity_ordered, COALESCE(o.quantity_completed, 0) AS completed
+        FROM t_p61217265_workplace_management.orders o
+        WHERE o.status <> 'completed'
+           OR o.id IN (
+               SELECT order_id FROM t_p61217265_workplace_management.order_progress, params
+               WHERE recorded_at > params.since
+           )
+    ),
+    progress AS (
+        SELECT t.*, params.at,
+               CASE
+                   WHEN b.recorded_at IS NULL THEN a.quantity_completed
+                   WHEN a.recorded_at IS NULL THEN b.quantity_completed
+                   ELSE b.quantity_completed + (a.quantity_completed - b.quantity_completed)
+                        * extract(epoch FROM params.since - b.recorded_at)
+                        / extract(epoch FROM a.recorded_at - b.recorded_at)
+               END AS start_quantity,
+               CASE WHEN b.recorded_at IS NULL THEN a.recorded_at ELSE params.since END AS start_at
+        FROM tracked t
+        CROSS JOIN params
+        LEFT JOIN LATERAL (
+            SELECT quantity_completed, recorded_at FROM t_p61217265_workplace_management.order_progress p
+            WHERE p.order_id = t.id AND p.recorded_at <= params.since
+            ORDER BY recorded_at DESC LIMIT 1
+        ) b ON true
+        LEFT JOIN LATERAL (
+            SELECT quantity_completed, recorded_at FROM t_p61217265_workplace_management.order_progress p
+            WHERE p.order_id = t.id AND p.recorded_at > params.since
+            ORDER BY recorded_at LIMIT 1
+        ) a ON true
+    ),
+    rated AS (
+        SELECT p.*,
+               GREATEST(p.completed - p.start_quantity, 0)
+                   / GREATEST(extract(epoch FROM p.at - p.start_at) / 86400, 1) AS rate,
+               sum(GREATEST(p.completed - p.start_quantity, 0)) OVER () / %(window)s AS shop_rate
+        FROM progress p
+    ),
+    queued AS (
+        SELECT r.*,
+               GREATEST(r.quantity_ordered - r.completed, 0) AS remaining,
+               sum(GREATEST(r.quantity_ordered - r.completed, 0))
+                   OVER (ORDER BY r.deadline NULLS LAST, r.id) AS queue_ahead
+        FROM rated r
+        WHERE r.status <> 'completed'
+    ),
+    projected AS (
+        SELECT q.*,
+               CASE WHEN q.remaining = 0 THEN 0 WHEN q.rate > 0 THEN q.remaining / q.rate END AS own_days,
+               CASE WHEN q.shop_rate > 0 THEN q.queue_ahead / q.shop_rate END AS queue_days
+        FROM queued q
+    ),
+    finished AS (
+        SELECT p.*,
+               (p.at + GREATEST(p.own_days, p.queue_days) * interval '1 day')::date AS projected_finish
+        FROM projected p
+    )
+    SELECT f.id, f.client_name, f.status, f.deadline, f.quantity_ordered,
+           f.completed AS quantity_completed, f.remaining,
+           round(f.rate::numeric, 2)::float AS rate_per_day,
+           (f.at + f.own_days * interval '1 day')::date AS finish_by_rate,
+           (f.at + f.queue_days * interval '1 day')::date AS finish_by_capacity,
+           f.projected_finish,
+           f.deadline - f.projected_finish AS slack_days,
+           CASE
+               WHEN f.deadline < f.at::date THEN 'overdue'
+               WHEN f.projected_finish IS NULL THEN 'no_progress'
+               WHEN f.deadline IS NULL THEN 'no_deadline'
+               WHEN f.deadline < f.projected_finish THEN 'late'
+               WHEN f.deadline - f.projected_finish <= %(margin)s THEN 'at_risk'
+               ELSE 'on_track'
+           END AS risk,
+           round(f.shop_rate::numeric, 2)::float AS shop_rate_per_day
+    FROM finished f
+    ORDER BY f.deadline - f.projected_finish NULLS LAST, f.deadline NULLS LAST, f.id
+'''
+
+
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    key = [STATUS_RANK.get(row['status'], 4), str(row['created_at']), row['id']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, datetime, int]:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    rank, created_at, order_id = json.loads(base64.urlsafe_b64decode(padded))
+    return int(rank), datetime.fromisoformat(created_at), int(order_id)
+
+
+def _build_list_filters(params: Dict[str, str]) -> Tuple[str, List[Any], int]:
+    '''
+    Собирает WHERE для списка заявок из query-параметров:
+    status (через запятую), created_by, deadline_from, deadline_to, client (префикс имени), cursor, limit.
+    Сортировка (status_rank, created_at DESC, id DESC) совпадает с индексом idx_orders_list.
+    '''
+    conditions: List[str] = []
+    args: List[Any] = []
+
+    if params.get('status'):
+        statuses = params['status'].split(',')
+        if any(s not in STATUS_RANK for s in statuses):
+            raise ValueError('Unknown status')
+        conditions.append('o.status = ANY(%s)')
+        args.append(statuses)
+    if params.get('created_by'):
+        conditions.append('o.created_by = %s')
+        args.append(int(params['created_by']))
+    if params.get('deadline_from'):
+        conditions.append('o.deadline >= %s')
+        args.append(date.fromisoformat(params['deadline_from']))
+    if params.get('deadline_to'):
+        conditions.append('o.deadline <= %s')
+        args.append(date.fromisoformat(params['deadline_to']))
+    if params.get('client'):
+        prefix = params['client'].lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append('lower(o.client_name) LIKE %s')
+        args.append(prefix + '%')
+    if params.get('cursor'):
+        rank, created_at, order_id = _decode_cursor(params['cursor'])
+        conditions.append(
+            '(o.status_rank > %s OR (o.status_rank = %s AND (o.created_at, o.id) < (%s, %s)))'
+        )
+        args.extend([rank, rank, created_at, order_id])
+
+    limit = int(params.get('limit', DEFAULT_PAGE_SIZE))
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return where, args, limit
+
+
+def _parse_batch(data: Dict[str, Any]) -> Dict[int, int]:
+    '''
+    Суммирует приращения quantity_completed по id: несколько записей одной заявки
+    за смену превращаются в одну строку VALUES.
+    '''
+    updates = data.get('updates')
+    if not isinstance(updates, list) or not 0 < len(updates) <= MAX_BATCH_SIZE:
+        raise ValueError(f'updates must be a list of 1 to {MAX_BATCH_SIZE} items')
+    deltas: Dict[int, int] = {}
+    for item in updates:
+        order_id, delta = item['id'], item['quantity_completed']
+        if not isinstance(order_id, int) or not isinstance(delta, int) or isinstance(delta, bool):
+            raise ValueError('id and quantity_completed must be integers')
+        deltas[order_id] = deltas.get(order_id, 0) + delta
+    return deltas
+
+
+def _apply_batch(cur, deltas: Dict[int, int]) -> Tuple[Dict[int, Dict[str, Any]], List[Dict[str, Any]]]:
+    '''
+    Применяет приращения одним UPDATE ... FROM (VALUES ...); статус пересчитывается в SQL
+    по тем же правилам, что и в одиночном PUT. Количество не опускается ниже нуля.
+    Возвращает строки до изменения (по id) и после.
+    '''
+    ids = sorted(deltas)
+    # Блокировки строк в порядке id: пересекающиеся пакеты разных смен не взаимоблокируются.
+    # Заблокированные строки — они же снимки «до» для журнала изменений
+    cur.execute(f'''
+        SELECT {ORDER_COLUMNS} FROM t_p61217265_workplace_management.orders
+        WHERE id = ANY(%s) ORDER BY id FOR UPDATE
+    ''', (ids,))
+    before = {row['id']: row for row in cur.fetchall()}
+    return before, execute_values(cur, f'''
+        UPDATE t_p61217265_workplace_management.orders o
+        SET quantity_completed = GREATEST(o.quantity_completed + v.delta, 0),
+            status = CASE
+                WHEN GREATEST(o.quantity_completed + v.delta, 0) = 0 THEN 'new'
+                WHEN GREATEST(o.quantity_completed + v.delta, 0) >= o.quantity_ordered THEN 'completed'
+                ELSE 'in_progress'
+            END
+        FROM (VALUES %s) AS v(id, delta)
+        WHERE o.id = v.id
+        RETURNING {', '.join('o.' + column for column in ORDER_COLUMNS.split(', '))}
+    ''', [(order_id, deltas[order_id]) for order_id in ids], template='(%s::int, %s::int)', page_size=len(ids), fetch=True)
+
+
+def _parse_forecast(params: Dict[str, str]) -> Tuple[int, int]:
+    window = int(params.get('window', FORECAST_WINDOW_DAYS))
+    margin = int(params.get('margin', FORECAST_MARGIN_DAYS))
+    if not 0 < window <= MAX_FORECAST_WINDOW_DAYS:
+        raise ValueError(f'window must be between 1 and {MAX_FORECAST_WINDOW_DAYS} days')
+    if not 0 <= margin <= MAX_FORECAST_WINDOW_DAYS:
+        raise ValueError(f'margin must be between 0 and {MAX_FORECAST_WINDOW_DAYS} days')
+    return window, margin
+
+
+def _forecast(conn, window: int, margin: int) -> str:
+    '''
+    Тело ответа прогноза. Кеш процесса действует до изменения заявок (меняется count(*) или
+    max(updated_at)) и не дольше FORECAST_TTL, так что повторные запросы стоят одного чтения
+    по индексам. Отметка не ловит транзакцию, зафиксированную позже более свежей, — такой
+    прогноз доживает до FORECAST_TTL.
+    '''
+    with conn.cursor() as cur:
+        queries.execute(cur, ORDERS_STAMP)
+        count, last_change = cur.fetchone()
+    version = f"{count}:{last_change.isoformat() if last_change else ''}"
+    cached = _forecasts.get((window, margin))
+    if cached is not None and cached[0] == version and cached[2] > time.monotonic():
+        return cached[1]
+
+    with text_cursor(conn) as cur:
+        cur.execute(FORECAST_QUERY, {'window': window, 'margin': margin})
+        orders = records(cur, cur.fetchall())
+    shop_rate = orders[0].pop('shop_rate_per_day') if orders else 0
+    risks: Dict[str, int] = {}
+    for order in orders:
+        order.pop('shop_rate_per_day', None)
+        risks[order['risk']] = risks.get(order['risk'], 0) + 1
+    backlog = sum(order['remaining'] for order in orders)
+    body = json_body('orders', {
+        'generated_at': datetime.now().astimezone().isoformat(timespec='seconds'),
+        'version': version,
+        'window_days': window,
+        'margin_days': margin,
+        'shop_rate_per_day': shop_rate,
+        'backlog': backlog,
+        'backlog_days': round(backlog / shop_rate, 1) if shop_rate else None,
+        'risks': risks,
+        'orders': orders
+    })
+    now = time.monotonic()
+    with _forecast_lock:
+        # Прогнозы прошлых версий заявок и истёкшие уже не будут отданы
+        for key in [key for key, (cached_version, _, expires) in _forecasts.items()
+                    if cached_version != version or expires <= now]:
+            del _forecasts[key]
+        if len(_forecasts) >= MAX_CACHED_FORECASTS:
+            del _forecasts[min(_forecasts, key=lambda key: _forecasts[key][2])]
+        _forecasts[(window, margin)] = (version, body, now + FORECAST_TTL)
+    return body
+
+
+@instrument('orders')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -19,42 +306,73 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Authorization',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    
-    try:
+    with get_connection(read_only=method == 'GET', pin_key=pin_key(event)) as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if method == 'GET' and (event.get('queryStringParameters') or {}).get('action') == 'forecast':
+                try:
+                    window, margin = _parse_forecast(event.get('queryStringParameters') or {})
+                except (ValueError, TypeError) as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'Invalid forecast parameters: {e}'})
+                    }
+                return compress(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': _forecast(conn, window, margin)
+                })
+
             if method == 'GET':
-                cur.execute('''
-                    SELECT o.*, 
-                           u.full_name as created_by_name
+                params = event.get('queryStringParameters') or {}
+                try:
+                    where, args, limit = _build_list_filters(params)
+                except (ValueError, TypeError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid filter or cursor'})
+                    }
+                
+                list_query = f'''
+                    SELECT {LIST_COLUMNS}
                     FROM t_p61217265_workplace_management.orders o
                     LEFT JOIN t_p61217265_workplace_management.users u ON o.created_by = u.id
-                    ORDER BY 
-                        CASE o.status 
-                            WHEN 'new' THEN 1 
-                            WHEN 'in_progress' THEN 2 
-                            WHEN 'completed' THEN 3 
-                        END,
-                        o.created_at DESC
-                ''')
-                orders = cur.fetchall()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(o) for o in orders], default=str)
+                    {where}
+                    ORDER BY o.status_rank, o.created_at DESC, o.id DESC
+                    LIMIT %s
+                '''
+                with text_cursor(conn) as rows_cur:
+                    # Префикс клиента (LIKE $n) в общем плане не использует индекс, такой список идёт без PREPARE
+                    if params.get('client'):
+                        rows_cur.execute(list_query, args + [limit + 1])
+                    else:
+                        queries.execute(rows_cur, queries.statement('orders_list', list_query), args + [limit + 1])
+                    orders = records(rows_cur, rows_cur.fetchall())
+                
+                headers = {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': 'X-Next-Cursor'
                 }
+                if len(orders) > limit:
+                    orders = orders[:limit]
+                    headers['X-Next-Cursor'] = _encode_cursor(orders[-1])
+                return compress(event, {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json_body('orders', orders)
+                })
             
             elif method == 'POST':
                 data = json.loads(event.get('body', '{}'))
-                headers = event.get('headers', {})
-                user_id = headers.get('X-User-Id', headers.get('x-user-id'))
+                user_id = authenticate(event)
                 
                 cur.execute('''
                     INSERT INTO t_p61217265_workplace_management.orders (client_name, description, quantity_ordered, quantity_completed, 
@@ -66,6 +384,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                       data['quantity_ordered'], data.get('quantity_completed', 0),
                       data.get('deadline'), 'new', user_id))
                 order = cur.fetchone()
+                events.notify(cur, 'orders', 'create', [order])
+                audit.record(cur, 'orders', 'create', user_id, [(None, order)])
                 conn.commit()
                 return {
                     'statusCode': 201,
@@ -75,7 +395,32 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             elif method == 'PUT':
                 data = json.loads(event.get('body', '{}'))
-                params = event.get('queryStringParameters', {})
+                params = event.get('queryStringParameters') or {}
+                
+                if params.get('action') == 'batch':
+                    try:
+                        deltas = _parse_batch(data)
+                    except (KeyError, TypeError, ValueError) as e:
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'body': json.dumps({'error': f'Invalid batch: {e}'})
+                        }
+                    before, orders = _apply_batch(cur, deltas)
+                    if orders:
+                        events.notify(cur, 'orders', 'update', orders)
+                    audit.record(cur, 'orders', 'update', authenticate(event), [(before[o['id']], o) for o in orders])
+                    conn.commit()
+                    found = {o['id'] for o in orders}
+                    return {
+                        'statusCode': 200,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({
+                            'orders': [dict(o) for o in orders],
+                            'not_found': [order_id for order_id in sorted(deltas) if order_id not in found]
+                        }, default=str)
+                    }
+                
                 order_id = params.get('id')
                 
                 new_status = data.get('status', 'new')
@@ -89,17 +434,24 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 elif quantity_completed > 0:
                     new_status = 'in_progress'
                 
-                cur.execute('''
+                cur.execute(f'''
+                    SELECT {ORDER_COLUMNS} FROM t_p61217265_workplace_management.orders
+                    WHERE id = %s FOR UPDATE
+                ''', (order_id,))
+                before = cur.fetchone()
+                cur.execute(f'''
                     UPDATE t_p61217265_workplace_management.orders 
                     SET client_name = %s, description = %s, quantity_ordered = %s, 
                         quantity_completed = %s, deadline = %s, status = %s
                     WHERE id = %s
-                    RETURNING id, client_name, description, quantity_ordered, quantity_completed, 
-                              deadline, status, created_at
+                    RETURNING {ORDER_COLUMNS}
                 ''', (data['client_name'], data.get('description', ''), 
                       quantity_ordered, quantity_completed, data.get('deadline'), 
                       new_status, order_id))
                 order = cur.fetchone()
+                if order:
+                    events.notify(cur, 'orders', 'update', [order])
+                    audit.record(cur, 'orders', 'update', authenticate(event), [(before, order)])
                 conn.commit()
                 return {
                     'statusCode': 200,
@@ -107,9 +459,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps(dict(order) if order else {}, default=str)
                 }
     
-    finally:
-        conn.close()
-    
     return {
         'statusCode': 405,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
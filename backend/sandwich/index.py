@@ -0,0 +1,226 @@
+'''
+Business: Сетка сэндвич-панелей: чтение диапазона строк одним запросом и сохранение изменённых ячеек патчами
+Args: event с httpMethod (GET/PUT); ?from=&to= номера строк; body {"patches": [{"row", "version", "cells": {...}}]}
+Returns: HTTP response со столбцами и строками-массивами либо с новыми версиями строк и конфликтами; правка — только с сессией
+'''
+
+import json
+from typing import Dict, Any, List, Optional, Tuple
+from psycopg2.extras import execute_values
+
+from shared import audit, events
+from shared.db import get_connection
+from shared.metrics import instrument
+from shared.serialize import compress, json_body, text_cursor
+from shared.sessions import authenticate, pin_key
+
+# Редактируемые столбцы и их длина из V0003
+CELL_LIMITS = {'liter': 50, 'bs': 50, 'floor': 50, **{f'kv_{i}': 255 for i in range(1, 11)}}
+COLUMNS = ['row_number', 'row_version', *CELL_LIMITS]
+DEFAULT_RANGE = 200
+MAX_RANGE = 1000
+MAX_PATCH_ROWS = 1000
+
+Patch = Tuple[int, int, Dict[str, Optional[str]]]
+
+
+def _parse_range(params: Dict[str, str]) -> Tuple[int, int]:
+    first = int(params.get('from', 1))
+    last = int(params.get('to', first + DEFAULT_RANGE - 1))
+    if last < first or last - first + 1 > MAX_RANGE:
+        raise ValueError(f'range must contain 1 to {MAX_RANGE} rows')
+    return first, last
+
+
+def _parse_patches(data: Dict[str, Any]) -> List[Patch]:
+    '''
+    Патчи по строкам: только изменённые ячейки, null очищает ячейку. version — row_version,
+    который видел клиент; 0 или отсутствие означает новую строку. Несколько патчей одной
+    строки с одной версией сливаются (последнее значение ячейки побеждает).
+    '''
+    patches = data.get('patches')
+    if not isinstance(patches, list) or not 0 < len(patches) <= MAX_PATCH_ROWS:
+        raise ValueError(f'patches must be a list of 1 to {MAX_PATCH_ROWS} items')
+    merged: Dict[int, Patch] = {}
+    for item in patches:
+        row, version, cells = item['row'], item.get('version') or 0, item['cells']
+        if not isinstance(row, int) or not isinstance(version, int) or row < 1 or version < 0:
+            raise ValueError('row must be a positive integer and version a non-negative integer')
+        if not isinstance(cells, dict) or not cells:
+            raise ValueError(f'row {row}: cells must be a non-empty object')
+        for column, value in cells.items():
+            if column not in CELL_LIMITS:
+                raise ValueError(f'unknown column: {column}')
+            if value is not None:
+                value = cells[column] = str(value)
+                if len(value) > CELL_LIMITS[column]:
+                    raise ValueError(f'{column} is longer than {CELL_LIMITS[column]} characters')
+        if row in merged:
+            if merged[row][1] != version:
+                raise ValueError(f'row {row} is patched with different versions')
+            merged[row][2].update(cells)
+        else:
+            merged[row] = (row, version, dict(cells))
+    return [merged[row] for row in sorted(merged)]
+
+
+def _apply_patches(cur, patches: List[Patch]) -> Tuple[List[Tuple[int, int]], Dict[int, Dict[str, Any]]]:
+    '''
+    Существующие строки меняются одним UPDATE ... FROM (VALUES ...) при совпадении row_version,
+    новые вставляются одним INSERT ... ON CONFLICT DO NOTHING. Строки, которые уже изменил
+    или создал другой клиент, не трогаются и возвращаются вызывающему как конфликты.
+    Второе значение — ячейки заблокированных строк до изменения (для журнала изменений).
+    '''
+    applied: List[Tuple[int, int]] = []
+    before: Dict[int, Dict[str, Any]] = {}
+    updates = [(row, version, json.dumps(cells)) for row, version, cells in patches if version]
+    inserts = [(row, cells) for row, version, cells in patches if not version]
+    if updates:
+        # Блокировки в порядке row_number: пересекающиеся патчи разных вкладок не взаимоблокируются
+        cur.execute(f'''
+            SELECT row_number, {', '.join(CELL_LIMITS)} FROM t_p61217265_workplace_management.sandwich_data
+            WHERE row_number = ANY(%s) ORDER BY row_number FOR UPDATE
+        ''', ([row for row, _, _ in updates],))
+        before = {row[0]: dict(zip(CELL_LIMITS, row[1:])) for row in cur.fetchall()}
+        assignments = ',\n'.join(
+            f"{column} = CASE WHEN p.cells ? '{column}' THEN p.cells->>'{column}' ELSE s.{column} END"
+            for column in CELL_LIMITS
+        )
+        applied += execute_values(cur, f'''
+            UPDATE t_p61217265_workplace_management.sandwich_data s
+            SET {assignments},
+                row_version = s.row_version + 1,
+                updated_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS p(row_number, row_version, cells)
+            WHERE s.row_number = p.row_number AND s.row_version = p.row_version
+            RETURNING s.row_number, s.row_version
+        ''', updates, template='(%s::int, %s::int, %s::jsonb)', page_size=len(updates), fetch=True)
+    if inserts:
+        applied += execute_values(cur, f'''
+            INSERT INTO t_p61217265_workplace_management.sandwich_data (row_number, {', '.join(CELL_LIMITS)})
+            VALUES %s
+            ON CONFLICT (row_number) DO NOTHING
+            RETURNING row_number, row_version
+        ''', [(row, *(cells.get(column) for column in CELL_LIMITS)) for row, cells in inserts],
+            page_size=len(inserts), fetch=True)
+    return sorted(applied), before
+
+
+def _changes(patches: List[Patch], applied: List[Tuple[int, int]],
+             before: Dict[int, Dict[str, Any]]) -> List[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]:
+    '''Пары (до, после) применённых строк для журнала; id строки в журнале — её row_number.'''
+    done = {row for row, _ in applied}
+    changes = []
+    for row, version, cells in patches:
+        if row not in done:
+            continue
+        if version:
+            old = {'id': row, **before[row]}
+            changes.append((old, {**old, **cells}))
+        else:
+            changes.append((None, {'id': row, **cells}))
+    return changes
+
+
+@instrument('sandwich')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, PUT, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Authorization',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    params = event.get('queryStringParameters') or {}
+
+    if method == 'GET':
+        try:
+            first, last = _parse_range(params)
+        except (TypeError, ValueError) as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f'Invalid range: {e}'})
+            }
+        with get_connection(read_only=True, pin_key=pin_key(event)) as conn:
+            with text_cursor(conn) as cur:
+                cur.execute(f'''
+                    SELECT {', '.join(COLUMNS)}
+                    FROM t_p61217265_workplace_management.sandwich_data
+                    WHERE row_number BETWEEN %s AND %s
+                    ORDER BY row_number
+                ''', (first, last))
+                rows = cur.fetchall()
+                cur.execute('SELECT max(row_number) FROM t_p61217265_workplace_management.sandwich_data')
+                last_row = cur.fetchone()[0]
+        return compress(event, {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json_body('sandwich', {
+                'columns': COLUMNS,
+                'rows': rows,
+                'from': first,
+                'to': last,
+                'last_row': last_row or 0
+            })
+        })
+
+    if method == 'PUT':
+        try:
+            patches = _parse_patches(json.loads(event.get('body') or '{}'))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f'Invalid patch: {e}'})
+            }
+        user_id = authenticate(event)
+        if not user_id:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'})
+            }
+        with get_connection(pin_key=pin_key(event)) as conn:
+            with text_cursor(conn) as cur:
+                applied, before = _apply_patches(cur, patches)
+                done = {row for row, _ in applied}
+                conflicts = [row for row, _, _ in patches if row not in done]
+                current = []
+                if conflicts:
+                    # Текущее состояние строк с конфликтом: клиент сливает их со своими правками
+                    cur.execute(f'''
+                        SELECT {', '.join(COLUMNS)}
+                        FROM t_p61217265_workplace_management.sandwich_data
+                        WHERE row_number = ANY(%s)
+                        ORDER BY row_number
+                    ''', (conflicts,))
+                    current = cur.fetchall()
+                if applied:
+                    events.notify(cur, 'sandwich', 'update', ids=[row for row, _ in applied], user_id=user_id)
+                    changes = _changes(patches, applied, before)
+                    audit.record(cur, 'sandwich', 'update', user_id, [change for change in changes if change[0] is not None])
+                    audit.record(cur, 'sandwich', 'create', user_id, [change for change in changes if change[0] is None])
+                conn.commit()
+        return {
+            'statusCode': 409 if conflicts and not applied else 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json_body('sandwich', {
+                'applied': applied,
+                'columns': COLUMNS,
+                'conflicts': current
+            })
+        }
+
+    return {
+        'statusCode': 405,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Method not allowed'})
+    }
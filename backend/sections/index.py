@@ -5,11 +5,28 @@ Returns: HTTP response с данными разделов или статусо
 '''
 
 import json
-import os
 from typing import Dict, Any
-import psycopg2
 from psycopg2.extras import RealDictCursor
 
+from shared import audit, events, queries
+from shared.catalog import VERSION_HEADER, catalog_version, deleted_since, parse_since, resource_version
+from shared.db import get_connection
+from shared.http import cache_control, etag_matches, make_etag, not_modified
+from shared.metrics import instrument
+from shared.serialize import compress, json_body, records, text_cursor
+from shared.sessions import authenticate, pin_key
+
+LIST_QUERY = '''
+    SELECT s.id, s.name, s.created_at, s.material_count
+    FROM t_p61217265_workplace_management.categories s
+    {where}
+    ORDER BY s.name
+'''
+LIST = queries.statement('sections_list', LIST_QUERY.format(where=''))
+LIST_CHANGED = queries.statement('sections_changed', LIST_QUERY.format(where='WHERE s.row_version > %s'))
+
+
+@instrument('sections')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -19,32 +36,59 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Authorization, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
         }
     
-    dsn = os.environ.get('DATABASE_URL')
-    conn = psycopg2.connect(dsn)
-    
-    try:
+    with get_connection(read_only=method == 'GET', pin_key=pin_key(event)) as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             if method == 'GET':
-                cur.execute('''
-                    SELECT s.id, s.name, s.created_at, 
-                           COUNT(m.id) as material_count
-                    FROM t_p61217265_workplace_management.categories s
-                    LEFT JOIN t_p61217265_workplace_management.materials m ON s.id = m.category_id
-                    GROUP BY s.id, s.name, s.created_at
-                    ORDER BY s.name
-                ''')
-                sections = cur.fetchall()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(s) for s in sections], default=str)
+                try:
+                    since = parse_since(event.get('queryStringParameters') or {})
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Invalid since parameter'})
+                    }
+                
+                etag = make_etag('sections', resource_version(cur, ('categories',)))
+                caching = cache_control('sections')
+                if since is None and etag_matches(event, etag):
+                    return not_modified(etag, caching)
+                
+                version = catalog_version(cur)
+                with text_cursor(conn) as rows_cur:
+                    if since is None:
+                        queries.execute(rows_cur, LIST)
+                    else:
+                        queries.execute(rows_cur, LIST_CHANGED, (since,))
+                    sections = records(rows_cur, rows_cur.fetchall())
+                headers = {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': f'{VERSION_HEADER}, ETag',
+                    VERSION_HEADER: str(version),
+                    'ETag': etag,
+                    'Cache-Control': caching
                 }
+                if since is not None:
+                    return compress(event, {
+                        'statusCode': 200,
+                        'headers': headers,
+                        'body': json_body('sections', {
+                            'version': version,
+                            'changed': sections,
+                            'deleted': deleted_since(cur, 'categories', since)
+                        })
+                    })
+                return compress(event, {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json_body('sections', sections)
+                })
             
             elif method == 'POST':
                 data = json.loads(event.get('body', '{}'))
@@ -54,6 +98,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     RETURNING id, name
                 ''', (data['name'],))
                 section = cur.fetchone()
+                events.notify(cur, 'sections', 'create', [section])
+                audit.record(cur, 'sections', 'create', authenticate(event), [(None, section)])
                 conn.commit()
                 return {
                     'statusCode': 201,
@@ -66,6 +112,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 params = event.get('queryStringParameters', {})
                 section_id = params.get('id')
                 
+                cur.execute('''
+                    SELECT id, name FROM t_p61217265_workplace_management.categories
+                    WHERE id = %s FOR UPDATE
+                ''', (section_id,))
+                before = cur.fetchone()
                 cur.execute('''
                     UPDATE t_p61217265_workplace_management.categories 
                     SET name = %s
@@ -73,6 +124,9 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     RETURNING id, name
                 ''', (data['name'], section_id))
                 section = cur.fetchone()
+                if section:
+                    events.notify(cur, 'sections', 'update', [section])
+                    audit.record(cur, 'sections', 'update', authenticate(event), [(before, section)])
                 conn.commit()
                 return {
                     'statusCode': 200,
@@ -93,7 +147,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Cannot delete section with materials'})
                     }
                 
-                cur.execute('DELETE FROM t_p61217265_workplace_management.categories WHERE id = %s', (section_id,))
+                cur.execute(
+                    'DELETE FROM t_p61217265_workplace_management.categories WHERE id = %s RETURNING id, name',
+                    (section_id,)
+                )
+                deleted = cur.fetchone()
+                if deleted:
+                    events.notify(cur, 'sections', 'delete', ids=[int(section_id)])
+                    audit.record(cur, 'sections', 'delete', authenticate(event), [(deleted, None)])
                 conn.commit()
                 return {
                     'statusCode': 200,
@@ -101,9 +162,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'success': True})
                 }
     
-    finally:
-        conn.close()
-    
     return {
         'statusCode': 405,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -0,0 +1,452 @@
+'''
+Business: Единый асинхронный HTTP-сервер для VPS: все функции backend/*/index.py под /api/<имя>
+Args: SERVER_HOST, SERVER_PORT, SERVER_WORKERS (по умолчанию DB_POOL_MAX), SERVER_MAX_BODY, SERVER_KEEP_ALIVE, SERVER_TRUSTED_PROXIES, METRICS_TOKEN, EVENTS_* из окружения или --host/--port
+Returns: HTTP-ответы функций; OPTIONS, /api/health и /metrics (Prometheus) отвечают без обращения к БД; /api/events — поток SSE
+'''
+
+import argparse
+import asyncio
+import base64
+import hmac
+import importlib.util
+import ipaddress
+import json
+import logging
+import os
+import signal
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from shared import audit, metrics  # noqa: E402
+from shared.eventhub import CLOSED, RESET, EventHub  # noqa: E402
+from shared.db import COUNT_QUERIES, POOL_MAX, close_pool, query_count, reset_query_count  # noqa: E402
+
+# Наружу сервер открывается через nginx; 0.0.0.0 — только осознанно, вместе с METRICS_TOKEN
+HOST = os.environ.get('SERVER_HOST', '127.0.0.1')
+PORT = int(os.environ.get('SERVER_PORT', '8000'))
+# Потоков столько же, сколько соединений в пуле: лишние потоки всё равно ждали бы свободное соединение
+WORKERS = int(os.environ.get('SERVER_WORKERS', str(POOL_MAX)))
+MAX_BODY = int(os.environ.get('SERVER_MAX_BODY', str(64 * 1024 * 1024)))
+KEEP_ALIVE = float(os.environ.get('SERVER_KEEP_ALIVE', '15'))
+MAX_HEADER = 64 * 1024
+# Прокси (адреса и подсети через запятую), которым доверяется X-Forwarded-For; по умолчанию nginx на этой же машине
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(network.strip(), strict=False)
+    for network in os.environ.get('SERVER_TRUSTED_PROXIES', '127.0.0.1,::1').split(',')
+    if network.strip()
+]
+EVENTS_HEARTBEAT = float(os.environ.get('EVENTS_HEARTBEAT', '15'))
+EVENTS_MAX_CLIENTS = int(os.environ.get('EVENTS_MAX_CLIENTS', '1000'))
+
+API_PREFIX = '/api/'
+METRICS_PATH = '/metrics'
+# Если задан, /metrics отдаётся только с заголовком Authorization: Bearer <токен>
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+EVENTS_FUNCTION = 'events'
+SKIP_DIRS = {'shared', 'bench'}
+
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Max-Age': '86400'
+}
+DEFAULT_ALLOW_HEADERS = 'Content-Type, X-User-Id, X-Auth-Token, Authorization, If-None-Match'
+
+logger = logging.getLogger('server')
+
+Handler = Callable[[Dict[str, Any], Any], Dict[str, Any]]
+
+
+class HttpError(Exception):
+    def __init__(self, status: int):
+        super().__init__(status)
+        self.status = status
+
+
+class Request(NamedTuple):
+    method: str
+    target: str
+    version: str
+    headers: Dict[str, str]
+    body: bytes
+
+
+def discover_functions(root: str = BACKEND_DIR) -> Dict[str, Handler]:
+    '''Каждая папка с index.py и функцией handler становится маршрутом /api/<папка>.'''
+    functions: Dict[str, Handler] = {}
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name, 'index.py')
+        if name in SKIP_DIRS or not os.path.isfile(path):
+            continue
+        spec = importlib.util.spec_from_file_location(f'{name}_function', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if callable(getattr(module, 'handler', None)):
+            functions[name] = module.handler
+    return functions
+
+
+def _canonical(name: str) -> str:
+    # Заголовки в событии приходят в виде X-Auth-Token, как у шлюза облачных функций
+    return '-'.join(part.capitalize() for part in name.strip().split('-'))
+
+
+async def _read_body(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                     headers: Dict[str, str]) -> bytes:
+    if headers.get('Expect', '').lower() == '100-continue':
+        writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        await writer.drain()
+
+    if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+        chunks: List[bytes] = []
+        size = 0
+        try:
+            while True:
+                line = await reader.readuntil(b'\r\n')
+                try:
+                    length = int(line.split(b';', 1)[0], 16)
+                except ValueError:
+                    raise HttpError(400)
+                if length == 0:
+                    # Trailer-заголовки не используются, дочитываем до пустой строки
+                    while await reader.readuntil(b'\r\n') != b'\r\n':
+                        pass
+                    return b''.join(chunks)
+                size += length
+                if size > MAX_BODY:
+                    raise HttpError(413)
+                chunks.append(await reader.readexactly(length))
+                await reader.readexactly(2)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            # Соединение оборвалось посреди тела или строка размера чанка длиннее буфера чтения
+            raise HttpError(400)
+
+    try:
+        length = int(headers.get('Content-Length', '0'))
+    except ValueError:
+        raise HttpError(400)
+    if length < 0:
+        raise HttpError(400)
+    if length > MAX_BODY:
+        raise HttpError(413)
+    return await reader.readexactly(length) if length else b''
+
+
+async def read_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[Request]:
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE)
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise HttpError(400)
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError(431)
+    except asyncio.TimeoutError:
+        return None
+
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ', 2)
+    except ValueError:
+        raise HttpError(400)
+
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, separator, value = line.partition(':')
+        if not separator:
+            raise HttpError(400)
+        name = _canonical(name)
+        value = value.strip()
+        headers[name] = f'{headers[name]}, {value}' if name in headers else value
+
+    body = await _read_body(reader, writer, headers)
+    return Request(method=method.upper(), target=target, version=version, headers=headers, body=body)
+
+
+def _trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def client_address(peer: str, headers: Dict[str, str]) -> str:
+    '''
+    Адрес клиента для requestContext. За доверенным прокси — крайний справа адрес X-Forwarded-For,
+    не принадлежащий доверенным прокси: левые элементы клиент может подставить сам.
+    '''
+    if not _trusted(peer):
+        return peer
+    forwarded = [address.strip() for address in headers.get('X-Forwarded-For', '').split(',') if address.strip()]
+    for address in reversed(forwarded):
+        if not _trusted(address):
+            return address
+    return forwarded[0] if forwarded else peer
+
+
+def build_event(request: Request, function: str, path: str, peer: str) -> Tuple[Dict[str, Any], Any]:
+    '''Событие в том же виде, что передаёт шлюз облачных функций, и минимальный context.'''
+    query = urlsplit(request.target).query
+    request_id = str(uuid.uuid4())
+    event: Dict[str, Any] = {
+        'httpMethod': request.method,
+        'url': request.target,
+        'path': path,
+        'headers': request.headers,
+        'queryStringParameters': dict(parse_qsl(query, keep_blank_values=True)),
+        'isBase64Encoded': False,
+        'requestContext': {
+            'requestId': request_id,
+            'httpMethod': request.method,
+            'identity': {'sourceIp': client_address(peer, request.headers), 'userAgent': request.headers.get('User-Agent', '')}
+        }
+    }
+    if request.body:
+        try:
+            event['body'] = request.body.decode('utf-8')
+        except UnicodeDecodeError:
+            event['body'] = base64.b64encode(request.body).decode()
+            event['isBase64Encoded'] = True
+    context = SimpleNamespace(request_id=request_id, function_name=function, function_version='local')
+    return event, context
+
+
+def _json_response(status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    response_headers = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+    response_headers.update(headers or {})
+    return {'statusCode': status, 'headers': response_headers, 'body': json.dumps(payload)}
+
+
+def preflight(request: Request) -> Dict[str, Any]:
+    headers = dict(PREFLIGHT_HEADERS)
+    headers['Access-Control-Allow-Headers'] = request.headers.get(
+        'Access-Control-Request-Headers', DEFAULT_ALLOW_HEADERS
+    )
+    return {'statusCode': 200, 'headers': headers, 'body': ''}
+
+
+def encode_response(result: Dict[str, Any], keep_alive: bool) -> bytes:
+    status = int(result.get('statusCode', 200))
+    body = result.get('body', '')
+    if result.get('isBase64Encoded'):
+        payload = base64.b64decode(body)
+    elif isinstance(body, (bytes, bytearray)):
+        payload = bytes(body)
+    elif isinstance(body, str):
+        payload = body.encode('utf-8')
+    else:
+        payload = json.dumps(body).encode('utf-8')
+    if status in (204, 304) or 100 <= status < 200:
+        payload = b''
+
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ''
+    lines = [f'HTTP/1.1 {status} {reason}']
+    for name, value in (result.get('headers') or {}).items():
+        if name.lower() not in ('content-length', 'connection', 'transfer-encoding'):
+            lines.append(f'{name}: {value}')
+    for name, values in (result.get('multiValueHeaders') or {}).items():
+        lines.extend(f'{name}: {value}' for value in values)
+    lines.append(f'Date: {formatdate(usegmt=True)}')
+    lines.append(f'Content-Length: {len(payload)}')
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload
+
+
+def invoke(handler: Handler, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''Вызов в потоке пула; при DB_COUNT_QUERIES=1 число SQL-запросов уходит в X-Db-Queries.'''
+    if not COUNT_QUERIES:
+        return handler(event, context)
+    reset_query_count()
+    result = handler(event, context)
+    result['headers'] = dict(result.get('headers') or {}, **{'X-Db-Queries': str(query_count())})
+    return result
+
+
+class AppServer:
+    def __init__(self, functions: Dict[str, Handler], workers: int = WORKERS, events: Optional[EventHub] = None):
+        self.functions = functions
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='handler')
+        self.events = events
+
+    def route(self, target: str) -> Tuple[Optional[str], str]:
+        path = unquote(urlsplit(target).path)
+        if not path.startswith(API_PREFIX):
+            return None, path
+        name, _, rest = path[len(API_PREFIX):].partition('/')
+        return name, '/' + rest
+
+    async def dispatch(self, request: Request, peer: str) -> Dict[str, Any]:
+        name, path = self.route(request.target)
+        if name is None and path == METRICS_PATH:
+            if METRICS_TOKEN and not hmac.compare_digest(
+                request.headers.get('Authorization', '').encode(), f'Bearer {METRICS_TOKEN}'.encode()
+            ):
+                return _json_response(401, {'error': 'Unauthorized'}, {'WWW-Authenticate': 'Bearer'})
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'},
+                'body': metrics.render()
+            }
+        if name == 'health':
+            return _json_response(200, {
+                'status': 'ok',
+                'functions': sorted(self.functions),
+                'events': self.events is not None and self.events.connected.is_set()
+            })
+        handler = self.functions.get(name)
+        if handler is None:
+            return _json_response(404, {'error': 'Not found'})
+        if request.method == 'OPTIONS':
+            return preflight(request)
+
+        event, context = build_event(request, name, path, peer)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, invoke, handler, event, context)
+        except Exception:
+            logger.exception('%s %s failed', request.method, request.target)
+            return _json_response(500, {'error': 'Internal server error'})
+
+    async def stream_events(self, request: Request, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        '''
+        Поток SSE: событие на каждое уведомление из EventHub (?entities=orders,materials фильтрует),
+        комментарий-пинг раз в EVENTS_HEARTBEAT секунд, reset — клиенту нужно перечитать данные.
+        Соединение занято потоком до отключения клиента и не держит ни поток пула, ни соединение с БД.
+        '''
+        if self.events is None or len(self.events.subscribers) >= EVENTS_MAX_CLIENTS:
+            writer.write(encode_response(_json_response(503, {'error': 'Event stream unavailable'}), False))
+            await writer.drain()
+            return
+        query = dict(parse_qsl(urlsplit(request.target).query))
+        entities: Optional[Set[str]] = set(query['entities'].split(',')) if query.get('entities') else None
+        subscriber = self.events.subscribe(entities, request.headers.get('Last-Event-Id') or query.get('last_event_id'))
+        # Клиент после запроса ничего не шлёт: завершение чтения означает отключение
+        disconnected = asyncio.ensure_future(reader.read())
+        try:
+            writer.write((
+                'HTTP/1.1 200 OK\r\n'
+                'Content-Type: text/event-stream; charset=utf-8\r\n'
+                'Cache-Control: no-cache\r\n'
+                'Access-Control-Allow-Origin: *\r\n'
+                'X-Accel-Buffering: no\r\n'
+                f'Date: {formatdate(usegmt=True)}\r\n'
+                'Connection: close\r\n\r\n'
+                'retry: 3000\n\n'
+            ).encode('latin-1'))
+            await writer.drain()
+            while True:
+                item = asyncio.ensure_future(subscriber.queue.get())
+                done, _ = await asyncio.wait({item, disconnected}, timeout=EVENTS_HEARTBEAT,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    item.cancel()
+                    return
+                if item not in done:
+                    item.cancel()
+                    writer.write(b': ping\n\n')
+                elif item.result() == CLOSED:
+                    return
+                elif item.result() == RESET:
+                    writer.write(b'event: reset\ndata: {}\n\n')
+                else:
+                    event_id, entity, payload = item.result()
+                    writer.write(f'id: {event_id}\nevent: {entity}\ndata: {payload}\n\n'.encode('utf-8'))
+                await writer.drain()
+        finally:
+            disconnected.cancel()
+            self.events.unsubscribe(subscriber)
+
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peername = writer.get_extra_info('peername')
+        peer = peername[0] if peername else ''
+        try:
+            while True:
+                try:
+                    request = await read_request(reader, writer)
+                except HttpError as e:
+                    writer.write(encode_response(_json_response(e.status, {'error': HTTPStatus(e.status).phrase}), False))
+                    await writer.drain()
+                    return
+                if request is None:
+                    return
+                if request.method == 'GET' and self.route(request.target)[0] == EVENTS_FUNCTION:
+                    await self.stream_events(request, reader, writer)
+                    return
+
+                connection = request.headers.get('Connection', '').lower()
+                if request.version == 'HTTP/1.0':
+                    keep_alive = connection == 'keep-alive'
+                else:
+                    keep_alive = connection != 'close'
+
+                started = time.perf_counter()
+                result = await self.dispatch(request, peer)
+                writer.write(encode_response(result, keep_alive))
+                await writer.drain()
+                logger.info(
+                    '%s %s %s %.1fms', request.method, request.target,
+                    result.get('statusCode', 200), (time.perf_counter() - started) * 1000
+                )
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
+        # Журнал изменений дописывается до закрытия пула
+        audit.close()
+        close_pool()
+
+
+async def serve(host: str = HOST, port: int = PORT) -> None:
+    events = EventHub()
+    events_task = asyncio.create_task(events.run())
+    app = AppServer(discover_functions(), events=events)
+    server = await asyncio.start_server(app.serve_client, host, port, limit=MAX_HEADER)
+    logger.info('listening on %s:%s, functions: %s, workers: %s', host, port,
+                ', '.join(sorted(app.functions)), app.executor._max_workers)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+        # Потоки SSE не закрываются сами: без этого закрытие сервера ждало бы отключения клиентов
+        events.close()
+        await events_task
+    await loop.run_in_executor(None, app.shutdown)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'), format='%(asctime)s %(name)s %(message)s')
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+'''
+Business: Общий код для функций backend (пул соединений с БД и вспомогательные модули)
+Args: импортируется из backend/<функция>/index.py как пакет shared; корень импорта — каталог backend
+Returns: модули shared.*
+'''
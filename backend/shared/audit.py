@@ -0,0 +1,199 @@
+'''
+Business: Журнал изменений заявок и справочников: снимки до/после копятся в памяти процесса и пишутся в audit_log пачками
+Args: record() курсором изменения до его commit; AUDIT_FLUSH_INTERVAL (сек), AUDIT_BATCH_SIZE, AUDIT_BUFFER_MAX из окружения
+Returns: строки audit_log с изменёнными полями, id пользователя и временем; history() читает журнал сущности
+'''
+
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from shared import metrics
+from shared.db import get_connection
+
+# 0 — писать в record() курсором самого изменения, в той же транзакции: для облачных функций,
+# экземпляр которых могут заморозить сразу после ответа вместе с буфером в памяти
+FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', '2'))
+BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', '1000'))
+# При недоступной БД записи копятся до этого предела, дальше самые старые теряются
+BUFFER_MAX = int(os.environ.get('AUDIT_BUFFER_MAX', '50000'))
+
+# (entity, entity_id, action, user_id, changed_at, before, after); before/after уже в JSON
+Entry = Tuple[str, int, str, Optional[int], datetime, Optional[str], Optional[str]]
+
+logger = logging.getLogger('audit')
+
+_buffer: Deque[Entry] = deque()
+_lock = threading.Lock()
+_wakeup = threading.Condition(_lock)
+# Один сброс за раз: порядок записей в audit_log совпадает с порядком record()
+_flush_lock = threading.Lock()
+_flusher: Optional[threading.Thread] = None
+_stopped = False
+# Месяцы, для которых секция audit_log уже проверена этим процессом
+_partitions: Set[date] = set()
+
+
+def _dump(values: Optional[Dict[str, Any]]) -> Optional[str]:
+    return None if values is None else json.dumps(values, ensure_ascii=False, default=str)
+
+
+def _diff(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    '''Для изменения — только поля, значение которых поменялось; создание и удаление пишутся целиком.'''
+    if before is None or after is None:
+        return before, after
+    changed = [key for key in after if key in before and before[key] != after[key]]
+    return {key: before[key] for key in changed}, {key: after[key] for key in changed}
+
+
+def record(cur: Any, entity: str, action: str, user_id: Optional[int],
+           changes: Iterable[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> None:
+    '''
+    Пары (до, после) строк сущности; вызывается курсором изменения перед его commit. При
+    AUDIT_FLUSH_INTERVAL=0 строки журнала пишутся этим курсором и фиксируются вместе с изменением,
+    иначе ставятся в очередь фонового сброса. Изменение без отличий в полях не пишется.
+    '''
+    changed_at = datetime.now(timezone.utc)
+    entries: List[Entry] = []
+    for before, after in changes:
+        entity_id = (after if after is not None else before or {}).get('id')
+        if entity_id is None:
+            logger.warning('audit entry for %s without id skipped', entity)
+            continue
+        before, after = _diff(dict(before) if before is not None else None, dict(after) if after is not None else None)
+        if before == {} and after == {}:
+            continue
+        entries.append((entity, int(entity_id), action, user_id, changed_at, _dump(before), _dump(after)))
+    if not entries:
+        return
+    if FLUSH_INTERVAL <= 0:
+        _write(cur, entries)
+        metrics.audit_records.inc(len(entries), result='written')
+        return
+    with _lock:
+        _buffer.extend(entries)
+        overflow = len(_buffer) - BUFFER_MAX
+        for _ in range(max(overflow, 0)):
+            _buffer.popleft()
+        if len(_buffer) >= BATCH_SIZE:
+            _wakeup.notify()
+    if overflow > 0:
+        metrics.audit_records.inc(overflow, result='dropped')
+        logger.warning('audit buffer is full, %s oldest entries dropped', overflow)
+    _start_flusher()
+
+
+def _ensure_partitions(cur: Any, entries: List[Entry]) -> None:
+    '''Секции месяцев пачки и следующего за ними: новый месяц начинается с готовой секцией.'''
+    months = {entry[4].date().replace(day=1) for entry in entries}
+    months |= {(month + timedelta(days=32)).replace(day=1) for month in months}
+    months -= _partitions
+    for month in sorted(months):
+        cur.execute('SELECT t_p61217265_workplace_management.ensure_audit_partition(%s)', (month,))
+    _partitions.update(months)
+
+
+def _write(cur: Any, entries: List[Entry]) -> None:
+    '''Один INSERT ... VALUES на все записи; фиксирует их commit владельца курсора.'''
+    _ensure_partitions(cur, entries)
+    execute_values(cur, '''
+        INSERT INTO t_p61217265_workplace_management.audit_log
+            (entity, entity_id, action, user_id, changed_at, before, after)
+        VALUES %s
+    ''', entries, template='(%s, %s, %s, %s, %s, %s::jsonb, %s::jsonb)', page_size=len(entries))
+
+
+def flush() -> int:
+    '''
+    Пишет накопленные записи пачками по BATCH_SIZE одним INSERT ... VALUES на пачку.
+    При ошибке БД пачка возвращается в начало очереди и будет записана следующим сбросом.
+    '''
+    written = 0
+    with _flush_lock:
+        while True:
+            with _lock:
+                batch = [_buffer.popleft() for _ in range(min(BATCH_SIZE, len(_buffer)))]
+            if not batch:
+                return written
+            try:
+                with get_connection() as conn:
+                    with conn.cursor() as cur:
+                        _write(cur, batch)
+                    conn.commit()
+            except psycopg2.Error as e:
+                with _lock:
+                    _buffer.extendleft(reversed(batch))
+                logger.warning('audit flush failed, %s entries kept for retry: %s', len(_buffer), e)
+                return written
+            written += len(batch)
+            metrics.audit_records.inc(len(batch), result='written')
+
+
+def _run() -> None:
+    while True:
+        with _lock:
+            if not _stopped and len(_buffer) < BATCH_SIZE:
+                _wakeup.wait(FLUSH_INTERVAL)
+            stopped = _stopped
+        flush()
+        if stopped:
+            return
+
+
+def _start_flusher() -> None:
+    global _flusher
+    if _flusher is not None or _stopped:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run, name='audit-flusher', daemon=True)
+            _flusher.start()
+
+
+def close() -> None:
+    '''Останавливает фоновый поток и дописывает очередь; вызывается при остановке сервера и при выходе.'''
+    global _stopped
+    with _lock:
+        _stopped = True
+        _wakeup.notify()
+        flusher = _flusher
+    if flusher is not None:
+        flusher.join()
+    flush()
+
+
+atexit.register(close)
+
+
+def history(cur: Any, entity: str, entity_id: Optional[int] = None,
+            before: Optional[Tuple[datetime, int]] = None, limit: int = 100) -> List[tuple]:
+    '''
+    Журнал сущности (или одной её строки) от новых изменений к старым по индексам audit_log;
+    before — ключ (changed_at, id) последней строки предыдущей страницы.
+    '''
+    conditions = ['a.entity = %s']
+    args: List[Any] = [entity]
+    if entity_id is not None:
+        conditions.append('a.entity_id = %s')
+        args.append(entity_id)
+    if before is not None:
+        conditions.append('(a.changed_at, a.id) < (%s, %s)')
+        args.extend(before)
+    cur.execute(f'''
+        SELECT a.id, a.entity, a.entity_id, a.action, a.user_id, u.full_name AS user_name,
+               a.changed_at, a.before, a.after
+        FROM t_p61217265_workplace_management.audit_log a
+        LEFT JOIN t_p61217265_workplace_management.users u ON u.id = a.user_id
+        WHERE {' AND '.join(conditions)}
+        ORDER BY a.changed_at DESC, a.id DESC
+        LIMIT %s
+    ''', args + [limit])
+    return cur.fetchall()
@@ -0,0 +1,68 @@
+'''
+Business: Версии справочников (материалы, цвета, разделы) для дельта-синхронизации
+Args: курсор БД, имя таблицы справочника и водяной знак since из query-параметров
+Returns: текущую версию справочников и id строк, удалённых после since
+'''
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared import queries
+from shared.db import SCHEMA
+
+VERSION_HEADER = 'X-Catalog-Version'
+
+CATALOG_VERSION = queries.statement('catalog_version', f'SELECT version FROM {SCHEMA}.catalog_version')
+DELETED_SINCE = queries.statement(
+    'catalog_deleted_since',
+    f'SELECT DISTINCT entity_id FROM {SCHEMA}.catalog_deletions WHERE entity = %s AND row_version > %s'
+)
+
+
+def parse_since(params: Dict[str, Any]) -> Optional[int]:
+    '''Возвращает водяной знак из ?since=, None для полной выборки; ValueError при мусоре.'''
+    since = params.get('since')
+    if since is None or since == '':
+        return None
+    version = int(since)
+    if version < 0:
+        raise ValueError('since must be non-negative')
+    return version
+
+
+def catalog_version(cur: Any) -> int:
+    '''
+    Текущая закоммиченная версия справочников (общий счётчик для всех таблиц).
+    Читать её нужно ДО выборки строк: строки новее водяного знака просто придут
+    клиенту повторно, а не потеряются.
+    '''
+    queries.execute(cur, CATALOG_VERSION)
+    row = cur.fetchone()
+    if row is None:
+        return 0
+    return row['version'] if isinstance(row, dict) else row[0]
+
+
+def deleted_since(cur: Any, entity: str, since: int) -> List[int]:
+    queries.execute(cur, DELETED_SINCE, (entity, since))
+    return [row['entity_id'] if isinstance(row, dict) else row[0] for row in cur.fetchall()]
+
+
+_VERSIONED_TABLES = ('materials', 'colors', 'categories')
+
+
+def resource_version(cur: Any, tables: Tuple[str, ...]) -> int:
+    '''
+    Дешёвый валидатор для ETag: максимальная версия строк и удалений по таблицам,
+    от которых зависит ответ. Каждый max() — обратный проход по индексу, без JOIN/GROUP BY.
+    '''
+    parts = []
+    for table in tables:
+        if table not in _VERSIONED_TABLES:
+            raise ValueError(f'Unknown catalog table: {table}')
+        parts.append(f'(SELECT max(row_version) FROM {SCHEMA}.{table})')
+        parts.append(
+            f"(SELECT max(row_version) FROM {SCHEMA}.catalog_deletions WHERE entity = '{table}')"
+        )
+    queries.execute(cur, queries.statement('resource_version', f"SELECT COALESCE(GREATEST({', '.join(parts)}), 0) AS version"))
+    row = cur.fetchone()
+    return row['version'] if isinstance(row, dict) else row[0]
@@ -0,0 +1,27 @@
+'''
+Business: Пересчёт счётчиков colors.usage_count и categories.material_count при расхождении
+Args: DATABASE_URL в окружении; запуск из каталога backend: python -m shared.counters
+Returns: число исправленных строк цветов и разделов
+'''
+
+from typing import Any, Dict
+
+from shared.db import SCHEMA, get_connection
+
+
+def rebuild(conn: Any) -> Dict[str, int]:
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT colors_fixed, categories_fixed FROM {SCHEMA}.rebuild_catalog_counters()')
+        colors_fixed, categories_fixed = cur.fetchone()
+    conn.commit()
+    return {'colors_fixed': colors_fixed, 'categories_fixed': categories_fixed}
+
+
+def main() -> None:
+    with get_connection() as conn:
+        result = rebuild(conn)
+    print(f"Исправлено цветов: {result['colors_fixed']}, разделов: {result['categories_fixed']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+'''
+Business: Пул соединений с PostgreSQL, переживающий тёплые вызовы функций
+Args: DATABASE_URL и необязательные DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_CHECK_INTERVAL, DB_CONNECT_TIMEOUT, DB_COUNT_QUERIES;
+      реплики для чтения — DATABASE_REPLICA_URLS (через ;), DB_REPLICA_MAX_LAG, DB_REPLICA_CHECK_INTERVAL, DB_REPLICA_RETRY, DB_PRIMARY_PIN
+Returns: контекстный менеджер get_connection() с проверенным соединением из пула primary или реплики; время запросов уходит в shared.metrics
+'''
+
+import itertools
+import logging
+import os
+import select
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple, Type
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+from shared import metrics, queries
+
+SCHEMA = 't_p61217265_workplace_management'
+
+POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+POOL_MAX = int(os.environ.get('DB_POOL_MAX', '5'))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+CHECK_INTERVAL = float(os.environ.get('DB_POOL_CHECK_INTERVAL', '30'))
+CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '5'))
+# Подсчёт SQL-запросов по потокам для бенчмарков; в обычной работе выключен
+COUNT_QUERIES = os.environ.get('DB_COUNT_QUERIES') == '1'
+
+PRIMARY = 'primary'
+# Реплики только для чтения: имя пула -> DSN. Без них все соединения идут на primary
+_replica_urls: Dict[str, str] = {
+    f'replica{index}': url.strip()
+    for index, url in enumerate(os.environ.get('DATABASE_REPLICA_URLS', '').split(';'))
+    if url.strip()
+}
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', '5'))
+REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', '2'))
+REPLICA_RETRY = float(os.environ.get('DB_REPLICA_RETRY', '30'))
+# Окно после записи клиента, в течение которого его чтения идут на primary (read-your-writes)
+PIN_SECONDS = float(os.environ.get('DB_PRIMARY_PIN', '5'))
+MAX_PINS = 10000
+
+REPLICA_LAG_QUERY = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+logger = logging.getLogger('db')
+
+_pools: Dict[str, ThreadedConnectionPool] = {}
+_pool_lock = threading.Lock()
+_slots = {name: threading.BoundedSemaphore(POOL_MAX) for name in (PRIMARY, *_replica_urls)}
+
+# Имя реплики -> (отставание в секундах, момент проверки) и момент, до которого реплика считается недоступной
+_replica_lag: Dict[str, Tuple[float, float]] = {}
+_replica_down_until: Dict[str, float] = {}
+_round_robin = itertools.count()
+# pin_key -> момент окончания закрепления за primary
+_pins: Dict[str, float] = {}
+_pins_lock = threading.Lock()
+
+# id(conn) -> время возврата в пул и поколение пула на момент возврата
+_idle_since: Dict[int, float] = {}
+_conn_generation: Dict[int, int] = {}
+# Увеличивается при обрыве соединения: все соединения старших поколений
+# перед выдачей проверяются SELECT 1 (после failover они почти наверняка мертвы)
+_generation = 0
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    pass
+
+
+_query_counter = threading.local()
+_instrumented_cursors: Dict[type, type] = {}
+
+
+def _run_query(run: Any, sql: Any) -> Any:
+    _query_counter.count = getattr(_query_counter, 'count', 0) + 1
+    started = time.perf_counter()
+    failed = True
+    try:
+        result = run()
+        failed = False
+        return result
+    finally:
+        if metrics.ENABLED:
+            metrics.observe_query(sql, time.perf_counter() - started, failed)
+
+
+class _InstrumentedCursorMixin:
+    def execute(self, query: Any, vars: Any = None) -> Any:
+        return _run_query(lambda: super(_InstrumentedCursorMixin, self).execute(query, vars), query)
+
+    def executemany(self, query: Any, vars_list: Any) -> Any:
+        return _run_query(lambda: super(_InstrumentedCursorMixin, self).executemany(query, vars_list), query)
+
+    def copy_expert(self, sql: Any, file: Any, size: int = 8192) -> Any:
+        return _run_query(lambda: super(_InstrumentedCursorMixin, self).copy_expert(sql, file, size), sql)
+
+
+def _instrumented_cursor(factory: Type[extensions.cursor]) -> Type[extensions.cursor]:
+    cls = _instrumented_cursors.get(factory)
+    if cls is None:
+        cls = type(f'Instrumented{factory.__name__}', (_InstrumentedCursorMixin, factory), {})
+        _instrumented_cursors[factory] = cls
+    return cls
+
+
+class InstrumentedConnection(extensions.connection):
+    '''Соединение, курсоры которого (любого cursor_factory) считают и замеряют выполненные запросы.'''
+
+    def cursor(self, *args: Any, **kwargs: Any) -> extensions.cursor:
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+        kwargs['cursor_factory'] = _instrumented_cursor(factory)
+        return super().cursor(*args, **kwargs)
+
+
+def query_count() -> int:
+    return getattr(_query_counter, 'count', 0)
+
+
+def reset_query_count() -> None:
+    _query_counter.count = 0
+
+
+def _get_pool(target: str = PRIMARY) -> ThreadedConnectionPool:
+    pool = _pools.get(target)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(target)
+            if pool is None:
+                pool = _pools[target] = ThreadedConnectionPool(
+                    POOL_MIN, POOL_MAX, os.environ['DATABASE_URL'] if target == PRIMARY else _replica_urls[target],
+                    connect_timeout=CONNECT_TIMEOUT,
+                    connection_factory=InstrumentedConnection if COUNT_QUERIES or metrics.ENABLED else None
+                )
+    return pool
+
+
+def _socket_readable(conn: extensions.connection) -> bool:
+    # У простаивающего соединения сокет читаем, только если сервер закрыл его
+    # (рестарт, failover) или прислал уведомление — тогда нужна настоящая проверка
+    try:
+        readable, _, _ = select.select([conn.fileno()], [], [], 0)
+    except (OSError, ValueError, psycopg2.Error):
+        return True
+    return bool(readable)
+
+
+def _is_healthy(conn: extensions.connection) -> bool:
+    if conn.closed:
+        return False
+    idle_since = _idle_since.get(id(conn))
+    if idle_since is None:
+        return True
+    stale = time.monotonic() - idle_since > CHECK_INTERVAL
+    if not stale and _conn_generation.get(id(conn)) == _generation and not _socket_readable(conn):
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _discard(pool: ThreadedConnectionPool, conn: extensions.connection) -> None:
+    _idle_since.pop(id(conn), None)
+    _conn_generation.pop(id(conn), None)
+    queries.forget(conn)
+    try:
+        pool.putconn(conn, close=True)
+    except psycopg2.Error:
+        pass
+
+
+def _checkout(pool: ThreadedConnectionPool) -> extensions.connection:
+    # Каждое соединение из пула проверяется не чаще раза в CHECK_INTERVAL;
+    # мёртвые выбрасываются, и берётся следующее (в худшем случае — новое)
+    for _ in range(POOL_MAX + 1):
+        conn = pool.getconn()
+        if _is_healthy(conn):
+            return conn
+        _discard(pool, conn)
+    raise psycopg2.OperationalError('Не удалось получить рабочее соединение с БД')
+
+
+def _release(pool: ThreadedConnectionPool, conn: extensions.connection) -> None:
+    global _generation
+    if conn.closed:
+        _generation += 1
+        _discard(pool, conn)
+        return
+    if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            _discard(pool, conn)
+            return
+    _idle_since[id(conn)] = time.monotonic()
+    _conn_generation[id(conn)] = _generation
+    pool.putconn(conn)
+
+
+def _pinned(pin_key: Optional[str]) -> bool:
+    if pin_key is None:
+        return False
+    until = _pins.get(pin_key)
+    return until is not None and until > time.monotonic()
+
+
+def _pin(pin_key: str) -> None:
+    now = time.monotonic()
+    with _pins_lock:
+        if len(_pins) >= MAX_PINS:
+            for key in [key for key, until in _pins.items() if until <= now]:
+                del _pins[key]
+        _pins[pin_key] = now + PIN_SECONDS
+
+
+def _choose_replica() -> Optional[str]:
+    # Отстающая реплика снова пробуется после REPLICA_CHECK_INTERVAL: выданное ей соединение перепроверит отставание
+    now = time.monotonic()
+    healthy = []
+    for name in _replica_urls:
+        lag, checked = _replica_lag.get(name, (0.0, 0.0))
+        if _replica_down_until.get(name, 0) <= now and (lag <= REPLICA_MAX_LAG or now - checked > REPLICA_CHECK_INTERVAL):
+            healthy.append(name)
+    return healthy[next(_round_robin) % len(healthy)] if healthy else None
+
+
+def _replica_lag_ok(target: str, conn: extensions.connection) -> bool:
+    '''
+    Отставание реплики проверяется на выданном соединении не чаще раза в REPLICA_CHECK_INTERVAL.
+    Совпадение принятого и применённого WAL — нулевое отставание: иначе при простое primary
+    время последней применённой транзакции росло бы без реального отставания.
+    '''
+    lag, checked = _replica_lag.get(target, (0.0, 0.0))
+    if time.monotonic() - checked > REPLICA_CHECK_INTERVAL:
+        with conn.cursor() as cur:
+            cur.execute(REPLICA_LAG_QUERY)
+            lag = float(cur.fetchone()[0])
+        conn.rollback()
+        _replica_lag[target] = (lag, time.monotonic())
+    return lag <= REPLICA_MAX_LAG
+
+
+@contextmanager
+def _acquire(target: str, started: float) -> Iterator[extensions.connection]:
+    slots = _slots[target]
+    if not slots.acquire(timeout=POOL_TIMEOUT):
+        metrics.db_pool_timeouts.inc(target=target)
+        raise PoolTimeout('Пул соединений с БД исчерпан')
+    try:
+        pool = _get_pool(target)
+        conn = _checkout(pool)
+        metrics.db_acquire.observe(time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            _release(pool, conn)
+    finally:
+        slots.release()
+
+
+@contextmanager
+def get_connection(read_only: bool = False, pin_key: Optional[str] = None) -> Iterator[extensions.connection]:
+    '''
+    Выдаёт соединение из пула и возвращает его обратно после использования.
+    Незакоммиченная транзакция откатывается, оборванное соединение закрывается.
+    read_only=True при заданных DATABASE_REPLICA_URLS направляет чтение на реплику, кроме случаев:
+    клиент с этим pin_key писал в последние DB_PRIMARY_PIN секунд, реплика отстаёт больше
+    DB_REPLICA_MAX_LAG или недоступна — тогда чтение идёт на primary.
+    Запись с pin_key закрепляет чтения этого клиента за primary.
+    '''
+    started = time.perf_counter()
+    if read_only and _replica_urls:
+        replica = None
+        if _pinned(pin_key):
+            reason = 'pinned'
+        else:
+            replica = _choose_replica()
+            reason = 'unhealthy'
+        if replica is not None:
+            # Ошибки получения соединения и проверки отставания ведут на primary;
+            # исключения из тела with вызывающего проходят через stack как обычно
+            stack = ExitStack()
+            try:
+                conn = stack.enter_context(_acquire(replica, started))
+                if not conn.readonly:
+                    conn.readonly = True
+                lag_ok = _replica_lag_ok(replica, conn)
+            except PoolTimeout:
+                stack.close()
+                lag_ok, reason = False, 'busy'
+            except psycopg2.OperationalError as e:
+                stack.close()
+                logger.warning('replica %s unavailable, reading from primary: %s', replica, e)
+                _replica_down_until[replica] = time.monotonic() + REPLICA_RETRY
+                lag_ok, reason = False, 'unavailable'
+            with stack:
+                if lag_ok:
+                    metrics.db_routes.inc(target='replica', reason='read')
+                    yield conn
+                    return
+        metrics.db_routes.inc(target='primary', reason=reason)
+    else:
+        metrics.db_routes.inc(target='primary', reason='read' if read_only else 'write')
+
+    with _acquire(PRIMARY, started) as conn:
+        yield conn
+    if not read_only and pin_key is not None and _replica_urls:
+        _pin(pin_key)
+
+
+def close_pool() -> None:
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
+        _idle_since.clear()
+        _conn_generation.clear()
+        queries.forget_all()
@@ -0,0 +1,155 @@
+'''
+Business: Раздача уведомлений shared.events по SSE в server.py: одна LISTEN-сессия на процесс и очереди подписчиков
+Args: DATABASE_URL, EVENTS_BUFFER, EVENTS_QUEUE из окружения
+Returns: EventHub с буфером последних событий для Last-Event-ID; функциям, которые только вызывают notify(), модуль не нужен
+'''
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Optional, Set, Tuple
+
+import psycopg2
+from psycopg2 import extensions
+
+from shared.events import CHANNEL
+
+BUFFER = int(os.environ.get('EVENTS_BUFFER', '1000'))
+QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE', '256'))
+RECONNECT_DELAYS = (0.5, 1, 2, 5, 10)
+
+# Служебные элементы очереди подписчика
+RESET = 'reset'
+CLOSED = 'closed'
+
+logger = logging.getLogger('events')
+
+
+class Subscriber:
+    def __init__(self, entities: Optional[Set[str]]):
+        self.entities = entities
+        self.queue: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+
+    def offer(self, item: Any) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Медленный клиент: вместо пропуска части событий он получает reset и перечитывает данные
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+
+class EventHub:
+    '''
+    Одна LISTEN-сессия на процесс сервера; уведомления читаются в цикле событий asyncio (add_reader)
+    и раскладываются по очередям подписчиков. Последние BUFFER событий хранятся для Last-Event-ID.
+    После обрыва LISTEN-сессии события могли потеряться, поэтому всем подписчикам уходит reset.
+    '''
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.dsn = dsn or os.environ['DATABASE_URL']
+        # Эпоха в id события: после перезапуска сервера старый Last-Event-ID не совпадёт
+        self.epoch = format(int(time.time()), 'x')
+        self.sequence = 0
+        self.history: Deque[Tuple[int, str, str]] = deque(maxlen=BUFFER)
+        self.subscribers: Set[Subscriber] = set()
+        self.connected = asyncio.Event()
+        self._conn: Optional[extensions.connection] = None
+        self._lost: Optional[asyncio.Event] = None
+        self._stopped = False
+
+    def _connect(self) -> extensions.connection:
+        conn = psycopg2.connect(self.dsn, keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f'LISTEN {CHANNEL}')
+        return conn
+
+    def _on_readable(self) -> None:
+        try:
+            self._conn.poll()
+        except psycopg2.Error:
+            self._lost.set()
+            return
+        while self._conn.notifies:
+            self.publish(self._conn.notifies.pop(0).payload)
+
+    def publish(self, payload: str) -> None:
+        try:
+            entity = json.loads(payload).get('entity', '')
+        except (ValueError, AttributeError):
+            logger.warning('skipping malformed event payload: %.200s', payload)
+            return
+        self.sequence += 1
+        self.history.append((self.sequence, entity, payload))
+        for subscriber in self.subscribers:
+            if subscriber.entities is None or entity in subscriber.entities:
+                subscriber.offer((self.event_id(self.sequence), entity, payload))
+
+    def _broadcast(self, item: str) -> None:
+        for subscriber in self.subscribers:
+            subscriber.offer(item)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while not self._stopped:
+            try:
+                self._conn = await loop.run_in_executor(None, self._connect)
+            except psycopg2.Error as e:
+                delay = RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)]
+                logger.warning('LISTEN connection failed: %s; retrying in %ss', e, delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            if attempt:
+                self._broadcast(RESET)
+            attempt = 0
+            self._lost = asyncio.Event()
+            # После обрыва fileno() у закрытого соединения недоступен, поэтому дескриптор запоминается
+            fd = self._conn.fileno()
+            loop.add_reader(fd, self._on_readable)
+            self.connected.set()
+            try:
+                await self._lost.wait()
+            finally:
+                self.connected.clear()
+                loop.remove_reader(fd)
+                self._conn.close()
+            if not self._stopped:
+                logger.warning('LISTEN connection lost, reconnecting')
+                attempt = 1
+
+    def close(self) -> None:
+        self._stopped = True
+        self._broadcast(CLOSED)
+        if self._lost is not None:
+            self._lost.set()
+
+    def event_id(self, sequence: int) -> str:
+        return f'{self.epoch}-{sequence}'
+
+    def subscribe(self, entities: Optional[Set[str]], last_event_id: Optional[str] = None) -> Subscriber:
+        '''
+        Новый подписчик. По Last-Event-ID пропущенные события досылаются из буфера,
+        а если буфер их уже не хранит или id из другой эпохи — первым приходит reset.
+        '''
+        subscriber = Subscriber(entities)
+        if last_event_id:
+            epoch, _, sequence = last_event_id.partition('-')
+            first_kept = self.history[0][0] if self.history else self.sequence + 1
+            if epoch != self.epoch or not sequence.isdigit() or int(sequence) + 1 < first_kept:
+                subscriber.offer(RESET)
+            else:
+                for item_sequence, entity, payload in self.history:
+                    if item_sequence > int(sequence) and (entities is None or entity in entities):
+                        subscriber.offer((self.event_id(item_sequence), entity, payload))
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
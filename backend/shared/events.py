@@ -0,0 +1,36 @@
+'''
+Business: Уведомления об изменениях через LISTEN/NOTIFY: функции пишут событие в транзакции изменения, server.py раздаёт их по SSE (shared.eventhub)
+Args: курсор открытой транзакции и сущность/действие/строки для notify
+Returns: pg_notify, доставляемый подписчикам только после commit
+'''
+
+import json
+from typing import Any, Iterable, List, Optional
+
+CHANNEL = 'wms_events'
+# Лимит pg_notify — 8000 байт; строки в событии только если помещаются, иначе одни id
+MAX_PAYLOAD = 7900
+
+
+def notify(cur: Any, entity: str, action: str, rows: Optional[Iterable[Any]] = None,
+           ids: Optional[List[Any]] = None, user_id: Optional[int] = None) -> None:
+    '''
+    Событие {"entity", "action", "ids", "rows", "user_id"} в канал CHANNEL. NOTIFY транзакционный:
+    подписчики получат его после commit и не получат при rollback. Без ids клиент перечитывает сущность.
+    '''
+    payload: dict = {'entity': entity, 'action': action}
+    if user_id is not None:
+        payload['user_id'] = user_id
+    if rows is not None:
+        payload['rows'] = [dict(row) for row in rows]
+        ids = [row['id'] for row in payload['rows'] if 'id' in row] if ids is None else ids
+    if ids is not None:
+        payload['ids'] = ids
+    text = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str)
+    if len(text.encode('utf-8')) > MAX_PAYLOAD:
+        payload.pop('rows', None)
+        text = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str)
+        if len(text.encode('utf-8')) > MAX_PAYLOAD:
+            payload.pop('ids', None)
+            text = json.dumps(payload, separators=(',', ':'))
+    cur.execute('SELECT pg_notify(%s, %s)', (CHANNEL, text))
@@ -0,0 +1,71 @@
+'''
+Business: Общие HTTP-помощники для функций: заголовки запроса, условные GET (ETag) и Cache-Control
+Args: event облачной функции, ETag ресурса, имя ресурса для настройки кеширования
+Returns: значения заголовков и готовый ответ 304 Not Modified
+'''
+
+import os
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_CONTROL = 'no-cache'
+
+
+def get_header(event: Dict[str, Any], name: str) -> Optional[str]:
+    headers = event.get('headers') or {}
+    value = headers.get(name)
+    if value is not None:
+        return value
+    lowered = name.lower()
+    for key, value in headers.items():
+        if key.lower() == lowered:
+            return value
+    return None
+
+
+def client_ip(event: Dict[str, Any]) -> str:
+    '''Адрес клиента из requestContext шлюза; X-Forwarded-For — для локального запуска за прокси.'''
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    ip = identity.get('sourceIp')
+    if ip:
+        return ip
+    forwarded = get_header(event, 'X-Forwarded-For')
+    return forwarded.split(',')[0].strip() if forwarded else ''
+
+
+def make_etag(resource: str, version: int) -> str:
+    # Слабый валидатор: тело может отличаться кодированием (gzip), но не данными
+    return f'W/"{resource}-{version}"'
+
+
+def etag_matches(event: Dict[str, Any], etag: str) -> bool:
+    header = get_header(event, 'If-None-Match')
+    if not header:
+        return False
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def cache_control(resource: str) -> str:
+    '''Cache-Control ресурса из CACHE_CONTROL_<RESOURCE>, по умолчанию — обязательная ревалидация.'''
+    return os.environ.get(f'CACHE_CONTROL_{resource.upper()}', DEFAULT_CACHE_CONTROL)
+
+
+def not_modified(etag: str, cache_control_value: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 304,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            'ETag': etag,
+            'Cache-Control': cache_control_value
+        },
+        'body': ''
+    }
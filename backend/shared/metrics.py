@@ -0,0 +1,246 @@
+'''
+Business: Метрики функций: время обработчиков, SQL-запросов, получения соединения и сериализации; журнал медленных запросов и выборочный профайлер
+Args: необязательные METRICS_ENABLED, SLOW_QUERY_MS, PROFILE_SAMPLE_RATE, PROFILE_DIR из окружения
+Returns: декоратор instrument(), таймеры и текст в формате Prometheus для /metrics
+'''
+
+import functools
+import io
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    import cProfile
+
+ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Ограничение числа различных текстов запросов в метках, чтобы не раздувать /metrics
+MAX_STATEMENTS = 200
+OTHER_STATEMENT = 'other'
+
+logger = logging.getLogger('metrics')
+slow_query_logger = logging.getLogger('metrics.slow_query')
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_current = threading.local()
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (
+        f'{name}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for key, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_format_labels(key)} {value:g}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        # метки -> (счётчики по корзинам, сумма, количество)
+        self.values: Dict[LabelKey, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with _lock:
+            counts, total, count = self.values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_format_labels(key, ("le", f"{bound:g}"))} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(key, ("le", "+Inf"))} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {total:.6f}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {count}')
+        return lines
+
+
+handler_requests = Counter('wms_handler_requests_total', 'Вызовы обработчиков по функции и HTTP-статусу')
+handler_duration = Histogram('wms_handler_duration_seconds', 'Время вызова обработчика')
+sql_duration = Histogram('wms_sql_duration_seconds', 'Время выполнения SQL по нормализованному тексту запроса')
+sql_errors = Counter('wms_sql_errors_total', 'SQL-запросы, завершившиеся ошибкой')
+slow_queries = Counter('wms_slow_queries_total', 'SQL-запросы дольше SLOW_QUERY_MS')
+db_acquire = Histogram('wms_db_acquire_seconds', 'Ожидание и проверка соединения из пула')
+db_pool_timeouts = Counter('wms_db_pool_timeouts_total', 'Запросы, не дождавшиеся свободного соединения')
+serialization_duration = Histogram('wms_serialization_seconds', 'Сериализация тела ответа')
+db_routes = Counter('wms_db_routes_total', 'Соединения на primary и реплики по причине выбора')
+audit_records = Counter('wms_audit_records_total', 'Записи журнала изменений: записанные и потерянные при переполнении буфера')
+
+REGISTRY = (
+    handler_requests, handler_duration, sql_duration, sql_errors, slow_queries,
+    db_acquire, db_pool_timeouts, serialization_duration, db_routes, audit_records,
+)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s|\$\d+')
+_VALUE_LIST = re.compile(r'\(\s*\?(?:\s*(?:::\w+)?\s*,\s*\?)*(?:\s*::\w+)?\s*\)(?:\s*,\s*\(\s*\?(?:\s*(?:::\w+)?\s*,\s*\?)*(?:\s*::\w+)?\s*\))+')
+_WHITESPACE = re.compile(r'\s+')
+_statements: Set[str] = set()
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> str:
+    '''Текст запроса без литералов и параметров: одинаковые запросы с разными значениями попадают в одну метку.'''
+    text = _STRING_LITERAL.sub('?', sql).replace('%%', '%')
+    text = _PLACEHOLDER.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = _VALUE_LIST.sub('(...)', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def _statement_label(sql: Any) -> str:
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    elif not isinstance(sql, str):
+        sql = str(sql)
+    statement = normalize_sql(sql)
+    with _lock:
+        if statement in _statements:
+            return statement
+        if len(_statements) >= MAX_STATEMENTS:
+            return OTHER_STATEMENT
+        _statements.add(statement)
+    return statement
+
+
+def current_function() -> str:
+    return getattr(_current, 'function', '') or ''
+
+
+def observe_query(sql: Any, seconds: float, failed: bool = False) -> None:
+    statement = _statement_label(sql)
+    sql_duration.observe(seconds, statement=statement)
+    if failed:
+        sql_errors.inc(statement=statement)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc(function=current_function())
+        # Параметры не пишутся: в них бывают пароли и персональные данные
+        slow_query_logger.warning(
+            'slow query %.1f ms in %s: %s', seconds * 1000, current_function() or '-', statement[:500]
+        )
+
+
+@contextmanager
+def timer(histogram: Histogram, **labels: Any) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+_profile_lock = threading.Lock()
+
+
+def _finish_profile(profiler: 'cProfile.Profile', function: str) -> None:
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f'{function}-{int(time.time() * 1000)}-{os.getpid()}.prof')
+        profiler.dump_stats(path)
+        logger.info('profile of %s saved to %s', function, path)
+        return
+    import pstats
+
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(20)
+    logger.info('profile of %s:\n%s', function, out.getvalue())
+
+
+def instrument(function: str) -> Callable[[Callable[..., Dict[str, Any]]], Callable[..., Dict[str, Any]]]:
+    '''
+    Декоратор handler(event, context): время вызова и статус ответа по функции.
+    С вероятностью PROFILE_SAMPLE_RATE вызов профилируется cProfile (один профиль за раз на процесс).
+    '''
+    def decorator(handler: Callable[..., Dict[str, Any]]) -> Callable[..., Dict[str, Any]]:
+        if not ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            previous = getattr(_current, 'function', None)
+            _current.function = function
+            profiler = None
+            if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE and _profile_lock.acquire(blocking=False):
+                # cProfile и pstats импортируются только при профилировании: это ~15 мс холодного старта функции
+                import cProfile
+
+                profiler = cProfile.Profile()
+                profiler.enable()
+            status = 500
+            started = time.perf_counter()
+            try:
+                result = handler(event, context)
+                status = result.get('statusCode', 200)
+                return result
+            finally:
+                handler_duration.observe(time.perf_counter() - started, function=function)
+                handler_requests.inc(function=function, status=status)
+                if profiler is not None:
+                    profiler.disable()
+                    _profile_lock.release()
+                    _finish_profile(profiler, function)
+                _current.function = previous
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        with _lock:
+            lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def reset() -> None:
+    with _lock:
+        for metric in REGISTRY:
+            metric.values.clear()
+        _statements.clear()
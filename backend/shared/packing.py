@@ -0,0 +1,413 @@
+'''
+Business: Раскрой листов: упаковка деталей алгоритмом MaxRects с перебором порядков деталей, эвристик и стратегий поворота
+Args: детали (name, width, height, quantity, rotatable), листы (name, width, height), ширина пропила и бюджет времени;
+      необязательные CUTTING_WORKERS и CUTTING_TIME_BUDGET_MS из окружения
+Returns: лучшую найденную раскладку в формате OptimizationResult из src/utils/cuttingOptimizer.ts и сведения о переборе
+'''
+
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+WORKERS = int(os.environ.get('CUTTING_WORKERS', str(os.cpu_count() or 1)))
+DEFAULT_BUDGET_MS = int(os.environ.get('CUTTING_TIME_BUDGET_MS', '2000'))
+MAX_BUDGET_MS = 20000
+# Сколько случайных порядков деталей выдаётся на перебор сверх детерминированных стратегий;
+# обычно раньше заканчивается бюджет времени
+RANDOM_STRATEGIES = 512
+# Ячеек сетки индекса свободных прямоугольников по каждой стороне листа
+GRID_CELLS = 8
+
+
+class Detail(NamedTuple):
+    name: str
+    width: float
+    height: float
+    quantity: int
+    rotatable: bool = True
+
+
+class Sheet(NamedTuple):
+    name: str
+    width: float
+    height: float
+
+
+class Strategy(NamedTuple):
+    ordering: str
+    heuristic: str
+    rotation: str
+    seed: int = 0
+
+
+Rect = Tuple[float, float, float, float]
+# (индекс детали, x, y, повёрнута)
+Placement = Tuple[int, float, float, bool]
+# (индекс листа, размещения)
+PackedSheet = Tuple[int, List[Placement]]
+Layout = Tuple[List[PackedSheet], List[int]]
+
+ORDERINGS = {
+    'area': lambda w, h: (w * h, max(w, h)),
+    'long_side': lambda w, h: (max(w, h), min(w, h)),
+    'short_side': lambda w, h: (min(w, h), max(w, h)),
+    'perimeter': lambda w, h: (w + h, w * h),
+    'height': lambda w, h: (h, w),
+    'width': lambda w, h: (w, h),
+}
+HEURISTICS = ('bssf', 'baf', 'bl')
+ROTATIONS = ('free', 'landscape', 'none')
+
+
+class FreeRects:
+    '''
+    Свободные прямоугольники листа с индексом по сетке GRID_CELLS x GRID_CELLS.
+    Разрезание после вставки и проверка вложенности смотрят только прямоугольники
+    из ячеек, которые задевает деталь, а не весь список листа.
+    '''
+
+    def __init__(self, width: float, height: float):
+        self.cell_w = width / GRID_CELLS
+        self.cell_h = height / GRID_CELLS
+        self.rects: Dict[int, Rect] = {}
+        self.cells: Dict[Tuple[int, int], Set[int]] = {}
+        self.next_id = 0
+        self.add((0, 0, width, height))
+
+    def _cells(self, rect: Rect) -> List[Tuple[int, int]]:
+        x, y, w, h = rect
+        x0 = min(int(x / self.cell_w), GRID_CELLS - 1)
+        y0 = min(int(y / self.cell_h), GRID_CELLS - 1)
+        x1 = min(max(math.ceil((x + w) / self.cell_w) - 1, x0), GRID_CELLS - 1)
+        y1 = min(max(math.ceil((y + h) / self.cell_h) - 1, y0), GRID_CELLS - 1)
+        return [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+
+    def add(self, rect: Rect) -> None:
+        rect_id = self.next_id
+        self.next_id += 1
+        self.rects[rect_id] = rect
+        for cell in self._cells(rect):
+            self.cells.setdefault(cell, set()).add(rect_id)
+
+    def remove(self, rect_id: int) -> None:
+        rect = self.rects.pop(rect_id)
+        for cell in self._cells(rect):
+            self.cells[cell].discard(rect_id)
+
+    def near(self, rect: Rect) -> Set[int]:
+        '''Прямоугольники, которые могут пересекаться с rect.'''
+        found: Set[int] = set()
+        for cell in self._cells(rect):
+            found.update(self.cells.get(cell, ()))
+        return found
+
+    def covering(self, x: float, y: float) -> Set[int]:
+        '''Прямоугольники, которые могут содержать точку: одна ячейка вместо всех ячеек области.'''
+        cell = (min(int(x / self.cell_w), GRID_CELLS - 1), min(int(y / self.cell_h), GRID_CELLS - 1))
+        return self.cells.get(cell, set())
+
+
+def _overlaps(a: Rect, b: Rect) -> bool:
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def _contains(outer: Rect, inner: Rect) -> bool:
+    return (outer[0] <= inner[0] and outer[1] <= inner[1]
+            and inner[0] + inner[2] <= outer[0] + outer[2] and inner[1] + inner[3] <= outer[1] + outer[3])
+
+
+class MaxRectsBin:
+    def __init__(self, sheet_index: int, width: float, height: float):
+        self.sheet_index = sheet_index
+        self.free = FreeRects(width, height)
+        self.placements: List[Placement] = []
+        # Наибольшие ширина и высота свободных прямоугольников: почти заполненный лист
+        # отсеивается без перебора его прямоугольников
+        self.max_w = width
+        self.max_h = height
+
+    def find(self, w: float, h: float, heuristic: str) -> Optional[Tuple[Tuple[float, float], float, float]]:
+        if w > self.max_w or h > self.max_h:
+            return None
+        best = None
+        for fx, fy, fw, fh in self.free.rects.values():
+            if w > fw or h > fh:
+                continue
+            if heuristic == 'bssf':
+                score = (min(fw - w, fh - h), max(fw - w, fh - h))
+            elif heuristic == 'baf':
+                score = (fw * fh - w * h, min(fw - w, fh - h))
+            else:
+                score = (fy, fx)
+            if best is None or score < best[0]:
+                best = (score, fx, fy)
+        return best
+
+    def insert(self, x: float, y: float, w: float, h: float) -> None:
+        used = (x, y, w, h)
+        pieces: List[Rect] = []
+        for rect_id in self.free.near(used):
+            fx, fy, fw, fh = free = self.free.rects[rect_id]
+            if not _overlaps(free, used):
+                continue
+            self.free.remove(rect_id)
+            if x > fx:
+                pieces.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                pieces.append((x + w, fy, fx + fw - x - w, fh))
+            if y > fy:
+                pieces.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                pieces.append((fx, y + h, fw, fy + fh - y - h))
+        # Новые куски лежат внутри удалённых прямоугольников, поэтому старые свободные в них
+        # не вкладываются; достаточно отбросить куски, вложенные в уже имеющиеся
+        pieces.sort(key=lambda r: r[2] * r[3], reverse=True)
+        for piece in pieces:
+            if not any(_contains(self.free.rects[i], piece) for i in self.free.covering(piece[0], piece[1])):
+                self.free.add(piece)
+        self.max_w = max((r[2] for r in self.free.rects.values()), default=0)
+        self.max_h = max((r[3] for r in self.free.rects.values()), default=0)
+
+
+def _orientations(detail: Detail, sheet: Sheet, rotation: str) -> List[Tuple[float, float, bool]]:
+    w, h = detail.width, detail.height
+    if not detail.rotatable or rotation == 'none' or w == h:
+        return [(w, h, False)]
+    if rotation == 'landscape':
+        # Длинной стороной вдоль длинной стороны листа; обратная ориентация — только если иначе не входит
+        prefer_rotated = (w < h) == (sheet.width >= sheet.height)
+        first = (h, w, True) if prefer_rotated else (w, h, False)
+        second = (w, h, False) if prefer_rotated else (h, w, True)
+        return [first, second]
+    return [(w, h, False), (h, w, True)]
+
+
+def _order(details: List[Detail], strategy: Strategy) -> List[int]:
+    pieces = [index for index, detail in enumerate(details) for _ in range(detail.quantity)]
+    if strategy.ordering == 'random':
+        rng = random.Random(strategy.seed)
+        # Площадь с шумом: крупные детали в основном остаются в начале, меняются соседние
+        keys = {index: details[index].width * details[index].height for index in range(len(details))}
+        return sorted(pieces, key=lambda index: keys[index] * rng.uniform(0.6, 1.4), reverse=True)
+    key = ORDERINGS[strategy.ordering]
+    return sorted(pieces, key=lambda index: key(details[index].width, details[index].height), reverse=True)
+
+
+def pack(details: List[Detail], sheets: List[Sheet], kerf: float, strategy: Strategy) -> Layout:
+    '''
+    Одна раскладка по стратегии: детали по порядку, каждая — в первый открытый лист, где находится
+    место, в лучшую по эвристике позицию. Пропил учитывается увеличением детали и листа на kerf.
+    '''
+    bins: List[MaxRectsBin] = []
+    unplaced: List[int] = []
+    for index in _order(details, strategy):
+        detail = details[index]
+        placed = False
+        for sheet_bin in bins:
+            sheet = sheets[sheet_bin.sheet_index]
+            best = None
+            for w, h, rotated in _orientations(detail, sheet, strategy.rotation):
+                found = sheet_bin.find(w + kerf, h + kerf, strategy.heuristic)
+                if found is not None and (best is None or found[0] < best[0]):
+                    best = (found[0], found[1], found[2], w, h, rotated)
+                if found is not None and strategy.rotation == 'landscape':
+                    break
+            if best is not None:
+                _, x, y, w, h, rotated = best
+                sheet_bin.insert(x, y, w + kerf, h + kerf)
+                sheet_bin.placements.append((index, x, y, rotated))
+                placed = True
+                break
+        if placed:
+            continue
+
+        for sheet_index, sheet in enumerate(sheets):
+            fitting = [
+                (w, h, rotated) for w, h, rotated in _orientations(detail, sheet, strategy.rotation)
+                if w <= sheet.width and h <= sheet.height
+            ]
+            if fitting:
+                w, h, rotated = fitting[0]
+                sheet_bin = MaxRectsBin(sheet_index, sheet.width + kerf, sheet.height + kerf)
+                sheet_bin.insert(0, 0, w + kerf, h + kerf)
+                sheet_bin.placements.append((index, 0, 0, rotated))
+                bins.append(sheet_bin)
+                break
+        else:
+            unplaced.append(index)
+    return [(sheet_bin.sheet_index, sheet_bin.placements) for sheet_bin in bins], unplaced
+
+
+def cost(details: List[Detail], sheets: List[Sheet], layout: Layout) -> Tuple[int, float, float]:
+    '''
+    Чем меньше, тем лучше: неразмещённые детали, затем площадь использованных листов,
+    затем заполнение самого пустого листа — отходы собраны в одном листе, остаток пригоден в дело.
+    '''
+    packed, unplaced = layout
+    sheet_area = sum(sheets[sheet_index].width * sheets[sheet_index].height for sheet_index, _ in packed)
+    lowest_fill = min((
+        sum(details[p[0]].width * details[p[0]].height for p in placements)
+        / (sheets[sheet_index].width * sheets[sheet_index].height)
+        for sheet_index, placements in packed
+    ), default=0.0)
+    return len(unplaced), sheet_area, lowest_fill
+
+
+def strategies(details: List[Detail]) -> List[Strategy]:
+    '''Детерминированные стратегии (порядок x эвристика x поворот), затем случайные порядки.'''
+    rotations = ROTATIONS if any(d.rotatable and d.width != d.height for d in details) else ('none',)
+    fixed = [
+        Strategy(ordering, heuristic, rotation)
+        for rotation in rotations if rotation != 'none' or len(rotations) == 1
+        for ordering in ORDERINGS
+        for heuristic in HEURISTICS
+    ]
+    randomized = [
+        Strategy('random', HEURISTICS[seed % len(HEURISTICS)], rotations[seed % len(rotations)], seed)
+        for seed in range(1, RANDOM_STRATEGIES + 1)
+    ]
+    return fixed + randomized
+
+
+def search(details: List[Detail], sheets: List[Sheet], kerf: float,
+           candidates: List[Strategy], deadline: float) -> Tuple[Layout, Strategy, int]:
+    '''Перебирает стратегии по порядку до дедлайна (time.time()); первая выполняется всегда.'''
+    best_layout: Optional[Layout] = None
+    best_strategy = candidates[0]
+    best_cost = None
+    evaluated = 0
+    for strategy in candidates:
+        if evaluated and time.time() >= deadline:
+            break
+        layout = pack(details, sheets, kerf, strategy)
+        evaluated += 1
+        layout_cost = cost(details, sheets, layout)
+        if best_cost is None or layout_cost < best_cost:
+            best_layout, best_strategy, best_cost = layout, strategy, layout_cost
+    return best_layout, best_strategy, evaluated
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    '''Пул процессов переживает тёплые вызовы; forkserver безопасен для многопоточного server.py.'''
+    global _executor
+    if WORKERS <= 1:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=context)
+        return _executor
+
+
+def _drop_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def optimize(details: List[Detail], sheets: List[Sheet], kerf: float = 0,
+             budget_ms: int = DEFAULT_BUDGET_MS) -> Dict[str, Any]:
+    '''
+    Лучшая раскладка за budget_ms. Стратегии делятся между WORKERS процессами через одну;
+    каждый процесс сам останавливается по дедлайну. Без пула (один процессор, запрет fork
+    в окружении функции) перебор идёт в текущем процессе с тем же бюджетом.
+    '''
+    started = time.time()
+    deadline = started + budget_ms / 1000
+    candidates = strategies(details)
+    results: List[Tuple[Layout, Strategy, int]] = []
+
+    executor = None
+    try:
+        executor = _get_executor()
+    except (OSError, ValueError, NotImplementedError):
+        executor = None
+    if executor is not None:
+        try:
+            futures = [
+                executor.submit(search, details, sheets, kerf, candidates[worker::WORKERS], deadline)
+                for worker in range(WORKERS)
+            ]
+            done, pending = wait(futures, timeout=max(deadline - time.time(), 0) + 1.0)
+            for future in pending:
+                future.cancel()
+            results = [future.result() for future in done if not future.cancelled() and future.exception() is None]
+        except (BrokenProcessPool, OSError):
+            _drop_executor()
+            results = []
+    if not results:
+        results = [search(details, sheets, kerf, candidates, deadline)]
+
+    best_layout, best_strategy, _ = min(results, key=lambda found: cost(details, sheets, found[0]))
+    result = to_result(details, sheets, kerf, best_layout)
+    result['search'] = {
+        'strategy': best_strategy._asdict(),
+        'evaluated': sum(found[2] for found in results),
+        'workers': len(results),
+        'elapsedMs': round((time.time() - started) * 1000),
+        'lowerBoundSheets': lower_bound(details, sheets),
+    }
+    return result
+
+
+def lower_bound(details: List[Detail], sheets: List[Sheet]) -> int:
+    '''Нижняя оценка числа листов по площади (для самого большого листа).'''
+    largest = max(sheet.width * sheet.height for sheet in sheets)
+    return math.ceil(sum(d.width * d.height * d.quantity for d in details) / largest)
+
+
+def to_result(details: List[Detail], sheets: List[Sheet], kerf: float, layout: Layout) -> Dict[str, Any]:
+    '''Раскладка в формате OptimizationResult фронтенда (src/utils/cuttingOptimizer.ts).'''
+    packed, unplaced = layout
+
+    def detail_json(index: int) -> Dict[str, Any]:
+        detail = details[index]
+        return {'name': detail.name, 'width': detail.width, 'height': detail.height, 'quantity': 1}
+
+    result_sheets = []
+    used_total = 0.0
+    area_total = 0.0
+    for sheet_index, placements in packed:
+        sheet = sheets[sheet_index]
+        used = sum(details[p[0]].width * details[p[0]].height for p in placements)
+        area = sheet.width * sheet.height
+        used_total += used
+        area_total += area
+        result_sheets.append({
+            'sheet': sheet._asdict(),
+            'placedDetails': [
+                {'detail': detail_json(index), 'x': x, 'y': y, 'rotated': rotated}
+                for index, x, y, rotated in placements
+            ],
+            'efficiency': round(used / area * 100, 2),
+            'wasteArea': area - used,
+        })
+    return {
+        'sheets': result_sheets,
+        'totalSheets': len(result_sheets),
+        'totalEfficiency': round(used_total / area_total * 100, 2) if area_total else 0,
+        'unplacedDetails': [detail_json(index) for index in unplaced],
+        'kerf': kerf,
+    }
+
+
+def result_cost(result: Dict[str, Any]) -> Tuple[int, float, float]:
+    '''cost() по сохранённому OptimizationResult: для сравнения с раскладкой из cutting_projects.'''
+    return (
+        len(result.get('unplacedDetails') or []),
+        sum(s['sheet']['width'] * s['sheet']['height'] for s in result.get('sheets') or []),
+        min((s['efficiency'] / 100 for s in result.get('sheets') or []), default=0.0),
+    )
@@ -0,0 +1,80 @@
+'''
+Business: Хеширование паролей пользователей через scrypt из стандартной библиотеки
+Args: необязательные PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P из окружения
+Returns: строку хеша для users.password, проверку пароля и признак необходимости перехеширования
+'''
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from typing import Optional, Tuple
+
+SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', str(2 ** 14)))
+SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', '8'))
+SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', '1'))
+
+PREFIX = 'scrypt'
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip('=')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + '=' * (-len(data) % 4))
+
+
+def _derive(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # scrypt занимает 128 * n * r * p байт памяти; берём запас, чтобы не упереться в maxmem по умолчанию
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * n * r * p, dklen=KEY_BYTES
+    )
+
+
+def _parse(stored: str) -> Optional[Tuple[int, int, int, bytes, bytes]]:
+    parts = stored.split('$')
+    if len(parts) != 6 or parts[0] != PREFIX:
+        return None
+    try:
+        return int(parts[1]), int(parts[2]), int(parts[3]), _b64decode(parts[4]), _b64decode(parts[5])
+    except ValueError:
+        return None
+
+
+def hash_password(password: str, n: int = None, r: int = None, p: int = None) -> str:
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = secrets.token_bytes(SALT_BYTES)
+    key = _derive(password, salt, n, r, p)
+    return f'{PREFIX}${n}${r}${p}${_b64encode(salt)}${_b64encode(key)}'
+
+
+def verify_password(stored: str, password: str) -> bool:
+    '''Сверяет пароль с хешем; строки старого формата (открытый текст) сравниваются напрямую.'''
+    parsed = _parse(stored)
+    if parsed is None:
+        return hmac.compare_digest(stored.encode(), password.encode())
+    n, r, p, salt, key = parsed
+    return hmac.compare_digest(_derive(password, salt, n, r, p), key)
+
+
+def needs_rehash(stored: str) -> bool:
+    '''True для открытого текста и для хешей с параметрами, отличными от текущих настроек.'''
+    parsed = _parse(stored)
+    return parsed is None or parsed[:3] != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+# Хеш для несуществующих пользователей: вход с чужим логином тратит столько же времени,
+# сколько и с существующим, и не выдаёт наличие учётной записи по задержке ответа
+_DUMMY_HASH = None
+
+
+def dummy_verify(password: str) -> None:
+    global _DUMMY_HASH
+    if _DUMMY_HASH is None:
+        _DUMMY_HASH = hash_password(secrets.token_hex(8))
+    verify_password(_DUMMY_HASH, password)
@@ -0,0 +1,139 @@
+'''
+Business: Реестр SQL-запросов функций: PREPARE один раз на соединение, дальше EXECUTE без разбора и планирования текста
+Args: statement(имя, SQL с %s или %(name)s) при импорте модуля; необязательные DB_PREPARE и DB_PREPARE_MAX из окружения
+Returns: execute(cur, statement, args) — результат в курсоре, как у cur.execute(); при выключенном DB_PREPARE это и есть cur.execute()
+'''
+
+import hashlib
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+# За PgBouncer в режиме transaction подготовленные запросы не переживают смену серверного соединения — там DB_PREPARE=0
+ENABLED = os.environ.get('DB_PREPARE', '1') == '1'
+# Предел подготовленных запросов на соединение: динамические WHERE не должны раздувать память сервера
+MAX_PREPARED = int(os.environ.get('DB_PREPARE_MAX', '200'))
+
+DUPLICATE_PREPARED_STATEMENT = '42P05'
+
+_PLACEHOLDER = re.compile(r'%\((\w+)\)s|%s|%%')
+_NAME = re.compile(r'[a-z_][a-z0-9_]*')
+
+logger = logging.getLogger('queries')
+
+
+class Statement:
+    '''
+    Запрос реестра. Имя на сервере — имя из кода и хеш текста, поэтому варианты одного
+    динамического запроса (разные наборы фильтров) готовятся независимо.
+    '''
+    __slots__ = ('name', 'sql', 'text', 'params', 'placeholders', 'execute_sql')
+
+    def __init__(self, name: str, sql: str):
+        self.name = f"{name}_{hashlib.sha1(sql.encode()).hexdigest()[:8]}"
+        self.sql = sql
+        params: List[Optional[str]] = []
+        numbers: Dict[str, int] = {}
+
+        def number(match: 're.Match[str]') -> str:
+            if match.group(0) == '%%':
+                # В PREPARE текст уходит через cur.execute с аргументами, поэтому % снова экранируется
+                return '%%'
+            key = match.group(1)
+            if key is None:
+                params.append(None)
+                return f'${len(params)}'
+            if key not in numbers:
+                params.append(key)
+                numbers[key] = len(params)
+            return f'${numbers[key]}'
+
+        self.text = _PLACEHOLDER.sub(number, sql)
+        self.params = params
+        self.placeholders = f" ({', '.join(['%s'] * len(params))})" if params else ''
+        self.execute_sql = f'EXECUTE {self.name}{self.placeholders}'
+
+    def arguments(self, args: Any) -> Sequence[Any]:
+        '''Аргументы EXECUTE в порядке $1..$n: из кортежа как есть, из словаря — по именам.'''
+        if isinstance(args, dict):
+            return [args[key] for key in self.params]
+        values = list(args or ())
+        if len(values) != len(self.params):
+            raise ValueError(f'{self.name}: expected {len(self.params)} arguments, got {len(values)}')
+        return values
+
+
+_statements: Dict[Tuple[str, str], Statement] = {}
+# id(conn) -> (pid серверного процесса, подготовленные на нём имена). По pid отличается
+# новое соединение, получившее id уже закрытого
+_prepared: Dict[int, Tuple[int, Set[str]]] = {}
+# Запросы, которые сервер отказался готовить (например, не вывел тип параметра): они идут обычным execute
+_unpreparable: Set[str] = set()
+
+
+def statement(name: str, sql: str) -> Statement:
+    '''Запрос из реестра: текст разбирается один раз на процесс, к БД при этом не обращается.'''
+    if not _NAME.fullmatch(name):
+        raise ValueError(f'Invalid statement name: {name}')
+    key = (name, sql)
+    found = _statements.get(key)
+    if found is None:
+        found = _statements[key] = Statement(name, sql)
+    return found
+
+
+def _prepared_names(conn: Any) -> Set[str]:
+    pid = conn.info.backend_pid
+    entry = _prepared.get(id(conn))
+    if entry is None or entry[0] != pid:
+        entry = _prepared[id(conn)] = (pid, set())
+    return entry[1]
+
+
+def _prepare(cur: Any, query: Statement) -> bool:
+    '''
+    PREPARE в той же транзакции под точкой сохранения, одним обращением к серверу: ошибка
+    подготовки откатывается до точки сохранения и не ломает транзакцию вызывающего.
+    '''
+    import psycopg2
+
+    savepoint = not cur.connection.autocommit
+    sql = f'PREPARE {query.name} AS {query.text}'
+    try:
+        cur.execute(f'SAVEPOINT prepare_statement; {sql}; RELEASE SAVEPOINT prepare_statement' if savepoint else sql, ())
+    except (psycopg2.ProgrammingError, psycopg2.DataError, psycopg2.NotSupportedError) as e:
+        if savepoint:
+            cur.execute('ROLLBACK TO SAVEPOINT prepare_statement; RELEASE SAVEPOINT prepare_statement')
+        if e.pgcode == DUPLICATE_PREPARED_STATEMENT:
+            return True
+        _unpreparable.add(query.name)
+        logger.warning('statement %s is executed without PREPARE: %s', query.name, e)
+        return False
+    return True
+
+
+def execute(cur: Any, query: Statement, args: Any = None) -> None:
+    '''
+    Выполняет запрос реестра: на этом соединении впервые — PREPARE и EXECUTE, дальше только EXECUTE.
+    Подготовленный запрос переживает откат транзакции и живёт, пока открыто соединение пула.
+    '''
+    if not ENABLED or query.name in _unpreparable:
+        cur.execute(query.sql, args)
+        return
+    names = _prepared_names(cur.connection)
+    if query.name not in names:
+        if len(names) >= MAX_PREPARED or not _prepare(cur, query):
+            cur.execute(query.sql, args)
+            return
+        names.add(query.name)
+    cur.execute(query.execute_sql, query.arguments(args))
+
+
+def forget(conn: Any) -> None:
+    '''Сбрасывает учёт подготовленных запросов соединения, которое закрывается.'''
+    _prepared.pop(id(conn), None)
+
+
+def forget_all() -> None:
+    _prepared.clear()
@@ -0,0 +1,67 @@
+'''
+Business: Ограничение частоты неудачных входов по логину и по IP в памяти процесса
+Args: необязательные LOGIN_RATE_WINDOW (сек), LOGIN_RATE_USER_LIMIT, LOGIN_RATE_IP_LIMIT из окружения
+Returns: сколько секунд ждать до следующей попытки (0 — можно пробовать сейчас)
+'''
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Tuple
+
+WINDOW = float(os.environ.get('LOGIN_RATE_WINDOW', '300'))
+USER_LIMIT = int(os.environ.get('LOGIN_RATE_USER_LIMIT', '5'))
+IP_LIMIT = int(os.environ.get('LOGIN_RATE_IP_LIMIT', '20'))
+MAX_KEYS = 10000
+
+# ключ ('user', логин) или ('ip', адрес) -> моменты неудачных попыток внутри окна
+_attempts: Dict[Tuple[str, str], Deque[float]] = {}
+_lock = threading.Lock()
+
+
+def login_keys(username: str, ip: str) -> Iterable[Tuple[Tuple[str, str], int]]:
+    keys = [(('user', username.lower()), USER_LIMIT)]
+    if ip:
+        keys.append((('ip', ip), IP_LIMIT))
+    return keys
+
+
+def _trim(window: Deque[float], now: float) -> None:
+    while window and window[0] <= now - WINDOW:
+        window.popleft()
+
+
+def retry_after(keys: Iterable[Tuple[Tuple[str, str], int]]) -> int:
+    '''Не ждёт и не спит: отказ возвращается сразу, вызывающий отвечает 429 с Retry-After.'''
+    now = time.monotonic()
+    wait = 0.0
+    with _lock:
+        for key, limit in keys:
+            window = _attempts.get(key)
+            if not window:
+                continue
+            _trim(window, now)
+            if len(window) >= limit:
+                wait = max(wait, window[len(window) - limit] + WINDOW - now)
+    return math.ceil(wait) if wait > 0 else 0
+
+
+def record_failure(keys: Iterable[Tuple[Tuple[str, str], int]]) -> None:
+    now = time.monotonic()
+    with _lock:
+        if len(_attempts) >= MAX_KEYS:
+            for key in [k for k, w in _attempts.items() if not w or w[-1] <= now - WINDOW]:
+                del _attempts[key]
+        for key, limit in keys:
+            window = _attempts.setdefault(key, deque(maxlen=max(limit, 1)))
+            _trim(window, now)
+            window.append(now)
+
+
+def reset(keys: Iterable[Tuple[Tuple[str, str], int]]) -> None:
+    with _lock:
+        for key, _ in keys:
+            if key[0] == 'user':
+                _attempts.pop(key, None)
@@ -0,0 +1,106 @@
+'''
+Business: Быстрая сериализация списков для ответов функций и сжатие больших тел по Accept-Encoding
+Args: необязательные COMPRESS_MIN_BYTES, GZIP_LEVEL, BROTLI_QUALITY из окружения; brotli используется, если установлен
+Returns: курсор с датами и числами в виде текста, JSON из кортежей строк и ответ со сжатым телом
+'''
+
+import base64
+import gzip
+import json
+import os
+from itertools import repeat
+from typing import Any, Dict, List, Optional, Sequence
+
+from psycopg2 import extensions
+
+from shared import metrics
+from shared.http import get_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '4096'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '5'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+
+# date, time, timestamp, timestamptz, timetz, numeric: значения остаются текстом Postgres.
+# json.dumps пишет их как строки без вызова default=str на каждое значение;
+# формат совпадает с str() для date/numeric, у timestamp Postgres не дописывает нули в долях секунды
+TEXT_TYPE_OIDS = (1082, 1083, 1114, 1184, 1266, 1700)
+_TEXT_TYPES = [
+    extensions.new_type((oid,), f'WMS_TEXT_{oid}', lambda value, cur: value)
+    for oid in TEXT_TYPE_OIDS
+]
+
+_encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+
+
+def text_cursor(conn: extensions.connection) -> extensions.cursor:
+    '''Курсор с кортежами вместо RealDictRow; типы из TEXT_TYPE_OIDS приходят строками.'''
+    cur = conn.cursor()
+    for text_type in _TEXT_TYPES:
+        extensions.register_type(text_type, cur)
+    return cur
+
+
+def records(cur: extensions.cursor, rows: Sequence[tuple]) -> List[Dict[str, Any]]:
+    '''Словари из кортежей: ключи берутся один раз из description, zip и dict работают на уровне C.'''
+    names = [column.name for column in cur.description]
+    return list(map(dict, map(zip, repeat(names), rows)))
+
+
+def json_body(function: str, payload: Any) -> str:
+    '''JSON тела ответа с замером времени сериализации по функции.'''
+    with metrics.timer(metrics.serialization_duration, function=function):
+        return _encoder.encode(payload)
+
+
+def _accepted_encodings(event: Dict[str, Any]) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for item in (get_header(event, 'Accept-Encoding') or '').split(','):
+        name, _, params = item.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def _choose_encoding(event: Dict[str, Any]) -> Optional[str]:
+    accepted = _accepted_encodings(event)
+    wildcard = accepted.get('*', 0.0)
+    for encoding in (('br', 'gzip') if brotli is not None else ('gzip',)):
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(event: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Сжимает строковое тело ответа, если оно больше COMPRESS_MIN_BYTES и клиент принимает br или gzip.
+    Тело возвращается в base64 с isBase64Encoded, как того ждёт шлюз облачных функций.
+    '''
+    body = response.get('body')
+    if not isinstance(body, str) or response.get('isBase64Encoded') or len(body) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = _choose_encoding(event)
+    headers = dict(response.get('headers') or {})
+    headers['Vary'] = 'Accept-Encoding'
+    if encoding is None:
+        return dict(response, headers=headers)
+
+    data = body.encode('utf-8')
+    if encoding == 'br':
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    headers['Content-Encoding'] = encoding
+    return dict(response, headers=headers, body=base64.b64encode(data).decode('ascii'), isBase64Encoded=True)
@@ -0,0 +1,120 @@
+'''
+Business: Сессии пользователей: подписанные токены и кеш ролей в памяти процесса
+Args: SESSION_SECRET, необязательные SESSION_TTL (сек) и SESSION_ROLE_CACHE_TTL (сек) из окружения
+Returns: токен при входе, id пользователя из заголовка X-Auth-Token (или Authorization: Bearer) и его роль
+'''
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from shared.db import SCHEMA
+from shared.http import client_ip, get_header
+
+SESSION_TTL = int(os.environ.get('SESSION_TTL', str(12 * 3600)))
+ROLE_CACHE_TTL = float(os.environ.get('SESSION_ROLE_CACHE_TTL', '60'))
+
+# user_id -> (роль, момент истечения записи). Смена роли в PUT /auth сбрасывает запись
+# в этом процессе; остальные экземпляры функции увидят новую роль через ROLE_CACHE_TTL
+_roles: Dict[int, Tuple[str, float]] = {}
+_roles_lock = threading.Lock()
+
+logger = logging.getLogger('sessions')
+_secret_missing_logged = False
+
+
+def _secret() -> bytes:
+    secret = os.environ.get('SESSION_SECRET')
+    if not secret:
+        raise RuntimeError('SESSION_SECRET is not configured')
+    return secret.encode()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_secret(), payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user_id: int) -> str:
+    payload = _b64encode(json.dumps({'uid': user_id, 'exp': int(time.time()) + SESSION_TTL}).encode())
+    return f'{payload}.{_sign(payload)}'
+
+
+def verify_token(token: str) -> Optional[int]:
+    '''
+    Проверяет подпись и срок действия без обращения к БД; возвращает id пользователя.
+    Без SESSION_SECRET ни один токен не принимается: запрос идёт как анонимный, а не падает с 500.
+    '''
+    global _secret_missing_logged
+    if not os.environ.get('SESSION_SECRET'):
+        if not _secret_missing_logged:
+            _secret_missing_logged = True
+            logger.error('SESSION_SECRET is not configured, session tokens are rejected')
+        return None
+    try:
+        payload, signature = token.split('.', 1)
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+        if claims['exp'] < time.time():
+            return None
+        return int(claims['uid'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def authenticate(event: Dict[str, Any]) -> Optional[int]:
+    token = get_header(event, 'X-Auth-Token')
+    if not token:
+        authorization = get_header(event, 'Authorization') or ''
+        if authorization.startswith('Bearer '):
+            token = authorization[len('Bearer '):]
+    if not token:
+        return None
+    return verify_token(token.strip())
+
+
+def pin_key(event: Dict[str, Any]) -> str:
+    '''Ключ для закрепления чтений за primary после записи (get_connection): пользователь сессии, иначе адрес клиента.'''
+    user_id = authenticate(event)
+    return f'user:{user_id}' if user_id is not None else f'ip:{client_ip(event)}'
+
+
+def remember_role(user_id: int, role: str) -> None:
+    with _roles_lock:
+        _roles[user_id] = (role, time.monotonic() + ROLE_CACHE_TTL)
+
+
+def invalidate_role(user_id: int) -> None:
+    with _roles_lock:
+        _roles.pop(user_id, None)
+
+
+def get_role(cur: Any, user_id: int) -> Optional[str]:
+    '''Роль из кеша процесса; при промахе — один SELECT, результат кешируется на ROLE_CACHE_TTL.'''
+    with _roles_lock:
+        cached = _roles.get(user_id)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+
+    cur.execute(f'SELECT role FROM {SCHEMA}.users WHERE id = %s', (user_id,))
+    row = cur.fetchone()
+    if row is None:
+        invalidate_role(user_id)
+        return None
+    role = row['role'] if isinstance(row, dict) else row[0]
+    remember_role(user_id, role)
+    return role
@@ -0,0 +1,193 @@
+'''
+Business: Журнал движений склада: запись движений с обновлением остатков warehouse и документов arrivals/shipments/defects в той же транзакции, снимки и остатки на дату
+Args: курсор RealDictCursor в открытой транзакции, тело запроса с движениями (material_id, color_id, quantity, kind), момент as_of
+Returns: id движений и новые остатки по затронутым позициям, позиции с нехваткой, остатки на дату из снимка и хвоста журнала
+'''
+
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from shared.db import SCHEMA
+
+# Знак количества по виду движения; у корректировки знак задаёт сам запрос
+KIND_SIGNS = {'arrival': 1, 'shipment': -1, 'defect': -1, 'adjustment': 0}
+MAX_MOVEMENTS = 1000
+
+Movement = Tuple[int, Optional[int], Decimal, str, str, Optional[int], Optional[str]]
+
+
+def _optional_int(value: Any) -> Optional[int]:
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def parse_movements(data: Any) -> List[Movement]:
+    '''
+    Движения из тела {"movements": [...]} или одиночного объекта. Количество приходит
+    положительным, знак берётся из kind; ValueError/KeyError/TypeError при неверных данных.
+    '''
+    items = data.get('movements') if isinstance(data, dict) and 'movements' in data else [data]
+    if not isinstance(items, list) or not items:
+        raise ValueError('movements must be a non-empty list')
+    if len(items) > MAX_MOVEMENTS:
+        raise ValueError(f'at most {MAX_MOVEMENTS} movements per request')
+
+    movements: List[Movement] = []
+    for item in items:
+        kind = item.get('kind', 'arrival')
+        if kind not in KIND_SIGNS:
+            raise ValueError(f'unknown kind: {kind}')
+        try:
+            quantity = Decimal(str(item['quantity']))
+        except InvalidOperation:
+            raise ValueError(f"quantity is not a number: {item['quantity']}")
+        if not quantity.is_finite() or quantity == 0:
+            raise ValueError('quantity must be a non-zero number')
+        if KIND_SIGNS[kind]:
+            if quantity < 0:
+                raise ValueError(f'quantity of {kind} must be positive')
+            quantity *= KIND_SIGNS[kind]
+        movements.append((
+            int(item['material_id']),
+            _optional_int(item.get('color_id')),
+            quantity,
+            item.get('unit') or 'шт',
+            kind,
+            _optional_int(item.get('reference_id')),
+            item.get('comment') or item.get('reason')
+        ))
+    return movements
+
+
+def apply_movements(cur: Any, movements: List[Movement], user_id: Optional[int]) -> Tuple[List[int], List[Any], List[Any]]:
+    '''
+    Пишет движения в журнал и одним INSERT ... ON CONFLICT меняет остатки по каждой позиции.
+    Позиции обновляются в порядке ключа, поэтому встречные пакеты не взаимоблокируются.
+    Приход, отправка и брак заводят и свои документы (_write_documents), корректировка — только движение.
+    Возвращает id движений, новые остатки и позиции, ушедшие в минус из-за этого запроса:
+    при непустом списке нехватки вызывающий откатывает транзакцию.
+    '''
+    inserted = execute_values(cur, f'''
+        INSERT INTO {SCHEMA}.stock_movements (material_id, color_id, quantity, unit, kind, reference_id, comment, created_by)
+        VALUES %s
+        RETURNING id
+    ''', [movement + (user_id,) for movement in movements], page_size=len(movements), fetch=True)
+
+    deltas: Dict[Tuple[int, Optional[int]], Decimal] = {}
+    units: Dict[Tuple[int, Optional[int]], str] = {}
+    for material_id, color_id, quantity, unit, *_ in movements:
+        key = (material_id, color_id)
+        deltas[key] = deltas.get(key, Decimal(0)) + quantity
+        units.setdefault(key, unit)
+    keys = sorted(deltas, key=lambda key: (key[0], key[1] or 0))
+
+    balances = execute_values(cur, f'''
+        INSERT INTO {SCHEMA}.warehouse AS w (material_id, color_id, quantity, unit)
+        VALUES %s
+        ON CONFLICT (material_id, (COALESCE(color_id, 0)))
+        DO UPDATE SET quantity = w.quantity + EXCLUDED.quantity, updated_at = CURRENT_TIMESTAMP
+        RETURNING w.id, w.material_id, w.color_id, w.quantity, w.unit, w.updated_at
+    ''', [(key[0], key[1], deltas[key], units[key]) for key in keys],
+        template='(%s::int, %s::int, %s::numeric, %s)', page_size=len(keys), fetch=True)
+
+    _write_documents(cur, movements, {(row['material_id'], row['color_id']): row['id'] for row in balances}, user_id)
+
+    # Остаток, который был отрицательным и до запроса, приход не блокирует
+    shortages = [
+        row for row in balances
+        if row['quantity'] < 0 and deltas[(row['material_id'], row['color_id'])] < 0
+    ]
+    return [row['id'] for row in inserted], balances, shortages
+
+
+def _write_documents(cur: Any, movements: List[Movement], positions: Dict[Tuple[int, Optional[int]], int],
+                     user_id: Optional[int]) -> None:
+    '''
+    Строки arrivals, shipments и defects (V0003) для движений соответствующего вида: их читают
+    страницы прихода, отправки и брака и сводка дашборда. У отправки reference_id — id заявки.
+    '''
+    arrivals, shipments, defects = [], [], []
+    for material_id, color_id, quantity, unit, kind, reference_id, comment in movements:
+        if kind == 'arrival':
+            arrivals.append((material_id, color_id, abs(quantity), unit, user_id))
+        elif kind == 'shipment':
+            shipments.append((reference_id, positions[(material_id, color_id)], abs(quantity), unit, user_id))
+        elif kind == 'defect':
+            defects.append((material_id, color_id, abs(quantity), unit, comment, user_id))
+    if arrivals:
+        execute_values(cur, f'''
+            INSERT INTO {SCHEMA}.arrivals (material_id, color_id, quantity, unit, created_by) VALUES %s
+        ''', arrivals, page_size=len(arrivals))
+    if shipments:
+        execute_values(cur, f'''
+            INSERT INTO {SCHEMA}.shipments (order_id, warehouse_id, quantity, unit, status, shipped_at, created_by)
+            VALUES %s
+        ''', shipments, template="(%s, %s, %s, %s, 'shipped', CURRENT_TIMESTAMP, %s)", page_size=len(shipments))
+    if defects:
+        execute_values(cur, f'''
+            INSERT INTO {SCHEMA}.defects (material_id, color_id, quantity, unit, reason, created_by) VALUES %s
+        ''', defects, page_size=len(defects))
+
+
+def take_snapshot(cur: Any) -> Any:
+    '''Снимок остатков (функция take_stock_snapshot из V0011); вызывающий делает commit.'''
+    cur.execute(f'SELECT * FROM {SCHEMA}.take_stock_snapshot()')
+    return cur.fetchone()
+
+
+def parse_as_of(value: str) -> datetime:
+    '''
+    Граница «остаток на»: для даты — начало следующего дня (движения за весь день входят),
+    для момента времени — сам момент. В запросах граница строгая (< until).
+    '''
+    value = value.strip()
+    if len(value) == 10:
+        return datetime.combine(date.fromisoformat(value) + timedelta(days=1), datetime.min.time())
+    return datetime.fromisoformat(value)
+
+
+AS_OF_QUERY = f'''
+    WITH balances AS (
+        SELECT material_id, color_id, quantity
+        FROM {SCHEMA}.stock_snapshot_items
+        WHERE snapshot_id = %(snapshot_id)s
+        UNION ALL
+        SELECT material_id, color_id, quantity
+        FROM {SCHEMA}.stock_movements
+        WHERE id > %(last_movement_id)s AND created_at < %(until)s
+    )
+    SELECT b.material_id, b.color_id, sum(b.quantity) AS quantity, COALESCE(w.unit, 'шт') AS unit,
+           m.name AS material_name, c.name AS color_name
+    FROM balances b
+    LEFT JOIN {SCHEMA}.warehouse w
+      ON w.material_id = b.material_id AND COALESCE(w.color_id, 0) = COALESCE(b.color_id, 0)
+    LEFT JOIN {SCHEMA}.materials m ON m.id = b.material_id
+    LEFT JOIN {SCHEMA}.colors c ON c.id = b.color_id
+    GROUP BY b.material_id, b.color_id, w.unit, m.name, c.name
+    HAVING sum(b.quantity) <> 0
+    ORDER BY m.name, c.name
+'''
+
+
+def as_of_params(cur: Any, until: datetime) -> Tuple[Optional[Any], Dict[str, Any]]:
+    '''
+    Последний снимок до границы и параметры AS_OF_QUERY: остатки из снимка плюс хвост журнала
+    после его last_movement_id. Без снимков хвостом становится весь журнал.
+    '''
+    cur.execute(f'''
+        SELECT id, taken_at, last_movement_id
+        FROM {SCHEMA}.stock_snapshots
+        WHERE taken_at < %s
+        ORDER BY taken_at DESC
+        LIMIT 1
+    ''', (until,))
+    snapshot = cur.fetchone()
+    return snapshot, {
+        'snapshot_id': snapshot['id'] if snapshot else None,
+        'last_movement_id': snapshot['last_movement_id'] if snapshot else 0,
+        'until': until
+    }
@@ -0,0 +1,190 @@
+'''
+Business: Склад: текущие остатки, журнал движений (приход, отправка, брак, корректировка) и остатки на дату
+Args: event с httpMethod (GET/POST), body с движением или {"movements": [...]}; ?as_of= дата или момент, ?action=movements|snapshot
+Returns: HTTP response с остатками, записанными движениями и новыми остатками либо снимком; запись — только админ или менеджер
+'''
+
+import json
+from typing import Dict, Any, List, Optional, Tuple
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from shared import events, stock
+from shared.db import get_connection
+from shared.metrics import instrument
+from shared.serialize import compress, json_body, records, text_cursor
+from shared.sessions import authenticate, get_role, pin_key
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+BALANCES_QUERY = '''
+    SELECT w.id, w.material_id, w.color_id, w.quantity, w.unit, w.updated_at,
+           m.name AS material_name, c.name AS color_name
+    FROM t_p61217265_workplace_management.warehouse w
+    LEFT JOIN t_p61217265_workplace_management.materials m ON w.material_id = m.id
+    LEFT JOIN t_p61217265_workplace_management.colors c ON w.color_id = c.id
+    ORDER BY m.name, c.name
+'''
+
+
+def _movement_filters(params: Dict[str, str]) -> Tuple[str, List[Any], int]:
+    where: List[str] = []
+    args: List[Any] = []
+    for name in ('material_id', 'color_id'):
+        if params.get(name):
+            where.append(f's.{name} = %s')
+            args.append(int(params[name]))
+    if params.get('before_id'):
+        where.append('s.id < %s')
+        args.append(int(params['before_id']))
+    limit = int(params.get('limit', DEFAULT_PAGE_SIZE))
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return ('WHERE ' + ' AND '.join(where)) if where else '', args, limit
+
+
+def _bad_request(message: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 400,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': message})
+    }
+
+
+@instrument('warehouse')
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Auth-Token, Authorization',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': ''
+        }
+
+    params = event.get('queryStringParameters') or {}
+    action: Optional[str] = params.get('action')
+
+    user_id = authenticate(event) if method == 'POST' else None
+    if method == 'POST' and not user_id:
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Требуется авторизация'})
+        }
+
+    with get_connection(read_only=method == 'GET', pin_key=pin_key(event)) as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if method == 'GET' and action == 'movements':
+                try:
+                    where, args, limit = _movement_filters(params)
+                except (ValueError, TypeError):
+                    return _bad_request('Invalid filter')
+                with text_cursor(conn) as rows_cur:
+                    rows_cur.execute(f'''
+                        SELECT s.id, s.material_id, s.color_id, s.quantity, s.unit, s.kind, s.reference_id,
+                               s.comment, s.created_by, s.created_at, u.full_name AS created_by_name
+                        FROM t_p61217265_workplace_management.stock_movements s
+                        LEFT JOIN t_p61217265_workplace_management.users u ON s.created_by = u.id
+                        {where}
+                        ORDER BY s.id DESC
+                        LIMIT %s
+                    ''', args + [limit])
+                    movements = records(rows_cur, rows_cur.fetchall())
+                return compress(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json_body('warehouse', movements)
+                })
+
+            if method == 'GET' and params.get('as_of'):
+                try:
+                    until = stock.parse_as_of(params['as_of'])
+                except ValueError:
+                    return _bad_request('Invalid as_of parameter')
+                snapshot, query_params = stock.as_of_params(cur, until)
+                with text_cursor(conn) as rows_cur:
+                    rows_cur.execute(stock.AS_OF_QUERY, query_params)
+                    items = records(rows_cur, rows_cur.fetchall())
+                return compress(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json_body('warehouse', {
+                        'as_of': params['as_of'],
+                        'snapshot': dict(snapshot) if snapshot else None,
+                        'items': items
+                    })
+                })
+
+            if method == 'GET':
+                with text_cursor(conn) as rows_cur:
+                    rows_cur.execute(BALANCES_QUERY)
+                    items = records(rows_cur, rows_cur.fetchall())
+                return compress(event, {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json_body('warehouse', items)
+                })
+
+            if method == 'POST' and get_role(cur, user_id) not in ['admin', 'manager']:
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Недостаточно прав'})
+                }
+
+            if method == 'POST' and action == 'snapshot':
+                snapshot = stock.take_snapshot(cur)
+                conn.commit()
+                return {
+                    'statusCode': 201,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(dict(snapshot), default=str)
+                }
+
+            if method == 'POST':
+                try:
+                    movements = stock.parse_movements(json.loads(event.get('body') or '{}'))
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    return _bad_request(f'Invalid movements: {e}')
+
+                try:
+                    movement_ids, balances, shortages = stock.apply_movements(cur, movements, user_id)
+                except psycopg2.IntegrityError as e:
+                    conn.rollback()
+                    return _bad_request(f'Invalid movements: {e.diag.message_detail or e.pgerror}')
+                if shortages:
+                    conn.rollback()
+                    return {
+                        'statusCode': 409,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({
+                            'error': 'Недостаточно материала на складе',
+                            'shortages': [
+                                {'material_id': row['material_id'], 'color_id': row['color_id'], 'missing': -row['quantity']}
+                                for row in shortages
+                            ]
+                        }, default=str)
+                    }
+                events.notify(cur, 'warehouse', 'update', balances)
+                conn.commit()
+                return {
+                    'statusCode': 201,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({
+                        'movement_ids': movement_ids,
+                        'balances': [dict(row) for row in balances]
+                    }, default=str)
+                }
+
+    return {
+        'statusCode': 405,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps({'error': 'Method not allowed'})
+    }
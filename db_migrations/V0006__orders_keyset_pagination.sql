@@ -0,0 +1,32 @@
+-- Ранг статуса для сортировки списка заявок (new → in_progress → completed)
+ALTER TABLE t_p61217265_workplace_management.orders
+  ADD COLUMN IF NOT EXISTS status_rank SMALLINT GENERATED ALWAYS AS (
+    CASE status
+      WHEN 'new' THEN 1
+      WHEN 'in_progress' THEN 2
+      WHEN 'completed' THEN 3
+      ELSE 4
+    END
+  ) STORED;
+
+-- created_at входит в ключ курсора: без NULL курсор всегда однозначен и декодируется
+UPDATE t_p61217265_workplace_management.orders
+  SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP)
+  WHERE created_at IS NULL;
+ALTER TABLE t_p61217265_workplace_management.orders
+  ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP,
+  ALTER COLUMN created_at SET NOT NULL;
+
+-- Keyset-пагинация: порядок совпадает с ORDER BY в orders/index.py
+CREATE INDEX IF NOT EXISTS idx_orders_list
+  ON t_p61217265_workplace_management.orders (status_rank, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_orders_created_by_list
+  ON t_p61217265_workplace_management.orders (created_by, status_rank, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_orders_deadline
+  ON t_p61217265_workplace_management.orders (deadline);
+
+-- Поиск по префиксу имени клиента: lower(client_name) LIKE 'префикс%'
+CREATE INDEX IF NOT EXISTS idx_orders_client_name_prefix
+  ON t_p61217265_workplace_management.orders (lower(client_name) text_pattern_ops);
@@ -0,0 +1,104 @@
+-- Версии справочников для дельта-синхронизации (?since=<version>)
+-- Один счётчик на все справочники (материалы включают имена разделов и цветов,
+-- поэтому версии должны быть сравнимы). Счётчик увеличивается один раз на оператор;
+-- блокировка его строки упорядочивает пишущие транзакции, и версии растут в порядке коммитов
+CREATE TABLE IF NOT EXISTS t_p61217265_workplace_management.catalog_version (
+  id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  version BIGINT NOT NULL DEFAULT 1
+);
+
+INSERT INTO t_p61217265_workplace_management.catalog_version (id, version)
+VALUES (true, 1)
+ON CONFLICT (id) DO NOTHING;
+
+-- Журнал удалений (tombstones)
+CREATE TABLE IF NOT EXISTS t_p61217265_workplace_management.catalog_deletions (
+  entity VARCHAR(32) NOT NULL,
+  entity_id INTEGER NOT NULL,
+  row_version BIGINT NOT NULL,
+  deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_catalog_deletions_entity_version
+  ON t_p61217265_workplace_management.catalog_deletions (entity, row_version);
+
+ALTER TABLE t_p61217265_workplace_management.materials
+  ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  ADD COLUMN IF NOT EXISTS row_version BIGINT NOT NULL DEFAULT 1;
+
+ALTER TABLE t_p61217265_workplace_management.colors
+  ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  ADD COLUMN IF NOT EXISTS row_version BIGINT NOT NULL DEFAULT 1;
+
+ALTER TABLE t_p61217265_workplace_management.categories
+  ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  ADD COLUMN IF NOT EXISTS row_version BIGINT NOT NULL DEFAULT 1;
+
+CREATE INDEX IF NOT EXISTS idx_materials_row_version
+  ON t_p61217265_workplace_management.materials (row_version);
+CREATE INDEX IF NOT EXISTS idx_colors_row_version
+  ON t_p61217265_workplace_management.colors (row_version);
+CREATE INDEX IF NOT EXISTS idx_categories_row_version
+  ON t_p61217265_workplace_management.categories (row_version);
+
+-- Один инкремент счётчика на оператор INSERT/UPDATE/DELETE
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.bump_catalog_version()
+RETURNS trigger AS $$
+DECLARE
+  new_version BIGINT;
+BEGIN
+  UPDATE t_p61217265_workplace_management.catalog_version
+  SET version = version + 1
+  RETURNING version INTO new_version;
+  PERFORM set_config('wms.catalog_version', new_version::text, true);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.stamp_catalog_row()
+RETURNS trigger AS $$
+BEGIN
+  NEW.row_version := current_setting('wms.catalog_version')::bigint;
+  NEW.updated_at := CURRENT_TIMESTAMP;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.log_catalog_deletion()
+RETURNS trigger AS $$
+BEGIN
+  INSERT INTO t_p61217265_workplace_management.catalog_deletions (entity, entity_id, row_version)
+  VALUES (TG_TABLE_NAME, OLD.id, current_setting('wms.catalog_version')::bigint);
+  RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_materials_bump_version
+  BEFORE INSERT OR UPDATE OR DELETE ON t_p61217265_workplace_management.materials
+  FOR EACH STATEMENT EXECUTE FUNCTION t_p61217265_workplace_management.bump_catalog_version();
+CREATE TRIGGER trg_materials_stamp_version
+  BEFORE INSERT OR UPDATE ON t_p61217265_workplace_management.materials
+  FOR EACH ROW EXECUTE FUNCTION t_p61217265_workplace_management.stamp_catalog_row();
+CREATE TRIGGER trg_materials_log_deletion
+  AFTER DELETE ON t_p61217265_workplace_management.materials
+  FOR EACH ROW EXECUTE FUNCTION t_p61217265_workplace_management.log_catalog_deletion();
+
+CREATE TRIGGER trg_colors_bump_version
+  BEFORE INSERT OR UPDATE OR DELETE ON t_p61217265_workplace_management.colors
+  FOR EACH STATEMENT EXECUTE FUNCTION t_p61217265_workplace_management.bump_catalog_version();
+CREATE TRIGGER trg_colors_stamp_version
+  BEFORE INSERT OR UPDATE ON t_p61217265_workplace_management.colors
+  FOR EACH ROW EXECUTE FUNCTION t_p61217265_workplace_management.stamp_catalog_row();
+CREATE TRIGGER trg_colors_log_deletion
+  AFTER DELETE ON t_p61217265_workplace_management.colors
+  FOR EACH ROW EXECUTE FUNCTION t_p61217265_workplace_management.log_catalog_deletion();
+
+CREATE TRIGGER trg_categories_bump_version
+  BEFORE INSERT OR UPDATE OR DELETE ON t_p61217265_workplace_management.categories
+  FOR EACH STATEMENT EXECUTE FUNCTION t_p61217265_workplace_management.bump_catalog_version();
+CREATE TRIGGER trg_categories_stamp_version
+  BEFORE INSERT OR UPDATE ON t_p61217265_workplace_management.categories
+  FOR EACH ROW EXECUTE FUNCTION t_p61217265_workplace_management.stamp_catalog_row();
+CREATE TRIGGER trg_categories_log_deletion
+  AFTER DELETE ON t_p61217265_workplace_management.categories
+  FOR EACH ROW EXECUTE FUNCTION t_p61217265_workplace_management.log_catalog_deletion();
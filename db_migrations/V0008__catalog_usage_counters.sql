@@ -0,0 +1,114 @@
+-- Счётчики использования цветов и разделов, поддерживаемые триггерами на materials
+-- вместо COUNT(...) GROUP BY на каждый GET
+ALTER TABLE t_p61217265_workplace_management.categories
+  ADD COLUMN IF NOT EXISTS material_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE t_p61217265_workplace_management.colors SET usage_count = 0 WHERE usage_count IS NULL;
+ALTER TABLE t_p61217265_workplace_management.colors
+  ALTER COLUMN usage_count SET DEFAULT 0,
+  ALTER COLUMN usage_count SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_colors_usage_name
+  ON t_p61217265_workplace_management.colors (usage_count DESC, name);
+
+-- Триггеры уровня оператора с таблицами переходов: массовая вставка материалов
+-- обновляет каждый затронутый цвет/раздел один раз, а не на каждую строку
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.maintain_catalog_counters()
+RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    UPDATE t_p61217265_workplace_management.colors c
+    SET usage_count = c.usage_count + d.n
+    FROM (SELECT color_id AS id, count(*) AS n FROM new_rows
+          WHERE color_id IS NOT NULL GROUP BY color_id) d
+    WHERE c.id = d.id;
+
+    UPDATE t_p61217265_workplace_management.categories s
+    SET material_count = s.material_count + d.n
+    FROM (SELECT category_id AS id, count(*) AS n FROM new_rows
+          WHERE category_id IS NOT NULL GROUP BY category_id) d
+    WHERE s.id = d.id;
+
+  ELSIF TG_OP = 'DELETE' THEN
+    UPDATE t_p61217265_workplace_management.colors c
+    SET usage_count = c.usage_count - d.n
+    FROM (SELECT color_id AS id, count(*) AS n FROM old_rows
+          WHERE color_id IS NOT NULL GROUP BY color_id) d
+    WHERE c.id = d.id;
+
+    UPDATE t_p61217265_workplace_management.categories s
+    SET material_count = s.material_count - d.n
+    FROM (SELECT category_id AS id, count(*) AS n FROM old_rows
+          WHERE category_id IS NOT NULL GROUP BY category_id) d
+    WHERE s.id = d.id;
+
+  ELSE
+    -- Переименование материала не трогает счётчики (и версии строк цветов/разделов)
+    UPDATE t_p61217265_workplace_management.colors c
+    SET usage_count = c.usage_count + d.n
+    FROM (SELECT id, sum(n) AS n FROM (
+            SELECT color_id AS id, 1 AS n FROM new_rows
+            UNION ALL
+            SELECT color_id AS id, -1 AS n FROM old_rows
+          ) moved
+          WHERE id IS NOT NULL GROUP BY id HAVING sum(n) <> 0) d
+    WHERE c.id = d.id;
+
+    UPDATE t_p61217265_workplace_management.categories s
+    SET material_count = s.material_count + d.n
+    FROM (SELECT id, sum(n) AS n FROM (
+            SELECT category_id AS id, 1 AS n FROM new_rows
+            UNION ALL
+            SELECT category_id AS id, -1 AS n FROM old_rows
+          ) moved
+          WHERE id IS NOT NULL GROUP BY id HAVING sum(n) <> 0) d
+    WHERE s.id = d.id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_materials_counters_insert
+  AFTER INSERT ON t_p61217265_workplace_management.materials
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION t_p61217265_workplace_management.maintain_catalog_counters();
+
+CREATE TRIGGER trg_materials_counters_update
+  AFTER UPDATE ON t_p61217265_workplace_management.materials
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION t_p61217265_workplace_management.maintain_catalog_counters();
+
+CREATE TRIGGER trg_materials_counters_delete
+  AFTER DELETE ON t_p61217265_workplace_management.materials
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION t_p61217265_workplace_management.maintain_catalog_counters();
+
+-- Пересчёт с нуля: исправляет расхождения и возвращает число исправленных строк
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.rebuild_catalog_counters()
+RETURNS TABLE (colors_fixed INTEGER, categories_fixed INTEGER) AS $$
+BEGIN
+  LOCK TABLE t_p61217265_workplace_management.materials IN SHARE MODE;
+
+  UPDATE t_p61217265_workplace_management.colors c
+  SET usage_count = x.n
+  FROM (SELECT c2.id, count(m.id)::int AS n
+        FROM t_p61217265_workplace_management.colors c2
+        LEFT JOIN t_p61217265_workplace_management.materials m ON m.color_id = c2.id
+        GROUP BY c2.id) x
+  WHERE c.id = x.id AND c.usage_count IS DISTINCT FROM x.n;
+  GET DIAGNOSTICS colors_fixed = ROW_COUNT;
+
+  UPDATE t_p61217265_workplace_management.categories s
+  SET material_count = x.n
+  FROM (SELECT s2.id, count(m.id)::int AS n
+        FROM t_p61217265_workplace_management.categories s2
+        LEFT JOIN t_p61217265_workplace_management.materials m ON m.category_id = s2.id
+        GROUP BY s2.id) x
+  WHERE s.id = x.id AND s.material_count IS DISTINCT FROM x.n;
+  GET DIAGNOSTICS categories_fixed = ROW_COUNT;
+
+  RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT * FROM t_p61217265_workplace_management.rebuild_catalog_counters();
@@ -0,0 +1,71 @@
+-- Полнотекстовый и триграммный поиск материалов по названию, разделу и цвету
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Денормализованный текст поиска: имя материала + имя раздела + имя цвета
+ALTER TABLE t_p61217265_workplace_management.materials
+  ADD COLUMN IF NOT EXISTS search_text TEXT NOT NULL DEFAULT '',
+  ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.material_search_fields()
+RETURNS trigger AS $$
+DECLARE
+  section_name TEXT;
+  color_name TEXT;
+BEGIN
+  SELECT s.name INTO section_name
+  FROM t_p61217265_workplace_management.categories s WHERE s.id = NEW.category_id;
+  SELECT c.name INTO color_name
+  FROM t_p61217265_workplace_management.colors c WHERE c.id = NEW.color_id;
+
+  NEW.search_text := lower(concat_ws(' ', NEW.name, section_name, color_name));
+  -- Имя материала важнее раздела и цвета при ранжировании
+  NEW.search_vector :=
+    setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(section_name, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(color_name, '')), 'C');
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_materials_search_fields
+  BEFORE INSERT OR UPDATE OF name, category_id, color_id, search_text
+  ON t_p61217265_workplace_management.materials
+  FOR EACH ROW EXECUTE FUNCTION t_p61217265_workplace_management.material_search_fields();
+
+-- Переименование раздела или цвета пересчитывает поисковые поля его материалов
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.refresh_material_search()
+RETURNS trigger AS $$
+BEGIN
+  IF NEW.name IS DISTINCT FROM OLD.name THEN
+    IF TG_TABLE_NAME = 'categories' THEN
+      UPDATE t_p61217265_workplace_management.materials
+      SET search_text = search_text WHERE category_id = NEW.id;
+    ELSE
+      UPDATE t_p61217265_workplace_management.materials
+      SET search_text = search_text WHERE color_id = NEW.id;
+    END IF;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_categories_refresh_material_search
+  AFTER UPDATE OF name ON t_p61217265_workplace_management.categories
+  FOR EACH ROW EXECUTE FUNCTION t_p61217265_workplace_management.refresh_material_search();
+
+CREATE TRIGGER trg_colors_refresh_material_search
+  AFTER UPDATE OF name ON t_p61217265_workplace_management.colors
+  FOR EACH ROW EXECUTE FUNCTION t_p61217265_workplace_management.refresh_material_search();
+
+-- Заполнение для существующих строк (триггер срабатывает на UPDATE OF search_text)
+UPDATE t_p61217265_workplace_management.materials SET search_text = search_text;
+
+CREATE INDEX IF NOT EXISTS idx_materials_search_vector
+  ON t_p61217265_workplace_management.materials USING GIN (search_vector);
+
+-- Подсказки по началу названия: search_text начинается с lower(name)
+CREATE INDEX IF NOT EXISTS idx_materials_search_prefix
+  ON t_p61217265_workplace_management.materials (search_text text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS idx_materials_search_trgm
+  ON t_p61217265_workplace_management.materials USING GIN (search_text gin_trgm_ops);
@@ -0,0 +1,80 @@
+-- Сводка для главной страницы: одна строка с готовым JSON, пересчитывается по TTL
+-- функцией dashboard/index.py, а не на каждое открытие страницы
+CREATE TABLE IF NOT EXISTS t_p61217265_workplace_management.dashboard_summary (
+  id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  data JSONB NOT NULL,
+  refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Просроченные заявки: только незавершённые, по возрастанию срока
+CREATE INDEX IF NOT EXISTS idx_orders_open_deadline
+  ON t_p61217265_workplace_management.orders (deadline)
+  WHERE status <> 'completed';
+
+-- Пересчёт сводки одним запросом по каждой таблице; вызывается под advisory-блокировкой,
+-- поэтому одновременно сводку считает не больше одного экземпляра функции
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.refresh_dashboard_summary(overdue_limit INTEGER DEFAULT 20)
+RETURNS JSONB AS $$
+DECLARE
+  summary JSONB;
+  refreshed TIMESTAMPTZ := clock_timestamp();
+BEGIN
+  SELECT jsonb_build_object(
+    'refreshed_at', refreshed,
+    'orders', (
+      SELECT jsonb_build_object(
+        'total', count(*),
+        'by_status', jsonb_build_object(
+          'new', count(*) FILTER (WHERE status = 'new'),
+          'in_progress', count(*) FILTER (WHERE status = 'in_progress'),
+          'completed', count(*) FILTER (WHERE status = 'completed')
+        ),
+        'overdue', count(*) FILTER (WHERE status <> 'completed' AND deadline < CURRENT_DATE),
+        'due_today', count(*) FILTER (WHERE status <> 'completed' AND deadline = CURRENT_DATE)
+      )
+      FROM t_p61217265_workplace_management.orders
+    ),
+    'overdue_orders', (
+      SELECT coalesce(jsonb_agg(o ORDER BY o.deadline, o.id), '[]'::jsonb)
+      FROM (
+        SELECT id, client_name, deadline, status, quantity_ordered, quantity_completed,
+               CURRENT_DATE - deadline AS days_overdue
+        FROM t_p61217265_workplace_management.orders
+        WHERE status <> 'completed' AND deadline < CURRENT_DATE
+        ORDER BY deadline, id
+        LIMIT overdue_limit
+      ) o
+    ),
+    'stock', (
+      SELECT jsonb_build_object(
+        'positions', coalesce(sum(positions), 0),
+        'empty_positions', coalesce(sum(empty_positions), 0),
+        'by_unit', coalesce(jsonb_object_agg(unit, quantity) FILTER (WHERE unit IS NOT NULL), '{}'::jsonb)
+      )
+      FROM (
+        SELECT coalesce(unit, 'шт') AS unit, count(*) AS positions,
+               count(*) FILTER (WHERE quantity <= 0) AS empty_positions, sum(quantity) AS quantity
+        FROM t_p61217265_workplace_management.warehouse
+        GROUP BY coalesce(unit, 'шт')
+      ) w
+    ),
+    'defects', (
+      SELECT jsonb_build_object(
+        'total', count(*),
+        'by_status', jsonb_build_object(
+          'reported', count(*) FILTER (WHERE status = 'reported'),
+          'disposed', count(*) FILTER (WHERE status = 'disposed')
+        ),
+        'reported_quantity', coalesce(sum(quantity) FILTER (WHERE status = 'reported'), 0)
+      )
+      FROM t_p61217265_workplace_management.defects
+    )
+  ) INTO summary;
+
+  INSERT INTO t_p61217265_workplace_management.dashboard_summary (id, data, refreshed_at)
+  VALUES (1, summary, refreshed)
+  ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, refreshed_at = EXCLUDED.refreshed_at;
+
+  RETURN summary;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,105 @@
+-- Журнал движений склада: приход, отправка, брак и корректировки со знаком.
+-- Остатки в warehouse обновляются в той же транзакции, что и запись в журнал (shared/stock.py)
+CREATE TABLE IF NOT EXISTS t_p61217265_workplace_management.stock_movements (
+  id BIGSERIAL PRIMARY KEY,
+  material_id INTEGER NOT NULL REFERENCES t_p61217265_workplace_management.materials(id),
+  color_id INTEGER REFERENCES t_p61217265_workplace_management.colors(id),
+  quantity DECIMAL(12, 2) NOT NULL CHECK (quantity <> 0),
+  unit VARCHAR(50) NOT NULL DEFAULT 'шт',
+  kind VARCHAR(20) NOT NULL CHECK (kind IN ('opening', 'arrival', 'shipment', 'defect', 'adjustment')),
+  reference_id INTEGER,
+  comment TEXT,
+  created_by INTEGER REFERENCES t_p61217265_workplace_management.users(id),
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_stock_movements_item
+  ON t_p61217265_workplace_management.stock_movements (material_id, color_id, id);
+
+-- Снимки остатков: итог журнала по last_movement_id включительно
+CREATE TABLE IF NOT EXISTS t_p61217265_workplace_management.stock_snapshots (
+  id SERIAL PRIMARY KEY,
+  taken_at TIMESTAMPTZ NOT NULL,
+  last_movement_id BIGINT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_stock_snapshots_taken_at
+  ON t_p61217265_workplace_management.stock_snapshots (taken_at);
+
+CREATE TABLE IF NOT EXISTS t_p61217265_workplace_management.stock_snapshot_items (
+  snapshot_id INTEGER NOT NULL REFERENCES t_p61217265_workplace_management.stock_snapshots(id) ON DELETE CASCADE,
+  material_id INTEGER NOT NULL,
+  color_id INTEGER,
+  quantity DECIMAL(12, 2) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_stock_snapshot_items_snapshot
+  ON t_p61217265_workplace_management.stock_snapshot_items (snapshot_id);
+
+-- Одна строка остатка на (материал, цвет). Позиция без цвета считается отдельным ключом,
+-- поэтому уникальность по COALESCE(color_id, 0); дубли, если были, сливаются в первую строку
+UPDATE t_p61217265_workplace_management.warehouse w
+SET quantity = d.quantity
+FROM (SELECT min(id) AS id, sum(quantity) AS quantity
+      FROM t_p61217265_workplace_management.warehouse
+      GROUP BY material_id, COALESCE(color_id, 0) HAVING count(*) > 1) d
+WHERE w.id = d.id;
+
+DELETE FROM t_p61217265_workplace_management.warehouse w
+USING t_p61217265_workplace_management.warehouse keep
+WHERE keep.material_id = w.material_id
+  AND COALESCE(keep.color_id, 0) = COALESCE(w.color_id, 0)
+  AND keep.id < w.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_warehouse_item
+  ON t_p61217265_workplace_management.warehouse (material_id, (COALESCE(color_id, 0)));
+
+-- Текущие остатки становятся начальными движениями: журнал сразу сходится с warehouse
+INSERT INTO t_p61217265_workplace_management.stock_movements (material_id, color_id, quantity, unit, kind, comment)
+SELECT material_id, color_id, quantity, COALESCE(unit, 'шт'), 'opening', 'Остаток на момент включения журнала'
+FROM t_p61217265_workplace_management.warehouse
+WHERE material_id IS NOT NULL AND quantity <> 0
+ORDER BY id;
+
+-- Новый снимок = предыдущий снимок + хвост журнала после него, без повторного прохода по всему журналу.
+-- SHARE-блокировка дожидается незакоммиченных движений и не пускает новые, поэтому
+-- все id <= last_movement_id уже видны, а taken_at не раньше created_at любого из них
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.take_stock_snapshot()
+RETURNS TABLE (snapshot_id INTEGER, taken_at TIMESTAMPTZ, last_movement_id BIGINT, items INTEGER) AS $$
+DECLARE
+  prev_id INTEGER;
+  prev_last BIGINT;
+BEGIN
+  LOCK TABLE t_p61217265_workplace_management.stock_movements IN SHARE MODE;
+
+  SELECT s.id, s.last_movement_id INTO prev_id, prev_last
+  FROM t_p61217265_workplace_management.stock_snapshots s
+  ORDER BY s.id DESC LIMIT 1;
+
+  taken_at := clock_timestamp();
+  SELECT COALESCE(max(m.id), 0) INTO last_movement_id FROM t_p61217265_workplace_management.stock_movements m;
+
+  INSERT INTO t_p61217265_workplace_management.stock_snapshots (taken_at, last_movement_id)
+  VALUES (take_stock_snapshot.taken_at, take_stock_snapshot.last_movement_id)
+  RETURNING id INTO snapshot_id;
+
+  INSERT INTO t_p61217265_workplace_management.stock_snapshot_items (snapshot_id, material_id, color_id, quantity)
+  SELECT take_stock_snapshot.snapshot_id, x.material_id, x.color_id, sum(x.quantity)
+  FROM (
+    SELECT i.material_id, i.color_id, i.quantity
+    FROM t_p61217265_workplace_management.stock_snapshot_items i
+    WHERE i.snapshot_id = prev_id
+    UNION ALL
+    SELECT m.material_id, m.color_id, m.quantity
+    FROM t_p61217265_workplace_management.stock_movements m
+    WHERE m.id > COALESCE(prev_last, 0) AND m.id <= take_stock_snapshot.last_movement_id
+  ) x
+  GROUP BY x.material_id, x.color_id
+  HAVING sum(x.quantity) <> 0;
+  GET DIAGNOSTICS items = ROW_COUNT;
+
+  RETURN NEXT;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT * FROM t_p61217265_workplace_management.take_stock_snapshot();
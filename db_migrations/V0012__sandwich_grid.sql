@@ -0,0 +1,22 @@
+-- Таблица сэндвич-панелей как сетка: строка адресуется номером row_number,
+-- row_version растёт при каждом изменении строки и служит для оптимистической проверки
+-- при сохранении патчей ячеек (sandwich/index.py)
+ALTER TABLE t_p61217265_workplace_management.sandwich_data
+  ADD COLUMN IF NOT EXISTS row_version INTEGER NOT NULL DEFAULT 1;
+
+-- Повторяющиеся номера строк, если были, переносятся в конец сетки в порядке id
+UPDATE t_p61217265_workplace_management.sandwich_data s
+SET row_number = d.new_number
+FROM (
+  SELECT id, (SELECT max(row_number) FROM t_p61217265_workplace_management.sandwich_data)
+             + row_number() OVER (ORDER BY id) AS new_number
+  FROM (
+    SELECT id, row_number() OVER (PARTITION BY row_number ORDER BY id) AS duplicate
+    FROM t_p61217265_workplace_management.sandwich_data
+  ) numbered
+  WHERE duplicate > 1
+) d
+WHERE s.id = d.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sandwich_data_row_number
+  ON t_p61217265_workplace_management.sandwich_data (row_number);
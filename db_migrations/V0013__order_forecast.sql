@@ -0,0 +1,64 @@
+-- История выполнения заявок для прогноза сроков: каждое изменение quantity_completed
+-- пишется триггером, поэтому её ведут и одиночный PUT, и пакетное обновление смены
+CREATE TABLE IF NOT EXISTS t_p61217265_workplace_management.order_progress (
+  id BIGSERIAL PRIMARY KEY,
+  order_id INTEGER NOT NULL REFERENCES t_p61217265_workplace_management.orders(id) ON DELETE CASCADE,
+  quantity_completed INTEGER NOT NULL,
+  delta INTEGER NOT NULL,
+  recorded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_order_progress_recorded_at
+  ON t_p61217265_workplace_management.order_progress (recorded_at);
+CREATE INDEX IF NOT EXISTS idx_order_progress_order
+  ON t_p61217265_workplace_management.order_progress (order_id, recorded_at);
+
+-- Версия заявок: растёт на каждый оператор INSERT/UPDATE/DELETE, по ней сбрасывается кеш прогноза
+CREATE TABLE IF NOT EXISTS t_p61217265_workplace_management.orders_version (
+  id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  version BIGINT NOT NULL DEFAULT 1
+);
+
+INSERT INTO t_p61217265_workplace_management.orders_version (id, version)
+VALUES (true, 1)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.record_order_progress()
+RETURNS trigger AS $$
+BEGIN
+  INSERT INTO t_p61217265_workplace_management.order_progress (order_id, quantity_completed, delta)
+  VALUES (NEW.id, COALESCE(NEW.quantity_completed, 0),
+          COALESCE(NEW.quantity_completed, 0) - CASE WHEN TG_OP = 'UPDATE' THEN COALESCE(OLD.quantity_completed, 0) ELSE 0 END);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.bump_orders_version()
+RETURNS trigger AS $$
+BEGIN
+  UPDATE t_p61217265_workplace_management.orders_version SET version = version + 1;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_orders_progress_insert
+  AFTER INSERT ON t_p61217265_workplace_management.orders
+  FOR EACH ROW EXECUTE FUNCTION t_p61217265_workplace_management.record_order_progress();
+CREATE TRIGGER trg_orders_progress_update
+  AFTER UPDATE OF quantity_completed ON t_p61217265_workplace_management.orders
+  FOR EACH ROW WHEN (OLD.quantity_completed IS DISTINCT FROM NEW.quantity_completed)
+  EXECUTE FUNCTION t_p61217265_workplace_management.record_order_progress();
+CREATE TRIGGER trg_orders_bump_version
+  AFTER INSERT OR UPDATE OR DELETE ON t_p61217265_workplace_management.orders
+  FOR EACH STATEMENT EXECUTE FUNCTION t_p61217265_workplace_management.bump_orders_version();
+
+-- Истории до миграции нет: две точки — ноль при создании и текущее количество на момент
+-- последнего изменения заявки; прогноз интерполирует между ними
+INSERT INTO t_p61217265_workplace_management.order_progress (order_id, quantity_completed, delta, recorded_at)
+SELECT id, 0, 0, COALESCE(created_at, now())
+FROM t_p61217265_workplace_management.orders;
+
+INSERT INTO t_p61217265_workplace_management.order_progress (order_id, quantity_completed, delta, recorded_at)
+SELECT id, quantity_completed, quantity_completed, GREATEST(COALESCE(updated_at, created_at, now()), COALESCE(created_at, now()))
+FROM t_p61217265_workplace_management.orders
+WHERE quantity_completed > 0;
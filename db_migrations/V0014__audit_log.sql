@@ -0,0 +1,53 @@
+-- Журнал изменений заявок и справочников: значения полей до и после, пользователь и время.
+-- Пишется пачками из shared/audit.py; секции по месяцам, старый месяц удаляется DROP TABLE секции
+CREATE TABLE IF NOT EXISTS t_p61217265_workplace_management.audit_log (
+  id BIGSERIAL,
+  entity VARCHAR(50) NOT NULL,
+  entity_id BIGINT NOT NULL,
+  action VARCHAR(20) NOT NULL,
+  user_id INTEGER,
+  changed_at TIMESTAMPTZ NOT NULL,
+  before JSONB,
+  after JSONB,
+  PRIMARY KEY (changed_at, id)
+) PARTITION BY RANGE (changed_at);
+
+CREATE INDEX IF NOT EXISTS idx_audit_log_entity
+  ON t_p61217265_workplace_management.audit_log (entity, entity_id, changed_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_log_recent
+  ON t_p61217265_workplace_management.audit_log (entity, changed_at DESC, id DESC);
+
+-- Запись не падает, даже если секция месяца ещё не создана
+CREATE TABLE IF NOT EXISTS t_p61217265_workplace_management.audit_log_default
+  PARTITION OF t_p61217265_workplace_management.audit_log DEFAULT;
+
+-- Секция месяца, в который попадает day. Строки этого месяца из секции по умолчанию
+-- переносятся в новую секцию до её подключения, иначе ATTACH PARTITION завершится ошибкой
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.ensure_audit_partition(day DATE)
+RETURNS void AS $$
+DECLARE
+  month_start DATE := date_trunc('month', day)::date;
+  month_end DATE := (date_trunc('month', day) + interval '1 month')::date;
+  partition TEXT := 'audit_log_' || to_char(day, 'YYYY_MM');
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext('t_p61217265_workplace_management.audit_log'));
+  IF to_regclass('t_p61217265_workplace_management.' || partition) IS NOT NULL THEN
+    RETURN;
+  END IF;
+  EXECUTE format(
+    'CREATE TABLE t_p61217265_workplace_management.%I (LIKE t_p61217265_workplace_management.audit_log INCLUDING DEFAULTS)',
+    partition);
+  EXECUTE format(
+    'WITH moved AS (DELETE FROM t_p61217265_workplace_management.audit_log_default
+                    WHERE changed_at >= %L AND changed_at < %L RETURNING *)
+     INSERT INTO t_p61217265_workplace_management.%I SELECT * FROM moved',
+    month_start, month_end, partition);
+  EXECUTE format(
+    'ALTER TABLE t_p61217265_workplace_management.audit_log ATTACH PARTITION t_p61217265_workplace_management.%I
+     FOR VALUES FROM (%L) TO (%L)',
+    partition, month_start, month_end);
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT t_p61217265_workplace_management.ensure_audit_partition(current_date);
+SELECT t_p61217265_workplace_management.ensure_audit_partition((current_date + interval '1 month')::date);
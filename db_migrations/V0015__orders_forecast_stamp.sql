@@ -0,0 +1,27 @@
+-- Кеш прогноза сверяется с count(*) и max(updated_at) заявок вместо общей строки orders_version:
+-- её UPDATE в каждой транзакции по заявкам выстраивал все записи в очередь за одной блокировкой
+DROP TRIGGER IF EXISTS trg_orders_bump_version ON t_p61217265_workplace_management.orders;
+DROP FUNCTION IF EXISTS t_p61217265_workplace_management.bump_orders_version();
+DROP TABLE IF EXISTS t_p61217265_workplace_management.orders_version;
+
+UPDATE t_p61217265_workplace_management.orders
+SET updated_at = created_at
+WHERE updated_at IS NULL;
+
+-- updated_at ставится триггером, поэтому его обновляют и PUT, и пакетное обновление смены;
+-- clock_timestamp(), а не время начала транзакции: долгая транзакция не спрячет изменение
+-- за более поздней отметкой уже зафиксированной
+CREATE OR REPLACE FUNCTION t_p61217265_workplace_management.touch_order_row()
+RETURNS trigger AS $$
+BEGIN
+  NEW.updated_at := clock_timestamp();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_orders_touch
+  BEFORE INSERT OR UPDATE ON t_p61217265_workplace_management.orders
+  FOR EACH ROW EXECUTE FUNCTION t_p61217265_workplace_management.touch_order_row();
+
+CREATE INDEX IF NOT EXISTS idx_orders_updated_at
+  ON t_p61217265_workplace_management.orders (updated_at);